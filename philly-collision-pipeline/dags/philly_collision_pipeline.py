@@ -17,13 +17,90 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.operators.bash import BashOperator
+from airflow.utils.task_group import TaskGroup
 from airflow.utils.dates import days_ago
+from pathlib import Path
+import importlib
+import orjson
+import re
 import sys
 import os
 
 # Add project root to path
 sys.path.insert(0, '/app')
 
+# Stage modules, imported once when the DAG file is loaded rather than inside
+# every task. Folder names start with digits, so importlib is required.
+STAGE_MODULE_PATHS = {
+    'download_penndot': 'scripts.01_acquire.download_penndot',
+    'download_noaa': 'scripts.01_acquire.download_noaa',
+    'profile_data': 'scripts.02_process.profile_data',
+    'harmonize_schema': 'scripts.02_process.harmonize_schema',
+    'integrate': 'scripts.03_integrate.integrate',
+    'create_datasets': 'scripts.04_analyze.create_datasets',
+}
+
+STAGE_MODULES = {}
+for _name, _path in STAGE_MODULE_PATHS.items():
+    try:
+        STAGE_MODULES[_name] = importlib.import_module(_path)
+    except Exception as e:
+        # Don't break DAG parsing; the task retries the import when it runs
+        print(f"⚠️  Could not import {_path} at DAG load: {e}")
+
+
+def stage_module(name: str):
+    """Return a pre-imported stage module, importing it now if DAG load failed to."""
+    if name not in STAGE_MODULES:
+        STAGE_MODULES[name] = importlib.import_module(STAGE_MODULE_PATHS[name])
+    return STAGE_MODULES[name]
+
+# Airflow pool capping concurrent PennDOT downloads
+PENNDOT_POOL = 'penndot_pool'
+
+# Airflow pool capping concurrent CPU-heavy harmonization tasks
+HARMONIZE_POOL = 'cpu_pool'
+
+# PennDOT categories harmonized in parallel branches (mirrors
+# scripts.config.PENNDOT_CATEGORIES; kept here so DAG parsing never depends
+# on the project package importing cleanly)
+HARMONIZE_CATEGORIES = ['CRASH', 'COMMVEH', 'CYCLE', 'FLAG', 'PERSON', 'ROADWAY', 'TRAILVEH', 'VEHICLE']
+
+# Harmonized categories each downstream task reads
+INTEGRATION_CATEGORIES = ['CRASH']
+DATASET_CATEGORIES = ['CYCLE', 'PERSON', 'VEHICLE', 'ROADWAY']
+
+# Report/sidecar serialization: 2-space indent, numpy scalars and datetimes
+# handled natively, anything else falls back to str()
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+# Per-run stage stats are written here as JSON sidecars; XCom only carries
+# the file path, keeping the metadata DB out of the stats traffic.
+RUN_STATS_DIR = Path('/app/metadata/runs')
+
+
+def run_stats_dir(context) -> Path:
+    """Sidecar directory for this DAG run (run_id made filesystem-safe)."""
+    return RUN_STATS_DIR / re.sub(r'[^A-Za-z0-9_.-]', '_', context['run_id'])
+
+
+def push_stats(context, key: str, stats: dict) -> str:
+    """Write a stage's stats to the run's sidecar directory and XCom the path."""
+    stats_path = run_stats_dir(context) / f"{key}.json"
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    stats_path.write_bytes(orjson.dumps(stats, default=str, option=JSON_OPTIONS))
+    
+    context['task_instance'].xcom_push(key=key, value=str(stats_path))
+    return str(stats_path)
+
+
+def load_run_stats(context) -> dict:
+    """Read every stats sidecar written during this DAG run, keyed by file stem."""
+    return {
+        path.stem: orjson.loads(path.read_bytes())
+        for path in sorted(run_stats_dir(context).glob('*.json'))
+    }
+
 # Default arguments for the DAG
 default_args = {
     'owner': 'arta_seyedian',
@@ -69,7 +146,7 @@ dag = DAG(
         
         # Output formats
         'save_parquet': True,
-        'save_csv': True,
+        'save_csv': False,  # CSV on demand: scripts/04_analyze/export_csv.py
         
         # Quality checks
         'strict_validation': False,  # If True, fail on quality issues
@@ -82,24 +159,23 @@ dag = DAG(
 # STAGE 1: DATA ACQUISITION
 # ============================================================================
 
-def acquire_penndot(**context):
-    """Download PennDOT crash data for all categories and years."""
+def plan_penndot_downloads(**context):
+    """Build the op_kwargs list that the mapped PennDOT download tasks expand over."""
     # Check if this stage should run
     params = context['params']
     if not params.get('run_acquisition', True):
         print("⏭️  Skipping acquisition stage (disabled in params)")
-        return {'status': 'skipped'}
-    
-    import importlib
-    download_penndot = importlib.import_module('scripts.01_acquire.download_penndot')
+        return []  # Zero mapped instances -> download tasks are skipped
     
     # Get parameters
     test_mode = params.get('test_mode', False)
     start_year = params.get('start_year', 2005)
     end_year = params.get('end_year', 2024)
+    parallel_downloads = params.get('parallel_downloads', True)
     
     print(f"{'🧪 TEST MODE' if test_mode else '🚀 FULL MODE'}")
     print(f"📅 Year range: {start_year}-{end_year}")
+    print(f"⚡ Parallel downloads: {'✅' if parallel_downloads else '❌'}")
     
     # Build year list
     if test_mode:
@@ -107,11 +183,29 @@ def acquire_penndot(**context):
     else:
         years = list(range(start_year, end_year + 1))
     
-    # Call the main download function directly
-    stats = download_penndot.download_all_penndot_data(years=years)
+    # One mapped task per year (PennDOT publishes one ZIP per year holding
+    # all 8 categories), or a single task covering every year when disabled.
+    if parallel_downloads:
+        return [{'years': [year]} for year in years]
+    return [{'years': years}]
+
+
+def acquire_penndot(years, **context):
+    """Download PennDOT crash data for all categories of the given years."""
+    download_penndot = stage_module('download_penndot')
+    
+    params = context['params']
+    print(f"📅 Downloading years: {', '.join(str(y) for y in years)}")
     
-    # Push stats to XCom for monitoring
-    context['task_instance'].xcom_push(key='penndot_stats', value=stats)
+    # Call the main download function directly
+    stats = download_penndot.download_all_penndot_data(
+        years=years,
+        max_workers=1,  # Concurrency comes from the mapped tasks + pool
+        skip_existing=params.get('skip_existing', True)
+    )
+    
+    # One sidecar per mapped instance; the report merges them
+    push_stats(context, f"penndot_stats_{context['task_instance'].map_index}", stats)
     return stats
 
 
@@ -123,8 +217,7 @@ def acquire_noaa(**context):
         print("⏭️  Skipping acquisition stage (disabled in params)")
         return {'status': 'skipped'}
     
-    import importlib
-    download_noaa = importlib.import_module('scripts.01_acquire.download_noaa')
+    download_noaa = stage_module('download_noaa')
     
     test_mode = params.get('test_mode', False)
     print(f"{'🧪 TEST MODE' if test_mode else '🚀 FULL MODE'}")
@@ -133,13 +226,26 @@ def acquire_noaa(**context):
     result = download_noaa.main()
     
     stats = {'status': 'success' if result is not None else 'failed'}
-    context['task_instance'].xcom_push(key='noaa_stats', value=stats)
+    push_stats(context, 'noaa_stats', stats)
     return stats
 
 
-task_acquire_penndot = PythonOperator(
+task_plan_penndot = PythonOperator(
+    task_id='plan_penndot_downloads',
+    python_callable=plan_penndot_downloads,
+    dag=dag,
+    doc_md="""
+    ### Plan PennDOT Downloads
+    
+    Expands the configured year range into one work item per year for the
+    mapped `acquire_penndot_data` tasks.
+    """
+)
+
+task_acquire_penndot = PythonOperator.partial(
     task_id='acquire_penndot_data',
     python_callable=acquire_penndot,
+    pool=PENNDOT_POOL,
     dag=dag,
     doc_md="""
     ### Download PennDOT Crash Data
@@ -147,11 +253,16 @@ task_acquire_penndot = PythonOperator(
     Downloads crash data from PennDOT GIS Portal for all 8 categories:
     - CRASH, PERSON, VEHICLE, CYCLE, FLAG, ROADWAY, COMMVEH, TRAILVEH
     
+    Dynamically mapped: one task instance per year, so a failed year is
+    retried on its own. Instances run in the `penndot_pool` pool, which caps
+    concurrent connections to PennDOT. Create it once with:
+    `airflow pools set penndot_pool 8 "PennDOT downloads"`
+    
     **Years**: 2005-2024 (or 2023 only in test mode)
     **Output**: CSV files in `data/raw/`
-    **Expected Duration**: 5-8 minutes (full), 8 seconds (test)
+    **Expected Duration**: 1-2 minutes (full), 8 seconds (test)
     """
-)
+).expand(op_kwargs=task_plan_penndot.output)
 
 task_acquire_noaa = PythonOperator(
     task_id='acquire_noaa_weather',
@@ -185,8 +296,7 @@ def profile_schemas(**context):
         print("⏭️  Skipping profiling stage (disabled in params)")
         return {'status': 'skipped'}
     
-    import importlib
-    profile_data = importlib.import_module('scripts.02_process.profile_data')
+    profile_data = stage_module('profile_data')
     
     print("🔍 Analyzing schema evolution across years...")
     
@@ -194,13 +304,14 @@ def profile_schemas(**context):
     result = profile_data.main()
     
     report = {'status': 'completed'}
-    context['task_instance'].xcom_push(key='schema_report', value=report)
+    push_stats(context, 'schema_report', report)
     return report
 
 
 task_profile = PythonOperator(
     task_id='profile_schemas',
     python_callable=profile_schemas,
+    trigger_rule='all_done',  # Profile whatever years downloaded, even if one failed
     dag=dag,
     doc_md="""
     ### Schema Profiling & Analysis
@@ -220,105 +331,104 @@ task_profile = PythonOperator(
 # STAGE 3: SCHEMA HARMONIZATION
 # ============================================================================
 
-def harmonize_all(**context):
-    """Harmonize schemas and combine all years."""
+def harmonize_category(category, **context):
+    """Harmonize schemas and combine all years for one category."""
     # Check if this stage should run
     params = context['params']
     if not params.get('run_harmonization', True):
         print("⏭️  Skipping harmonization stage (disabled in params)")
         return {'status': 'skipped'}
     
-    import importlib
-    harmonize_schema = importlib.import_module('scripts.02_process.harmonize_schema')
-    
     # Get category filter
     categories = params.get('categories', [])
-    if categories:
-        print(f"📂 Processing categories: {', '.join(categories)}")
-    else:
-        print("📂 Processing all categories")
+    if categories and category not in categories:
+        print(f"⏭️  Skipping {category} (not in selected categories)")
+        return {'status': 'skipped'}
+    
+    harmonize_schema = stage_module('harmonize_schema')
+    
+    print(f"📂 Processing category: {category}")
     
-    # Call the main harmonization function
-    # Note: Pass categories if the function supports it
-    harmonize_schema.main(categories=categories if categories else None)
+    # One category per task; parallelism comes from the sibling tasks
+    results = harmonize_schema.main(categories=[category], max_workers=1)
     
-    stats = {'status': 'completed', 'categories': categories or 'all'}
-    context['task_instance'].xcom_push(key='harmonization_stats', value=stats)
+    stats = {'category': category, **results.get(category, {'status': 'failed'})}
+    push_stats(context, f"harmonization_stats_{category}", stats)
+    
+    if stats['status'] == 'failed':
+        raise RuntimeError(f"Harmonization failed for {category}: {stats.get('error')}")
     return stats
 
 
-task_harmonize = PythonOperator(
-    task_id='harmonize_schemas',
-    python_callable=harmonize_all,
-    dag=dag,
-    doc_md="""
-    ### Schema Harmonization
-    
-    Standardizes schemas across 20 years and combines into single files:
-    - Renames columns to current standard
-    - Adds missing columns (NULL fill)
-    - Removes deprecated columns
-    - Combines all years per category
-    
-    **Output**: 8 parquet files in `data/processed/` (e.g., `crash_harmonized.parquet`)
-    **Expected Duration**: 1-2 seconds (test), 30-60 seconds (full)
-    """
-)
+# One harmonization task per category, so categories run side by side on
+# separate workers and each downstream consumer waits only for its inputs.
+with TaskGroup('harmonize', dag=dag) as task_group_harmonize:
+    harmonize_tasks = {
+        category: PythonOperator(
+            task_id=category.lower(),
+            python_callable=harmonize_category,
+            op_kwargs={'category': category},
+            pool=HARMONIZE_POOL,
+            dag=dag,
+            doc_md=f"""
+            ### Schema Harmonization: {category}
+            
+            Standardizes {category} schemas across 20 years and combines into one file:
+            - Renames columns to current standard
+            - Adds missing columns (NULL fill)
+            - Removes deprecated columns
+            - Combines all years
+            
+            **Output**: `data/processed/{category.lower()}_harmonized.parquet`
+            **Expected Duration**: 1-2 seconds (test), 5-30 seconds (full)
+            """
+        )
+        for category in HARMONIZE_CATEGORIES
+    }
 
 
 # ============================================================================
 # STAGE 4: INTEGRATION
 # ============================================================================
 
-def filter_geography(**context):
-    """Validate geographic coordinates and filter to Philadelphia."""
+def integrate_crashes(**context):
+    """Validate coordinates, filter to Philadelphia and match crashes with daily weather."""
     # Check if this stage should run
     params = context['params']
     if not params.get('run_integration', True):
         print("⏭️  Skipping integration stage (disabled in params)")
         return {'status': 'skipped'}
     
-    import importlib
-    geographic_filter = importlib.import_module('scripts.03_integrate.geographic_filter')
+    integrate = stage_module('integrate')
     
     strict_validation = params.get('strict_validation', False)
     print(f"🗺️  Geographic filtering - {'STRICT' if strict_validation else 'PERMISSIVE'} mode")
-    
-    # Call the main filtering function
-    geographic_filter.main()
-    
-    stats = {'status': 'completed'}
-    context['task_instance'].xcom_push(key='geographic_stats', value=stats)
-    return stats
-
-
-def integrate_weather(**context):
-    """Match crashes with daily weather data."""
-    # Check if this stage should run
-    params = context['params']
-    if not params.get('run_integration', True):
-        print("⏭️  Skipping integration stage (disabled in params)")
-        return {'status': 'skipped'}
-    
-    import importlib
-    merge_weather = importlib.import_module('scripts.03_integrate.merge_weather')
-    
     print("🌦️  Integrating weather data with crashes...")
     
-    # Call the main integration function
-    merge_weather.main()
+    # Geographic filter and weather merge in one pass (no intermediate
+    # parquet); skipped with the recorded stats when the inputs are unchanged
+    stage_stats = integrate.main()
     
-    stats = {'status': 'completed'}
-    context['task_instance'].xcom_push(key='weather_stats', value=stats)
-    return stats
+    status = 'completed' if stage_stats['status'] == 'success' else 'failed'
+    geographic_stats = {'status': status, **stage_stats['geographic']}
+    weather_stats = {'status': status, **stage_stats['weather']}
+    push_stats(context, 'geographic_stats', geographic_stats)
+    push_stats(context, 'weather_stats', weather_stats)
+    
+    if status == 'failed':
+        raise RuntimeError("Crash integration failed")
+    return {'status': status}
 
 
-task_filter_geography = PythonOperator(
-    task_id='filter_geography',
-    python_callable=filter_geography,
+task_integrate = PythonOperator(
+    task_id='integrate_crashes',
+    python_callable=integrate_crashes,
     dag=dag,
     doc_md="""
-    ### Geographic Filtering & Validation
+    ### Geographic Filtering & Weather Integration
+    
+    Runs as a single pass over the harmonized crash data, handing the
+    filtered frame to the weather merge in memory.
     
     Validates coordinates and adds quality flags:
     - Coordinate range validation
@@ -326,24 +436,12 @@ task_filter_geography = PythonOperator(
     - County code verification
     - Quality flagging (not dropping)
     
-    **Output**: `data/processed/crash_geographic.parquet` + quality stats
-    **Expected Duration**: < 1 second
-    """
-)
-
-task_integrate_weather = PythonOperator(
-    task_id='integrate_weather',
-    python_callable=integrate_weather,
-    dag=dag,
-    doc_md="""
-    ### Weather Integration
-    
     Matches crashes with NOAA daily weather:
     - Temporal matching by date
     - Derived features (precip_category, temp_category, adverse_weather)
     - 100% match rate for valid dates
     
-    **Output**: `data/processed/crash_weather_integrated.parquet`
+    **Output**: `data/processed/crash_weather_integrated.parquet` + quality stats
     **Expected Duration**: < 1 second
     """
 )
@@ -361,18 +459,17 @@ def create_analysis_datasets(**context):
         print("⏭️  Skipping dataset creation stage (disabled in params)")
         return {'status': 'skipped'}
     
-    import importlib
-    create_datasets = importlib.import_module('scripts.04_analyze.create_datasets')
+    create_datasets = stage_module('create_datasets')
     
     save_parquet = params.get('save_parquet', True)
-    save_csv = params.get('save_csv', True)
+    save_csv = params.get('save_csv', False)
     
     print(f"📊 Creating analysis datasets")
     print(f"   Parquet: {'✅' if save_parquet else '❌'}")
     print(f"   CSV: {'✅' if save_csv else '❌'}")
     
     # Call the main dataset creation function
-    create_datasets.main()
+    create_datasets.main(save_csv=save_csv)
     
     stats = {
         'status': 'completed',
@@ -381,7 +478,7 @@ def create_analysis_datasets(**context):
             'csv': save_csv
         }
     }
-    context['task_instance'].xcom_push(key='dataset_stats', value=stats)
+    push_stats(context, 'dataset_stats', stats)
     return stats
 
 
@@ -399,7 +496,9 @@ task_create_datasets = PythonOperator(
     - **person.parquet**: Person-level reference table
     - **vehicle.parquet**: Vehicle-level reference table
     
-    All saved as both Parquet and CSV.
+    Saved as Parquet only by default. Set `save_csv` to also write CSV
+    copies, or convert afterwards with
+    `python scripts/04_analyze/export_csv.py <dataset>` (or `--all`).
     
     **Output**: 5 datasets in `data/final/`
     **Expected Duration**: 2-3 seconds (test), 30-60 seconds (full)
@@ -411,19 +510,50 @@ task_create_datasets = PythonOperator(
 # VALIDATION & REPORTING
 # ============================================================================
 
+def merge_penndot_stats(mapped_stats):
+    """Combine the per-year stats written by the mapped PennDOT download tasks."""
+    if not mapped_stats:
+        return {'status': 'skipped'}
+    
+    merged = {
+        'status': 'success',
+        'total_years': 0,
+        'successful_downloads': 0,
+        'failed_downloads': 0,
+        'total_csv_files': 0,
+        'failed_years': []
+    }
+    for stats in mapped_stats:
+        if not stats:
+            continue
+        for key in ['total_years', 'successful_downloads', 'failed_downloads', 'total_csv_files']:
+            merged[key] += stats.get(key, 0)
+        merged['failed_years'].extend(stats.get('failed_years', []))
+    
+    merged['failed_years'].sort()
+    if merged['failed_years']:
+        merged['status'] = 'failed'
+    return merged
+
+
 def generate_pipeline_report(**context):
     """Generate comprehensive pipeline execution report."""
-    ti = context['task_instance']
     params = context['params']
     
-    # Gather all stats from XCom
-    penndot_stats = ti.xcom_pull(key='penndot_stats', task_ids='acquire_penndot_data')
-    noaa_stats = ti.xcom_pull(key='noaa_stats', task_ids='acquire_noaa_weather')
-    schema_report = ti.xcom_pull(key='schema_report', task_ids='profile_schemas')
-    harmonization_stats = ti.xcom_pull(key='harmonization_stats', task_ids='harmonize_schemas')
-    geographic_stats = ti.xcom_pull(key='geographic_stats', task_ids='filter_geography')
-    weather_stats = ti.xcom_pull(key='weather_stats', task_ids='integrate_weather')
-    dataset_stats = ti.xcom_pull(key='dataset_stats', task_ids='create_datasets')
+    # Gather all stats from this run's sidecar files
+    run_stats = load_run_stats(context)
+    penndot_stats = merge_penndot_stats([
+        stats for key, stats in run_stats.items() if key.startswith('penndot_stats_')
+    ])
+    noaa_stats = run_stats.get('noaa_stats')
+    schema_report = run_stats.get('schema_report')
+    harmonization_stats = {
+        key[len('harmonization_stats_'):]: stats
+        for key, stats in run_stats.items() if key.startswith('harmonization_stats_')
+    } or None
+    geographic_stats = run_stats.get('geographic_stats')
+    weather_stats = run_stats.get('weather_stats')
+    dataset_stats = run_stats.get('dataset_stats')
     
     # Create comprehensive report
     report = {
@@ -456,11 +586,8 @@ def generate_pipeline_report(**context):
     }
     
     # Save report
-    import json
-    from datetime import datetime
     report_path = f"/app/metadata/pipeline_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(report_path, 'w') as f:
-        json.dump(report, f, indent=2, default=str)
+    Path(report_path).write_bytes(orjson.dumps(report, default=str, option=JSON_OPTIONS))
     
     print("\n" + "="*60)
     print("✅ PIPELINE COMPLETED SUCCESSFULLY!")
@@ -496,7 +623,7 @@ task_report = PythonOperator(
     ### Generate Pipeline Report
     
     Creates comprehensive execution report with:
-    - Statistics from all stages
+    - Statistics from all stages (read from `metadata/runs/<run_id>/*.json`)
     - Row counts and data quality metrics
     - Execution times
     - Data lineage information
@@ -510,20 +637,24 @@ task_report = PythonOperator(
 # DAG STRUCTURE (Dependencies)
 # ============================================================================
 
-# Stage 1: Acquisition (parallel)
+# Stage 1: Acquisition (parallel; PennDOT fans out one task per year)
+task_plan_penndot >> task_acquire_penndot
 [task_acquire_penndot, task_acquire_noaa] >> task_profile
 
 # Stage 2: Profiling
-task_profile >> task_harmonize
-
-# Stage 3: Harmonization
-task_harmonize >> task_filter_geography
-
-# Stage 4: Integration (sequential within stage)
-task_filter_geography >> task_integrate_weather
-
-# Stage 5: Dataset Creation
-task_integrate_weather >> task_create_datasets
+task_profile >> task_group_harmonize
+
+# Stage 3: Harmonization (one branch per category). Integration only needs
+# CRASH and dataset creation only needs the categories it joins, so neither
+# waits for the rest; every branch still has to finish before the report.
+for category in INTEGRATION_CATEGORIES:
+    harmonize_tasks[category] >> task_integrate
+for category in DATASET_CATEGORIES:
+    harmonize_tasks[category] >> task_create_datasets
+task_group_harmonize >> task_report
+
+# Stage 4: Integration (geographic filter + weather merge in one task)
+task_integrate >> task_create_datasets
 
 # Final: Reporting
 task_create_datasets >> task_report
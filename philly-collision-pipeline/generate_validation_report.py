@@ -19,23 +19,59 @@ Author: FDC Project
 Date: 2024-12-07
 """
 
+import os
 import sys
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
-import json
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import orjson
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent))
 
 from scripts.config import FINAL_DATA_DIR, METADATA_DIR
 
+# Columns the analyses below read from full_integrated.parquet. Only these
+# are decoded; Parquet skips the other column chunks entirely.
+USED_COLS = [
+    'date_approximation_method',
+    'crash_date',
+    'DEC_LAT', 'DEC_LONG',
+    'latitude', 'longitude',
+    'TMAX', 'TMIN', 'PRCP', 'SNOW',
+]
 
-def load_parquet_safe(filepath: Path) -> pd.DataFrame:
-    """Load parquet file with error handling."""
+# JSON report serialization: 2-space indent, numpy scalars and datetimes
+# handled natively, anything else falls back to str()
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def load_parquet_safe(filepath: Path, columns: Optional[List[str]] = None,
+                      row_filter: Optional[ds.Expression] = None,
+                      memory_map: bool = True) -> pd.DataFrame:
+    """
+    Load parquet file (optionally only some columns and rows) with error handling.
+    
+    Scans with Arrow's multi-threaded dataset reader; a row_filter is pushed
+    down so row groups whose statistics rule it out are never decoded. With
+    memory_map the file is mapped rather than read() into buffers, so column
+    chunks come straight from the page cache. The columns are then handed to
+    pandas without consolidating them into 2-D blocks (split_blocks) and each
+    Arrow buffer is freed as soon as it is converted (self_destruct), so peak
+    memory stays near one copy of the data.
+    """
     try:
-        return pd.read_parquet(filepath)
+        filesystem = pafs.LocalFileSystem(use_mmap=memory_map)
+        table = ds.dataset(str(filepath), format="parquet", filesystem=filesystem).to_table(
+            columns=columns, filter=row_filter, use_threads=True
+        )
+        return table.to_pandas(split_blocks=True, self_destruct=True)
     except Exception as e:
         print(f"⚠️  Warning: Could not load {filepath.name}: {e}")
         return None
@@ -46,7 +82,13 @@ def analyze_date_approximation(df: pd.DataFrame) -> Dict[str, Any]:
     if 'date_approximation_method' not in df.columns:
         return {"error": "date_approximation_method column not found"}
     
-    counts = df['date_approximation_method'].value_counts()
+    # Count on the integer category codes (dictionary-encoded in Parquet)
+    methods = df['date_approximation_method']
+    if not isinstance(methods.dtype, pd.CategoricalDtype):
+        methods = methods.astype('category')
+    codes = methods.cat.codes.to_numpy()
+    code_counts = np.bincount(codes[codes >= 0], minlength=len(methods.cat.categories))
+    counts = dict(zip(methods.cat.categories, code_counts))
     total = len(df)
     
     return {
@@ -66,22 +108,39 @@ def analyze_temporal_distribution(df: pd.DataFrame) -> Dict[str, Any]:
         return {"error": "crash_date column not found"}
     
     # Convert to datetime if not already
-    df['crash_date'] = pd.to_datetime(df['crash_date'])
+    dates = df['crash_date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
     
-    # Day of month distribution
-    day_counts = df['crash_date'].dt.day.value_counts().sort_index()
+    # One pass to day resolution; year and day of month are then plain
+    # integer arithmetic on that array instead of two .dt field extractions
+    day_values = dates.to_numpy().astype('datetime64[D]')
+    day_values = day_values[~np.isnat(day_values)]
+    
+    if day_values.size == 0:
+        return {"error": "No valid crash dates"}
     
-    # Year distribution
-    year_counts = df['crash_date'].dt.year.value_counts().sort_index()
+    years = day_values.astype('datetime64[Y]').astype(np.int64) + 1970
+    days = (day_values - day_values.astype('datetime64[M]')).astype(np.int64) + 1
+    
+    # Year distribution: bounds straight from the year array; the small
+    # bincount over that span only counts years that actually have crashes
+    year_min, year_max = int(years.min()), int(years.max())
+    year_counts = np.bincount(years - year_min, minlength=year_max - year_min + 1)
+    total_years = int(np.count_nonzero(year_counts))
+    
+    # Day of month distribution
+    day_counts = np.bincount(days, minlength=32)
+    days_present = np.flatnonzero(day_counts)
     
     return {
-        "year_range": f"{year_counts.index.min()}-{year_counts.index.max()}",
-        "total_years": len(year_counts),
-        "crashes_per_year_avg": round(df.groupby(df['crash_date'].dt.year).size().mean(), 1),
-        "day_1_crashes": int(day_counts.get(1, 0)),
-        "day_1_percentage": round(100 * day_counts.get(1, 0) / len(df), 2),
-        "days_with_crashes": len(day_counts),
-        "most_common_days": day_counts.head(5).to_dict()
+        "year_range": f"{year_min}-{year_max}",
+        "total_years": total_years,
+        "crashes_per_year_avg": round(years.size / total_years, 1),
+        "day_1_crashes": int(day_counts[1]),
+        "day_1_percentage": round(100 * day_counts[1] / len(df), 2),
+        "days_with_crashes": int(days_present.size),
+        "most_common_days": {int(day): int(day_counts[day]) for day in days_present[:5]}
     }
 
 
@@ -93,14 +152,21 @@ def analyze_geographic_coverage(df: pd.DataFrame) -> Dict[str, Any]:
     if lat_col not in df.columns or lon_col not in df.columns:
         return {"error": "Coordinate columns not found"}
     
-    # Filter out invalid coordinates
-    valid_coords = df[(df[lat_col].notna()) & (df[lon_col].notna())]
+    # Filter out invalid coordinates on the two 1-D arrays (no row copy)
+    lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+    lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon = lat[valid], lon[valid]
+    
+    # Empty arrays have no min/max; report NaN like pandas did
+    lat_min, lat_max = (lat.min(), lat.max()) if lat.size else (np.nan, np.nan)
+    lon_min, lon_max = (lon.min(), lon.max()) if lon.size else (np.nan, np.nan)
     
     return {
-        "total_crashes_with_coords": len(valid_coords),
-        "percent_with_coords": round(100 * len(valid_coords) / len(df), 2),
-        "latitude_range": f"{valid_coords[lat_col].min():.6f} to {valid_coords[lat_col].max():.6f}",
-        "longitude_range": f"{valid_coords[lon_col].min():.6f} to {valid_coords[lon_col].max():.6f}",
+        "total_crashes_with_coords": int(lat.size),
+        "percent_with_coords": round(100 * lat.size / len(df), 2),
+        "latitude_range": f"{lat_min:.6f} to {lat_max:.6f}",
+        "longitude_range": f"{lon_min:.6f} to {lon_max:.6f}",
         "coordinate_system": "WGS84 (EPSG:4326)"
     }
 
@@ -113,56 +179,138 @@ def analyze_weather_integration(df: pd.DataFrame) -> Dict[str, Any]:
     if not available_weather:
         return {"error": "No weather columns found"}
     
+    # count() skips NaN without building a boolean mask
+    with_weather = int(df[available_weather[0]].count())
+    
     stats = {
         "weather_fields_integrated": available_weather,
-        "crashes_with_weather": int(df[available_weather[0]].notna().sum()),
-        "percent_with_weather": round(100 * df[available_weather[0]].notna().sum() / len(df), 2)
+        "crashes_with_weather": with_weather,
+        "percent_with_weather": round(100 * with_weather / len(df), 2)
     }
     
     # Temperature stats if available
     if 'TMAX' in df.columns:
-        temps = df['TMAX'].dropna()
+        temps = df['TMAX']  # min/max skip NaN, no dropna() copy needed
         stats['temperature_range_F'] = f"{temps.min():.1f} to {temps.max():.1f}"
     
     # Precipitation stats if available
     if 'PRCP' in df.columns:
-        prcp = df['PRCP'].dropna()
-        stats['crashes_with_precipitation'] = int((prcp > 0).sum())
-        stats['percent_with_precipitation'] = round(100 * (prcp > 0).sum() / len(prcp), 2)
+        prcp = df['PRCP'].to_numpy(dtype=float, na_value=np.nan)
+        n_prcp = int(np.count_nonzero(~np.isnan(prcp)))
+        n_precip = int(np.count_nonzero(prcp > 0))  # NaN > 0 is False
+        stats['crashes_with_precipitation'] = n_precip
+        # NaN when PRCP is all missing, as the mean of an empty series was
+        stats['percent_with_precipitation'] = round(100 * n_precip / n_prcp, 2) if n_prcp else float('nan')
     
     return stats
 
 
-def analyze_data_quality(df: pd.DataFrame) -> Dict[str, Any]:
-    """Analyze overall data quality metrics."""
-    total_records = len(df)
-    total_fields = len(df.columns)
+def parquet_null_counts(filepath: Path) -> Dict[str, int]:
+    """
+    Null count per column of a Parquet file.
+    
+    Summed from the row-group statistics in the footer, so no data pages are
+    read. Only columns whose writer didn't record a null count are read, and
+    Arrow's own null count is used for them (kept per buffer, so there is no
+    per-cell scan and no pandas conversion).
+    """
+    metadata = pq.read_metadata(filepath)
+    null_counts = {name: 0 for name in metadata.schema.to_arrow_schema().names}
+    missing_stats = set()
+    
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for c in range(row_group.num_columns):
+            column = row_group.column(c)
+            stats = column.statistics
+            if stats is None or not stats.has_null_count:
+                missing_stats.add(column.path_in_schema)
+            else:
+                null_counts[column.path_in_schema] += stats.null_count
+    
+    if missing_stats:
+        table = pq.read_table(filepath, columns=sorted(missing_stats))
+        null_counts.update({name: table.column(name).null_count for name in table.column_names})
+    
+    return null_counts
+
+
+def analyze_data_quality(filepath: Path) -> Dict[str, Any]:
+    """Analyze overall data quality metrics from Parquet null counts."""
+    total_records = pq.read_metadata(filepath).num_rows
+    null_counts = parquet_null_counts(filepath)
+    total_fields = len(null_counts)
+    nulls = np.fromiter(null_counts.values(), dtype=np.int64, count=total_fields)
     
-    # Completeness by field
-    completeness = {}
-    for col in df.columns:
-        non_null = df[col].notna().sum()
-        completeness[col] = round(100 * non_null / total_records, 2)
+    # Completeness by field (only the aggregate counts are reported)
+    completeness = np.round(100 * (total_records - nulls) / total_records, 2)
     
     # Overall completeness
-    overall_completeness = round(df.notna().sum().sum() / (total_records * total_fields) * 100, 2)
+    overall_completeness = round(
+        (total_records * total_fields - int(nulls.sum())) / (total_records * total_fields) * 100, 2
+    )
     
     return {
         "total_records": total_records,
         "total_fields": total_fields,
         "overall_completeness_pct": overall_completeness,
-        "fields_with_100pct_completeness": sum(1 for v in completeness.values() if v == 100.0),
-        "fields_below_90pct_completeness": sum(1 for v in completeness.values() if v < 90.0)
+        "fields_with_100pct_completeness": int(np.count_nonzero(completeness == 100.0)),
+        "fields_below_90pct_completeness": int(np.count_nonzero(completeness < 90.0))
     }
 
 
-def generate_report():
-    """Generate comprehensive validation report."""
+# Analyzers and the columns each one reads. They share no state, so on large
+# datasets each runs in its own process with only its columns pickled over.
+ANALYZERS = [
+    ("date_approximation", analyze_date_approximation, ['date_approximation_method']),
+    ("temporal_distribution", analyze_temporal_distribution, ['crash_date']),
+    ("geographic_coverage", analyze_geographic_coverage, ['DEC_LAT', 'DEC_LONG', 'latitude', 'longitude']),
+    ("weather_integration", analyze_weather_integration, ['TMAX', 'TMIN', 'PRCP', 'SNOW']),
+]
+
+# Below this many rows the analyzers finish faster than worker startup
+PARALLEL_THRESHOLD = 1_000_000
+
+
+def run_analyzers(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    """Run every analyzer on its column subset, in parallel for large datasets."""
+    subsets = {
+        name: df[[col for col in columns if col in df.columns]]
+        for name, _, columns in ANALYZERS
+    }
+    
+    if len(df) < PARALLEL_THRESHOLD:
+        return {name: func(subsets[name]) for name, func, _ in ANALYZERS}
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=len(ANALYZERS)) as executor:
+        futures = {
+            executor.submit(func, subsets[name]): name
+            for name, func, _ in ANALYZERS
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    
+    return results
+
+
+def generate_report(row_filter: Optional[ds.Expression] = None):
+    """
+    Generate comprehensive validation report.
+    
+    Args:
+        row_filter: Optional pyarrow dataset expression scoping the analyzed
+            records (e.g. ds.field('crash_date') >= pd.Timestamp('2020-01-01')).
+            Field completeness is always reported for the whole file.
+    """
+    
+    # One timestamp for the whole report (console header, JSON and filename)
+    run_ts = datetime.now()
     
     print("=" * 80)
     print("PHILADELPHIA COLLISION PIPELINE - VALIDATION REPORT")
     print("=" * 80)
-    print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Generated: {run_ts.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Pipeline Version: 2.0")
     print()
     
@@ -175,32 +323,43 @@ def generate_report():
         return
     
     print(f"📂 Loading data from: {integrated_file}")
-    df = load_parquet_safe(integrated_file)
+    
+    # Schema comes from the footer; only the analyzed columns are loaded
+    all_fields = pq.ParquetFile(integrated_file).schema_arrow.names
+    total_fields = len(all_fields)
+    df = load_parquet_safe(
+        integrated_file,
+        columns=[c for c in USED_COLS if c in all_fields],
+        row_filter=row_filter
+    )
     
     if df is None:
         print("❌ Failed to load data")
         return
     
-    print(f"✅ Loaded {len(df):,} records with {len(df.columns)} fields")
+    print(f"✅ Loaded {len(df):,} records with {total_fields} fields ({len(df.columns)} analyzed)")
     print()
     
     # Initialize report
     report = {
         "metadata": {
-            "generated_at": datetime.now().isoformat(),
+            "generated_at": run_ts.isoformat(),
             "pipeline_version": "2.0",
             "dataset": "full_integrated.parquet",
             "total_records": len(df),
-            "total_fields": len(df.columns)
+            "total_fields": total_fields
         }
     }
     
+    # Run the analyzers up front; the sections below only print results
+    analysis = run_analyzers(df)
+    
     # 1. Date Approximation Analysis
     print("-" * 80)
     print("1. TEMPORAL ACCURACY ANALYSIS (v2.0 Weather Matching)")
     print("-" * 80)
     
-    date_stats = analyze_date_approximation(df)
+    date_stats = analysis["date_approximation"]
     report["date_approximation"] = date_stats
     
     if "error" not in date_stats:
@@ -222,7 +381,7 @@ def generate_report():
     print("2. TEMPORAL DISTRIBUTION")
     print("-" * 80)
     
-    temporal_stats = analyze_temporal_distribution(df)
+    temporal_stats = analysis["temporal_distribution"]
     report["temporal_distribution"] = temporal_stats
     
     if "error" not in temporal_stats:
@@ -245,7 +404,7 @@ def generate_report():
     print("3. GEOGRAPHIC COVERAGE")
     print("-" * 80)
     
-    geo_stats = analyze_geographic_coverage(df)
+    geo_stats = analysis["geographic_coverage"]
     report["geographic_coverage"] = geo_stats
     
     if "error" not in geo_stats:
@@ -265,7 +424,7 @@ def generate_report():
     print("4. WEATHER DATA INTEGRATION")
     print("-" * 80)
     
-    weather_stats = analyze_weather_integration(df)
+    weather_stats = analysis["weather_integration"]
     report["weather_integration"] = weather_stats
     
     if "error" not in weather_stats:
@@ -287,7 +446,7 @@ def generate_report():
     print("5. DATA QUALITY METRICS")
     print("-" * 80)
     
-    quality_stats = analyze_data_quality(df)
+    quality_stats = analyze_data_quality(integrated_file)
     report["data_quality"] = quality_stats
     
     print(f"Total Records: {quality_stats['total_records']:,}")
@@ -302,23 +461,35 @@ def generate_report():
     print("6. OUTPUT FILES SUMMARY")
     print("-" * 80)
     
-    output_files = list(FINAL_DATA_DIR.glob("*.parquet"))
-    file_info = []
-    
-    for f in sorted(output_files):
-        size_mb = f.stat().st_size / (1024 * 1024)
-        df_file = load_parquet_safe(f)
-        if df_file is not None:
-            records = len(df_file)
-            fields = len(df_file.columns)
-            file_info.append({
-                "filename": f.name,
-                "size_mb": round(size_mb, 2),
-                "records": records,
-                "fields": fields
-            })
-            print(f"  {f.name}")
-            print(f"    Size: {size_mb:.2f} MB | Records: {records:,} | Fields: {fields}")
+    # scandir entries carry their directory info, so no per-file lookup
+    # beyond the single stat() for the size
+    with os.scandir(FINAL_DATA_DIR) as it:
+        output_files = sorted(
+            (entry for entry in it if entry.name.endswith(".parquet") and entry.is_file()),
+            key=lambda entry: entry.name
+        )
+    # One list per field (column-oriented), same shape as a pyarrow table
+    file_info = {"filename": [], "size_mb": [], "records": [], "fields": []}
+    
+    for entry in output_files:
+        size_mb = entry.stat().st_size / (1024 * 1024)
+        # Row and field counts come from the footer; no column pages decoded
+        try:
+            pf = pq.ParquetFile(entry.path)
+        except Exception as e:
+            print(f"⚠️  Warning: Could not read {entry.name}: {e}")
+            pf = None
+        if pf is not None:
+            records = pf.metadata.num_rows
+            fields = len(pf.schema_arrow.names)
+            file_info["filename"].append(entry.name)
+            file_info["size_mb"].append(round(size_mb, 2))
+            file_info["records"].append(records)
+            file_info["fields"].append(fields)
+    
+    for name, size_mb, records, fields in zip(*file_info.values()):
+        print(f"  {name}")
+        print(f"    Size: {size_mb:.2f} MB | Records: {records:,} | Fields: {fields}")
     
     report["output_files"] = file_info
     print()
@@ -334,9 +505,8 @@ def generate_report():
     print()
     
     # Save JSON report
-    json_report_path = METADATA_DIR / f"validation_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(json_report_path, 'w') as f:
-        json.dump(report, f, indent=2)
+    json_report_path = METADATA_DIR / f"validation_report_{run_ts.strftime('%Y%m%d_%H%M%S')}.json"
+    json_report_path.write_bytes(orjson.dumps(report, default=str, option=JSON_OPTIONS))
     
     print("-" * 80)
     print("REPORT SAVED")
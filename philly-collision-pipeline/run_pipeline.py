@@ -23,18 +23,54 @@ Date: October 2025
 
 import sys
 import argparse
+import importlib
 from pathlib import Path
 from datetime import datetime
-import json
+import orjson
 
 # Add scripts to path
 sys.path.append(str(Path(__file__).parent / "scripts"))
 
 from config import LOGS_DIR, METADATA_DIR
-from utils.logging_utils import setup_logger
+from utils.logging_utils import setup_logger, log_banner
 
-# Initialize logger
+# Results serialization: 2-space indent, numpy scalars and datetimes
+# handled natively, anything else falls back to str()
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+# Stage modules, imported by path because the folder names start with numbers
+STAGE_MODULE_PATHS = {
+    'download_penndot': 'scripts.01_acquire.download_penndot',
+    'download_noaa': 'scripts.01_acquire.download_noaa',
+    'profile_data': 'scripts.02_process.profile_data',
+    'harmonize_schema': 'scripts.02_process.harmonize_schema',
+    'integrate': 'scripts.03_integrate.integrate',
+    'create_datasets': 'scripts.04_analyze.create_datasets',
+}
+
+STAGE_MODULES = {}
+_import_errors = {}
+for _name, _path in STAGE_MODULE_PATHS.items():
+    try:
+        STAGE_MODULES[_name] = importlib.import_module(_path)
+    except Exception as e:
+        # Keep the runner usable for other stages; the stage re-raises on use
+        _import_errors[_path] = e
+
+# Initialize logger. Each stage module sets up its own log file when
+# imported, so this comes after the imports for the runner's file to win
 logger = setup_logger("run_pipeline")
+for _path, _error in _import_errors.items():
+    logger.warning(f"Could not import {_path} at startup: {_error}")
+
+
+def stage_module(name: str):
+    """Return a pre-imported stage module, importing it now if startup failed to."""
+    if name not in STAGE_MODULES:
+        STAGE_MODULES[name] = importlib.import_module(STAGE_MODULE_PATHS[name])
+        # The import set up the stage's log file; switch back to the runner's
+        setup_logger("run_pipeline")
+    return STAGE_MODULES[name]
 
 
 class PipelineRunner:
@@ -55,29 +91,24 @@ class PipelineRunner:
             'stages': {}
         }
         
-        logger.info("=" * 80)
-        logger.info("PHILADELPHIA COLLISION DATA CURATION PIPELINE")
-        logger.info("=" * 80)
-        logger.info(f"Start time: {self.start_time}")
-        logger.info(f"Test mode: {test_mode}")
-        logger.info("=" * 80)
+        log_banner(
+            "PHILADELPHIA COLLISION DATA CURATION PIPELINE\n"
+            f"Start time: {self.start_time}\n"
+            f"Test mode: {test_mode}"
+        )
     
     def run_stage_1_acquire(self) -> bool:
         """
         Stage 1: Data Acquisition
         Download PennDOT crash data and NOAA weather data.
         """
-        logger.info("\n" + "=" * 80)
-        logger.info("STAGE 1: DATA ACQUISITION")
-        logger.info("=" * 80)
+        log_banner("STAGE 1: DATA ACQUISITION")
         
         stage_start = datetime.now()
         
         try:
-            # Import acquisition modules dynamically (folder names start with numbers)
-            import importlib
-            download_penndot = importlib.import_module('scripts.01_acquire.download_penndot')
-            download_noaa = importlib.import_module('scripts.01_acquire.download_noaa')
+            download_penndot = stage_module('download_penndot')
+            download_noaa = stage_module('download_noaa')
             
             # Download PennDOT data
             logger.info("Downloading PennDOT crash data...")
@@ -123,16 +154,12 @@ class PipelineRunner:
         Stage 2: Data Profiling
         Analyze schema changes and data quality issues.
         """
-        logger.info("\n" + "=" * 80)
-        logger.info("STAGE 2: DATA PROFILING")
-        logger.info("=" * 80)
+        log_banner("STAGE 2: DATA PROFILING")
         
         stage_start = datetime.now()
         
         try:
-            # Import processing modules dynamically (folder names start with numbers)
-            import importlib
-            profile_data = importlib.import_module('scripts.02_process.profile_data')
+            profile_data = stage_module('profile_data')
             
             logger.info("Profiling data schemas...")
             report = profile_data.main()
@@ -163,16 +190,12 @@ class PipelineRunner:
         Stage 3: Schema Harmonization
         Standardize schemas and combine all years.
         """
-        logger.info("\n" + "=" * 80)
-        logger.info("STAGE 3: SCHEMA HARMONIZATION")
-        logger.info("=" * 80)
+        log_banner("STAGE 3: SCHEMA HARMONIZATION")
         
         stage_start = datetime.now()
         
         try:
-            # Import harmonization module dynamically
-            import importlib
-            harmonize_schema = importlib.import_module('scripts.02_process.harmonize_schema')
+            harmonize_schema = stage_module('harmonize_schema')
             
             logger.info("Harmonizing schemas across years...")
             if self.test_mode:
@@ -209,27 +232,19 @@ class PipelineRunner:
         Stage 4: Data Integration
         Geographic filtering and weather merging.
         """
-        logger.info("\n" + "=" * 80)
-        logger.info("STAGE 4: GEOGRAPHIC FILTERING & WEATHER INTEGRATION")
-        logger.info("=" * 80)
+        log_banner("STAGE 4: GEOGRAPHIC FILTERING & WEATHER INTEGRATION")
         
         stage_start = datetime.now()
         
         try:
-            # Import integration modules dynamically
-            import importlib
-            geographic_filter = importlib.import_module('scripts.03_integrate.geographic_filter')
-            merge_weather = importlib.import_module('scripts.03_integrate.merge_weather')
+            integrate = stage_module('integrate')
             
-            # Step 1: Geographic filtering
-            logger.info("Step 1: Applying geographic filters...")
-            geo_filter = geographic_filter.GeographicFilter()
-            geo_df = geo_filter.process_category("CRASH")
-            
-            # Step 2: Weather integration  
-            logger.info("\nStep 2: Merging weather data...")
-            weather_integrator = merge_weather.WeatherCrashIntegrator()
-            weather_df = weather_integrator.process_crash_category("CRASH")
+            # Geographic filtering feeds the weather merge in memory; skipped
+            # (with the recorded stats) when the inputs are unchanged
+            logger.info("Applying geographic filters and merging weather data...")
+            integration_stats = integrate.main()
+            if integration_stats['status'] != 'success':
+                raise RuntimeError("Crash integration returned no data")
             
             stage_end = datetime.now()
             duration = (stage_end - stage_start).total_seconds()
@@ -237,8 +252,8 @@ class PipelineRunner:
             self.results['stages']['4_integrate'] = {
                 'status': 'success',
                 'duration_seconds': duration,
-                'geographic_records': len(geo_df) if geo_df is not None else 0,
-                'weather_matched': weather_integrator.stats['crashes_matched']
+                'geographic_records': integration_stats['geographic'].get('final_records', 0),
+                'weather_matched': integration_stats['weather']['crashes_matched']
             }
             
             logger.info(f"Stage 4 completed in {duration:.0f} seconds")
@@ -257,16 +272,12 @@ class PipelineRunner:
         Stage 5: Create Analysis Datasets
         Generate final analysis-ready datasets.
         """
-        logger.info("\n" + "=" * 80)
-        logger.info("STAGE 5: CREATE ANALYSIS DATASETS")
-        logger.info("=" * 80)
+        log_banner("STAGE 5: CREATE ANALYSIS DATASETS")
         
         stage_start = datetime.now()
         
         try:
-            # Import dataset creation module dynamically
-            import importlib
-            create_datasets = importlib.import_module('scripts.04_analyze.create_datasets')
+            create_datasets = stage_module('create_datasets')
             
             logger.info("Creating specialized datasets...")
             results = create_datasets.main()
@@ -338,38 +349,22 @@ class PipelineRunner:
         """Save pipeline execution results to JSON."""
         results_path = LOGS_DIR / f"pipeline_run_{self.start_time.strftime('%Y%m%d_%H%M%S')}.json"
         
-        # Convert numpy types to Python types for JSON serialization
-        def convert_types(obj):
-            """Recursively convert numpy types to Python types."""
-            if isinstance(obj, dict):
-                return {k: convert_types(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_types(item) for item in obj]
-            elif hasattr(obj, 'item'):  # numpy types have .item() method
-                return obj.item()
-            else:
-                return obj
-        
-        results_json = convert_types(self.results)
-        
-        with open(results_path, 'w') as f:
-            json.dump(results_json, f, indent=2)
+        # orjson serializes numpy scalars itself, no conversion pass needed
+        results_path.write_bytes(orjson.dumps(self.results, default=str, option=JSON_OPTIONS))
         
         logger.info(f"Pipeline results saved to {results_path}")
     
     def print_summary(self):
         """Print pipeline execution summary."""
-        logger.info("\n" + "=" * 80)
-        logger.info("PIPELINE EXECUTION SUMMARY")
-        logger.info("=" * 80)
+        log_banner("PIPELINE EXECUTION SUMMARY")
         
         total_duration = self.results['total_duration_seconds']
         hours = int(total_duration // 3600)
         minutes = int((total_duration % 3600) // 60)
         seconds = int(total_duration % 60)
         
-        logger.info(f"Total duration: {hours}h {minutes}m {seconds}s")
-        logger.info("")
+        # Stage lines and closing rule go out as one record, like the banner
+        lines = [f"Total duration: {hours}h {minutes}m {seconds}s", ""]
         
         for stage_name, stage_info in self.results['stages'].items():
             status = stage_info['status']
@@ -381,9 +376,10 @@ class PipelineRunner:
                 'pending': '○'
             }.get(status, '?')
             
-            logger.info(f"{status_emoji} {stage_name}: {status.upper()} ({duration:.0f}s)")
+            lines.append(f"{status_emoji} {stage_name}: {status.upper()} ({duration:.0f}s)")
         
-        logger.info("=" * 80)
+        lines.append("=" * 80)
+        logger.info("\n".join(lines))
 
 
 def main():
@@ -19,11 +19,17 @@ Author: Arta Seyedian
 Date: October 2025
 """
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import time
 from tqdm import tqdm
 
@@ -39,6 +45,7 @@ from config import (
     OUTPUT_FORMAT
 )
 from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.io_utils import write_parquet
 
 
 logger = setup_logger("download_noaa")
@@ -47,6 +54,21 @@ logger = setup_logger("download_noaa")
 # NOAA CDO API endpoint
 NOAA_BASE_URL = "https://www.ncei.noaa.gov/cdo-web/api/v2"
 
+# (connect, read) timeouts in seconds
+NOAA_TIMEOUT = (3, 30)
+
+# CDO allows 5 requests per second per token; requests from all worker
+# threads are spaced at least this far apart
+NOAA_MIN_REQUEST_INTERVAL = 0.2
+
+# Number of years fetched at once. Each year is a chain of paginated,
+# latency-bound requests, so overlapping years hides the round-trips while
+# the shared throttle keeps the total request rate within the API limit.
+DEFAULT_MAX_WORKERS = 4
+
+# Pages of one year requested at once once the result count is known
+PAGE_WORKERS = 4
+
 # Data types we want to retrieve
 NOAA_DATATYPES = [
     "TMAX",  # Maximum temperature
@@ -59,6 +81,52 @@ NOAA_DATATYPES = [
     "SNWD",  # Snow depth
 ]
 
+# zstd level for the saved weather table
+WEATHER_COMPRESSION_LEVEL = 9
+
+# Output column name and scale factor for each datatype (temperatures
+# arrive in tenths of a degree)
+NOAA_COLUMNS = {
+    "TMAX": ("temp_max_c", 0.1),
+    "TMIN": ("temp_min_c", 0.1),
+    "TAVG": ("temp_avg_c", 0.1),
+    "PRCP": ("precipitation_mm", 1.0),
+    "AWND": ("wind_speed_avg_ms", 1.0),
+    "WSF2": ("wind_speed_max_ms", 1.0),
+    "SNOW": ("snowfall_mm", 1.0),
+    "SNWD": ("snow_depth_mm", 1.0),
+}
+
+# Record fields kept from each CDO /data result and their column dtypes
+NOAA_RECORD_DTYPES = {
+    "date": "datetime64[D]",
+    "datatype": object,
+    "value": "float64",
+    "attributes": object,
+}
+
+
+def page_to_columns(results: List[dict]) -> Dict[str, np.ndarray]:
+    """
+    Unpack one page of CDO records into typed column arrays.
+    
+    Args:
+        results: Records from one API page
+        
+    Returns:
+        Dict of field name -> array, one element per record
+    """
+    columns = {
+        name: np.empty(len(results), dtype=dtype)
+        for name, dtype in NOAA_RECORD_DTYPES.items()
+    }
+    for i, record in enumerate(results):
+        columns["date"][i] = record["date"][:10]  # "YYYY-MM-DDT00:00:00"
+        columns["datatype"][i] = record["datatype"]
+        columns["value"][i] = record["value"]
+        columns["attributes"][i] = record.get("attributes", "")
+    return columns
+
 
 class NOAADataDownloader:
     """Handler for NOAA Climate Data Online API requests."""
@@ -78,8 +146,30 @@ class NOAADataDownloader:
         self.session = requests.Session()
         self.session.headers.update(self.headers)
         
+        # Keep-alive connection pool so paginated requests reuse one TLS
+        # connection; transient server errors are retried with backoff
+        retry = Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET",)
+        )
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        
+        # Shared across worker threads so concurrent years respect the rate limit
+        self._throttle_lock = threading.Lock()
+        self._last_request = 0.0
+        
         logger.info("NOAA Data Downloader initialized")
     
+    def _throttle(self):
+        """Block until NOAA_MIN_REQUEST_INTERVAL has passed since the last request."""
+        with self._throttle_lock:
+            wait_time = self._last_request + NOAA_MIN_REQUEST_INTERVAL - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            self._last_request = time.monotonic()
+    
     def _make_request(self, endpoint: str, params: dict, max_retries: int = 3) -> Optional[dict]:
         """
         Make API request with retry logic.
@@ -96,7 +186,8 @@ class NOAADataDownloader:
         
         for attempt in range(max_retries):
             try:
-                response = self.session.get(url, params=params, timeout=30)
+                self._throttle()
+                response = self.session.get(url, params=params, timeout=NOAA_TIMEOUT)
                 
                 # Check for rate limiting
                 if response.status_code == 429:
@@ -106,9 +197,11 @@ class NOAADataDownloader:
                     continue
                 
                 response.raise_for_status()
-                return response.json()
+                # orjson decodes the 1000-record pages about twice as fast
+                # as the stdlib json behind response.json()
+                return orjson.loads(response.content)
                 
-            except requests.exceptions.RequestException as e:
+            except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
                 logger.warning(f"Request attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
                     time.sleep((attempt + 1) * 5)
@@ -118,6 +211,72 @@ class NOAADataDownloader:
         
         return None
     
+    def iter_pages(self, endpoint: str, params: dict, limit: int = 1000,
+                   resultset: Optional[dict] = None) -> Iterator[List[dict]]:
+        """
+        Page through a paginated endpoint using offset-based cursors.
+        
+        The first response reports the total result count, so the offsets of
+        all remaining pages are known up front and fetched concurrently
+        (still through the shared throttle). Without a count, pages are
+        walked one by one until a short page.
+        
+        A page that still fails after _make_request's retries raises instead
+        of ending the iteration, so a result with missing pages is never
+        mistaken for a complete one.
+        
+        Args:
+            endpoint: API endpoint (e.g., 'data')
+            params: Query parameters (limit/offset are managed here)
+            limit: Records per page (NOAA maximum is 1000)
+            resultset: If given, filled with the first response's resultset
+                metadata (including the total 'count'), so callers can check
+                they received every record
+            
+        Yields:
+            List of result records for each page, in offset order
+            
+        Raises:
+            RuntimeError: If a page could not be fetched
+        """
+        fetch_page = lambda offset: self._make_request(endpoint, dict(params, limit=limit, offset=offset))
+        
+        def page_failed(offset: int) -> RuntimeError:
+            return RuntimeError(f"Failed to fetch {endpoint} page at offset {offset}; result would be incomplete")
+        
+        response = fetch_page(1)
+        if response is None:
+            raise page_failed(1)
+        if "results" not in response:
+            return  # No data for these parameters
+        yield response["results"]
+        
+        metadata = response.get("metadata", {}).get("resultset", {})
+        if resultset is not None:
+            resultset.update(metadata)
+        total = metadata.get("count")
+        
+        if total is not None:
+            offsets = range(1 + limit, total + 1, limit)
+            with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+                for offset, response in zip(offsets, executor.map(fetch_page, offsets)):
+                    # Within the reported count, every page must have results
+                    if not response or "results" not in response:
+                        raise page_failed(offset)
+                    yield response["results"]
+            return
+        
+        # No result count: check if more data available after each page
+        offset = 1
+        while len(response["results"]) == limit:
+            offset += limit
+            response = fetch_page(offset)
+            if response is None:
+                raise page_failed(offset)
+            if "results" not in response:
+                return  # Previous page was the last one
+            yield response["results"]
+    
     def get_station_info(self, station_id: str) -> Optional[dict]:
         """
         Get information about a weather station.
@@ -166,9 +325,10 @@ class NOAADataDownloader:
         logger.info(f"Downloading data from {start_date} to {end_date}")
         logger.info(f"Data types: {', '.join(datatypes)}")
         
-        all_results = []
-        offset = 1
-        limit = 1000  # NOAA API limit per request
+        # Per-field list of page arrays, concatenated once at the end
+        pages = {name: [] for name in NOAA_RECORD_DTYPES}
+        total_records = 0
+        resultset = {}
         
         params = {
             "datasetid": "GHCND",  # Global Historical Climatology Network Daily
@@ -176,108 +336,133 @@ class NOAADataDownloader:
             "startdate": start_date,
             "enddate": end_date,
             "units": "metric",
-            "limit": limit,
-            "offset": offset
         }
         
-        # Add datatypes if specified
+        # Add datatypes if specified. CDO chains multiple ids as repeated
+        # parameters (datatypeid=TMAX&datatypeid=TMIN...), so every type
+        # comes back in the same pages instead of one request per type.
         if datatypes:
-            params["datatypeid"] = ",".join(datatypes)
+            params["datatypeid"] = list(datatypes)
         
         with tqdm(desc=f"Downloading {start_date} to {end_date}", unit="records") as pbar:
-            while True:
-                params["offset"] = offset
-                response = self._make_request("data", params)
-                
-                if not response or "results" not in response:
-                    break
-                
-                results = response["results"]
-                all_results.extend(results)
+            for results in self.iter_pages("data", params, resultset=resultset):
+                for name, values in page_to_columns(results).items():
+                    pages[name].append(values)
+                total_records += len(results)
                 pbar.update(len(results))
-                
-                # Check if more data available
-                if len(results) < limit:
-                    break
-                
-                offset += limit
-                time.sleep(0.5)  # Be nice to the API
         
-        logger.info(f"Retrieved {len(all_results)} total records")
+        logger.info(f"Retrieved {total_records} total records")
         
-        # Convert to DataFrame
-        if all_results:
-            df = pd.DataFrame(all_results)
+        # Convert to DataFrame. The API's record count travels with it so
+        # callers can tell a complete result from one with missing pages
+        if total_records:
+            df = pd.DataFrame({name: np.concatenate(arrays) for name, arrays in pages.items()})
+            df.attrs['resultset_count'] = resultset.get('count')
             return df
         else:
             logger.warning("No data retrieved")
             return pd.DataFrame()
     
-    def download_year_data(self, station_id: str, year: int) -> pd.DataFrame:
+    def download_year_data(self, station_id: str, year: int, refresh: bool = False) -> pd.DataFrame:
         """
         Download weather data for a full year.
         
+        Completed years are cached as raw Parquet in RAW_DATA_DIR and served
+        from there on later runs; the current year is always re-fetched,
+        since NOAA is still adding observations for it. A year is only cached
+        when every record the API reported was received.
+        
         Args:
             station_id: NOAA station ID
             year: Year to download
+            refresh: Ignore (and overwrite) a cached copy of the year
             
         Returns:
             DataFrame with year's weather data
         """
+        cache_file = year_cache_path(station_id, year)
+        cacheable = year < datetime.now().year
+        
+        if cacheable and not refresh and cache_file.exists():
+            logger.info(f"Using cached weather data for year {year} ({cache_file.name})")
+            return pd.read_parquet(cache_file)
+        
         logger.info(f"Downloading weather data for year {year}")
         
         start_date = f"{year}-01-01"
         end_date = f"{year}-12-31"
         
-        return self.download_daily_data(station_id, start_date, end_date)
+        df = self.download_daily_data(station_id, start_date, end_date)
+        
+        if cacheable and not df.empty:
+            expected = df.attrs.get('resultset_count')
+            if expected == len(df):
+                write_parquet(df, cache_file)
+            else:
+                logger.warning(f"Year {year}: received {len(df)} of {expected} records, not caching")
+        
+        return df
 
 
-def process_weather_data(df: pd.DataFrame) -> pd.DataFrame:
+def year_cache_path(station_id: str, year: int) -> Path:
+    """Raw per-year cache file for a station (e.g. noaa_raw_GHCND_USW00013739_2020.parquet)."""
+    station = station_id.replace(":", "_")
+    return RAW_DATA_DIR / f"noaa_raw_{station}_{year}.parquet"
+
+
+def pivot_observations(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Process raw NOAA data into analysis-ready format.
+    Reshape raw NOAA observations to one column per datatype.
     
     Args:
-        df: Raw NOAA data DataFrame
+        df: Raw NOAA data (one row per date and datatype)
         
     Returns:
-        Processed DataFrame with one row per date
+        Wide DataFrame indexed by date, one column per datatype code
     """
-    if df.empty:
-        logger.warning("Empty DataFrame provided for processing")
-        return df
+    # Parse dates; ~8 distinct datatypes become integer category codes
+    # instead of a str per row, and an integer key for the reshape below
+    df = df.assign(
+        date=pd.to_datetime(df['date']),
+        datatype=df['datatype'].astype('category')
+    )
     
-    logger.info("Processing weather data")
-    log_dataframe_info(df, "Raw NOAA data")
-    
-    # Parse date column
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Pivot so each datatype becomes a column
-    df_pivot = df.pivot_table(
-        index='date',
-        columns='datatype',
-        values='value',
-        aggfunc='first'
-    ).reset_index()
-    
-    # Rename columns to be more descriptive
-    column_mapping = {
-        'TMAX': 'temp_max_c',
-        'TMIN': 'temp_min_c',
-        'TAVG': 'temp_avg_c',
-        'PRCP': 'precipitation_mm',
-        'AWND': 'wind_speed_avg_ms',
-        'WSF2': 'wind_speed_max_ms',
-        'SNOW': 'snowfall_mm',
-        'SNWD': 'snow_depth_mm'
-    }
+    # Pivot so each datatype becomes a column. GHCND has at most one value
+    # per (date, datatype); dropping any repeats up front (keeping the first,
+    # as aggfunc='first' did) lets a plain pivot skip the groupby machinery
+    # of pivot_table.
+    df_pivot = (
+        df.drop_duplicates(['date', 'datatype'])
+          .pivot(index='date', columns='datatype', values='value')
+    )
+    # Plain string labels, so later concat/rename see an ordinary Index
+    # rather than a CategoricalIndex
+    df_pivot.columns = df_pivot.columns.astype(str)
+    return df_pivot
+
+
+def finish_weather_data(df_pivot: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn pivoted NOAA observations into the analysis-ready weather table.
     
-    df_pivot = df_pivot.rename(columns=column_mapping)
+    Args:
+        df_pivot: Output of pivot_observations (possibly several concatenated)
+        
+    Returns:
+        DataFrame with one row per date and descriptive column names
+    """
+    # Datatype columns in a stable (alphabetical) order, then date as a column
+    df_pivot = df_pivot.sort_index(axis=1).reset_index()
     
-    # Convert temperature from tenths of degrees to degrees
-    for col in ['temp_max_c', 'temp_min_c', 'temp_avg_c']:
-        if col in df_pivot.columns:
-            df_pivot[col] = df_pivot[col] / 10.0
+    # Rename columns to be more descriptive and apply unit scaling in one go
+    # (temperatures from tenths of degrees to degrees)
+    df_pivot = df_pivot.rename(
+        columns={code: name for code, (name, _) in NOAA_COLUMNS.items()}
+    ).assign(**{
+        name: df_pivot[code] * scale
+        for code, (name, scale) in NOAA_COLUMNS.items()
+        if scale != 1.0 and code in df_pivot.columns
+    })
     
     # Sort by date
     df_pivot = df_pivot.sort_values('date')
@@ -288,18 +473,45 @@ def process_weather_data(df: pd.DataFrame) -> pd.DataFrame:
     return df_pivot
 
 
+def process_weather_data(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Process raw NOAA data into analysis-ready format.
+    
+    Args:
+        df: Raw NOAA data DataFrame
+        
+    Returns:
+        Processed DataFrame with one row per date
+    """
+    if df.empty:
+        logger.warning("Empty DataFrame provided for processing")
+        return df
+    
+    logger.info("Processing weather data")
+    log_dataframe_info(df, "Raw NOAA data")
+    
+    return finish_weather_data(pivot_observations(df))
+
+
 def download_all_weather_data(
     station_id: str = NOAA_STATION_ID,
     start_year: int = START_YEAR,
-    end_year: int = END_YEAR
+    end_year: int = END_YEAR,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    refresh: bool = False
 ) -> pd.DataFrame:
     """
     Download all weather data for the specified time period.
     
+    Years are fetched concurrently over the downloader's shared session;
+    its throttle keeps the combined request rate within NOAA's limit.
+    
     Args:
         station_id: NOAA weather station ID
         start_year: First year to download
         end_year: Last year to download
+        max_workers: Number of years to download at once (1 = sequential)
+        refresh: Re-download years that are already cached
         
     Returns:
         Combined DataFrame with all weather data
@@ -309,26 +521,36 @@ def download_all_weather_data(
     # Get station info
     downloader.get_station_info(station_id)
     
-    all_data = []
+    years = list(range(start_year, end_year + 1))
+    year_data = {}
     
-    for year in range(start_year, end_year + 1):
-        logger.info(f"Processing year {year}")
-        
-        df_year = downloader.download_year_data(station_id, year)
-        
-        if not df_year.empty:
-            all_data.append(df_year)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(downloader.download_year_data, station_id, year, refresh): year
+            for year in years
+        }
         
-        # Be nice to the API
-        time.sleep(1)
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                df_year = future.result()
+            except Exception as e:
+                logger.error(f"Failed to download weather for {year}, skipping: {e}")
+                continue
+            
+            # Reshape each year as it arrives (~365 wide rows instead of
+            # thousands of long ones), so the multi-year long frame is never
+            # built and only the small wide frames are concatenated
+            if not df_year.empty:
+                year_data[year] = pivot_observations(df_year)
     
-    # Combine all years
-    if all_data:
-        df_combined = pd.concat(all_data, ignore_index=True)
-        logger.info(f"Combined data: {len(df_combined)} total records")
+    # Combine all years (in year order, regardless of completion order)
+    if year_data:
+        df_combined = pd.concat([year_data[year] for year in sorted(year_data)])
+        logger.info(f"Combined data: {len(df_combined)} days")
         
         # Process into analysis-ready format
-        df_processed = process_weather_data(df_combined)
+        df_processed = finish_weather_data(df_combined)
         
         return df_processed
     else:
@@ -353,7 +575,9 @@ def save_weather_data(df: pd.DataFrame, filename: str = "noaa_weather_philly"):
     logger.info(f"Saving weather data to {output_path}")
     
     if OUTPUT_FORMAT == "parquet":
-        df.to_parquet(output_path, index=False)
+        # A few thousand rows written once and read by every integration
+        # run, so the slower, tighter zstd level costs nothing noticeable
+        write_parquet(df, output_path, compression_level=WEATHER_COMPRESSION_LEVEL)
     else:
         df.to_csv(output_path, index=False)
     
@@ -361,8 +585,13 @@ def save_weather_data(df: pd.DataFrame, filename: str = "noaa_weather_philly"):
     log_dataframe_info(df, "Saved weather data")
 
 
-def main():
-    """Main execution function."""
+def main(refresh: bool = False):
+    """
+    Main execution function.
+    
+    Args:
+        refresh: Re-download years that are already cached
+    """
     logger.info("NOAA Weather Data Acquisition Script Started")
     logger.info(f"Station: {NOAA_STATION_ID}")
     logger.info(f"Years: {START_YEAR}-{END_YEAR}")
@@ -375,7 +604,7 @@ def main():
         return None
     
     # Download data
-    df_weather = download_all_weather_data()
+    df_weather = download_all_weather_data(refresh=refresh)
     
     if not df_weather.empty:
         # Save to file
@@ -389,4 +618,14 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Download NOAA weather data for Philadelphia")
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='Re-download years already cached in data/raw/'
+    )
+    
+    args = parser.parse_args()
+    main(refresh=args.refresh)
@@ -18,10 +18,20 @@ Author: Arta Seyedian
 Date: October 2025
 """
 
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 import zipfile
 from pathlib import Path
-from typing import List, Tuple
+from typing import BinaryIO, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 from tqdm import tqdm
 import pandas as pd
@@ -37,50 +47,275 @@ from config import (
     RAW_DATA_DIR,
     get_raw_data_path
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
 
 
 # Initialize logger
 logger = setup_logger("download_penndot")
 
+# Number of yearly archives fetched at once. Downloads are network-bound,
+# so a small pool overlaps round-trips without hammering the PennDOT server.
+DEFAULT_MAX_WORKERS = 4
 
-def download_file(url: str, dest_path: Path, max_retries: int = 3) -> bool:
+# One keep-alive pool shared by all download threads, so the yearly archives
+# reuse TCP/TLS connections to the PennDOT host instead of handshaking per
+# year. Connection errors and 5xx/429 responses are retried with backoff
+# here; download_and_extract's own loop covers failures in the middle of a
+# stream.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=DEFAULT_MAX_WORKERS,
+    pool_maxsize=DEFAULT_MAX_WORKERS,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",)
+    )
+))
+
+# Archives up to this size are spooled in memory while downloading; larger
+# ones spill to an anonymous temporary file. Either way the ZIP is not kept.
+SPOOL_MAX_BYTES = 512 * 1024 * 1024
+
+# Bytes read from the HTTP stream per write; large chunks keep the Python
+# loop (and progress bar updates) to ~1k iterations per GB
+CHUNK_SIZE = 1024 * 1024
+
+# Minimum seconds between progress bar redraws
+PROGRESS_MININTERVAL = 0.5
+
+# Members of one archive inflated at once (years already extract in parallel)
+EXTRACT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Matches a category name anywhere in an upper-cased CSV filename
+# (e.g. "CRASH_PHILADELPHIA_2020.CSV"); the named group is the category
+CATEGORY_PATTERN = re.compile('|'.join(f'(?P<{c}>{c})' for c in PENNDOT_CATEGORIES))
+EXPECTED_CATEGORIES = frozenset(PENNDOT_CATEGORIES)
+
+
+def meta_path(dest_path: Path) -> Path:
+    """Sidecar file holding the HTTP validators of a downloaded file."""
+    return dest_path.with_name(dest_path.name + ".meta.json")
+
+
+def recorded_members(dest_path: Path, extract_dir: Path) -> List[Path]:
+    """
+    List the files extracted from a previous download of an archive.
+    
+    Args:
+        dest_path: Archive path the download was recorded under
+        extract_dir: Directory the archive was extracted to
+        
+    Returns:
+        Extracted paths, or an empty list if unrecorded or any file is missing
+    """
+    meta_file = meta_path(dest_path)
+    if not meta_file.exists():
+        return []
+    
+    members = json.loads(meta_file.read_text()).get('members', [])
+    paths = [extract_dir / name for name in members]
+    return paths if paths and all(path.exists() for path in paths) else []
+
+
+def conditional_headers(dest_path: Path, extract_dir: Path) -> dict:
+    """
+    Build If-None-Match / If-Modified-Since headers from a previous download.
+    
+    Args:
+        dest_path: Archive path the download was recorded under
+        extract_dir: Directory the archive was extracted to
+        
+    Returns:
+        Request headers (empty if the extracted files or validators are missing)
+    """
+    if not recorded_members(dest_path, extract_dir):
+        return {}
+    
+    meta = json.loads(meta_path(dest_path).read_text())
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def archive_digest(fileobj: BinaryIO) -> str:
+    """
+    SHA-256 of an archive, read from the file object's current position.
+    
+    Args:
+        fileobj: Binary file object positioned at the start of the archive
+        
+    Returns:
+        Hex digest string
+    """
+    if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+        return hashlib.file_digest(fileobj, 'sha256').hexdigest()
+    
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_download(dest_path: Path, extract_dir: Path, extracted_files: List[Path],
+                    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                    content_length: Optional[int] = None, sha256: Optional[str] = None):
+    """
+    Write the sidecar that lets later runs revalidate instead of re-downloading.
+    
+    Args:
+        dest_path: Archive path the download is recorded under
+        extract_dir: Directory the archive was extracted to
+        extracted_files: Files extracted from the archive
+        url: Source URL
+        etag: ETag response header, if any
+        last_modified: Last-Modified response header, if any
+        content_length: Archive size in bytes, if known
+        sha256: Archive digest, if known
+    """
+    meta_path(dest_path).write_text(json.dumps({
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'content_length': content_length,
+        'sha256': sha256,
+        'members': [str(path.relative_to(extract_dir)) for path in extracted_files]
+    }, indent=2))
+
+
+def remove_archive(zip_path: Path):
+    """Delete a ZIP kept on disk by an older run once its CSVs are extracted."""
+    if zip_path.exists():
+        freed_mb = zip_path.stat().st_size / (1024 * 1024)
+        zip_path.unlink()
+        logger.info(f"Removed {zip_path.name} ({freed_mb:.1f} MB freed)")
+
+
+def same_size_upstream(url: str, dest_path: Path) -> bool:
+    """
+    Check a previous download against the server's Content-Length.
+    
+    Fallback for responses that carried no ETag / Last-Modified, so a
+    conditional GET isn't possible: a HEAD request costs one round-trip
+    instead of the whole archive.
+    
+    Args:
+        url: Source URL
+        dest_path: Archive path the download was recorded under
+        
+    Returns:
+        True if the upstream size equals the recorded download size
+    """
+    meta_file = meta_path(dest_path)
+    if not meta_file.exists():
+        return False
+    
+    recorded_size = json.loads(meta_file.read_text()).get('content_length')
+    if not recorded_size:
+        return False
+    
+    try:
+        response = _SESSION.head(url, timeout=10, allow_redirects=True)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"HEAD {url} failed: {e}")
+        return False
+    
+    return response.ok and int(response.headers.get('content-length', 0)) == recorded_size
+
+
+def download_and_extract(url: str, dest_path: Path, extract_dir: Path,
+                         max_retries: int = 3, conditional: bool = False) -> Optional[List[Path]]:
     """
-    Download a file from URL to destination path with retry logic.
+    Download a ZIP archive and extract it, with retry logic.
+    
+    The archive is spooled in memory (spilling to a temporary file past
+    SPOOL_MAX_BYTES) and extracted from there, so it is never written to
+    RAW_DATA_DIR and read back. The response's ETag / Last-Modified /
+    Content-Length and the extracted member names are stored in a sidecar
+    named after `dest_path`. With `conditional=True` the validators are sent
+    back, and a 304 Not Modified keeps the previously extracted files without
+    transferring anything; without validators, an unchanged Content-Length on
+    a HEAD request does the same.
     
     Args:
         url: Source URL
-        dest_path: Destination file path
+        dest_path: Archive path the download is recorded under
+        extract_dir: Directory to extract to
         max_retries: Maximum number of retry attempts
+        conditional: Revalidate a previous download instead of re-fetching
         
     Returns:
-        bool: True if successful, False otherwise
+        List of extracted file paths, or None if the download failed
     """
+    headers = conditional_headers(dest_path, extract_dir) if conditional else {}
+    
+    # No validators to send: fall back to comparing sizes with a HEAD request
+    if (conditional and not headers and recorded_members(dest_path, extract_dir)
+            and same_size_upstream(url, dest_path)):
+        logger.info(f"{dest_path.name} has the recorded size upstream, keeping extracted files")
+        return recorded_members(dest_path, extract_dir)
+    
     for attempt in range(max_retries):
         try:
             logger.info(f"Downloading {url} (attempt {attempt + 1}/{max_retries})")
             
-            response = requests.get(url, stream=True, timeout=60)
+            response = _SESSION.get(url, stream=True, timeout=60, headers=headers)
+            if response.status_code == 304:
+                logger.info(f"{dest_path.name} not modified upstream, keeping extracted files")
+                return recorded_members(dest_path, extract_dir)
             response.raise_for_status()
             
             # Get file size if available
             total_size = int(response.headers.get('content-length', 0))
             
-            # Download with progress bar
-            with open(dest_path, 'wb') as f:
-                if total_size:
-                    with tqdm(total=total_size, unit='B', unit_scale=True, desc=dest_path.name) as pbar:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
+            # Download (with a progress bar on an interactive terminal only;
+            # in Airflow/cron logs it is just noise), then extract from the
+            # spooled copy
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buffer:
+                if total_size and sys.stderr.isatty():
+                    with tqdm(total=total_size, unit='B', unit_scale=True, desc=dest_path.name,
+                              mininterval=PROGRESS_MININTERVAL) as pbar:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            buffer.write(chunk)
                             pbar.update(len(chunk))
                 else:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                    # Raw reads raise urllib3 errors, caught below for a retry
+                    response.raw.decode_content = True
+                    shutil.copyfileobj(response.raw, buffer, length=CHUNK_SIZE)
+                
+                buffer.seek(0)
+                digest = archive_digest(buffer)
+                
+                # Byte-identical to the archive the current CSVs came from:
+                # keep them (and their mtimes, so stage caches stay valid)
+                previous_files = recorded_members(dest_path, extract_dir)
+                if previous_files and json.loads(meta_path(dest_path).read_text()).get('sha256') == digest:
+                    logger.info(f"{dest_path.name} identical to the extracted copy, skipping extraction")
+                    extracted_files = previous_files
+                else:
+                    buffer.seek(0)
+                    extracted_files = extract_zip(buffer, extract_dir, name=dest_path.name)
+            
+            if not extracted_files:
+                return None
             
-            logger.info(f"Successfully downloaded {dest_path}")
-            return True
+            # Remember validators and members for the next conditional request
+            record_download(
+                dest_path, extract_dir, extracted_files, url,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                content_length=total_size or None,
+                sha256=digest
+            )
             
-        except requests.exceptions.RequestException as e:
+            logger.info(f"Successfully downloaded and extracted {dest_path.name}")
+            return extracted_files
+            
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
             logger.warning(f"Download attempt {attempt + 1} failed: {e}")
             if attempt < max_retries - 1:
                 wait_time = (attempt + 1) * 5  # Exponential backoff
@@ -88,80 +323,151 @@ def download_file(url: str, dest_path: Path, max_retries: int = 3) -> bool:
                 time.sleep(wait_time)
             else:
                 logger.error(f"Failed to download {url} after {max_retries} attempts")
-                return False
+                return None
     
-    return False
+    return None
 
 
-def extract_zip(zip_path: Path, extract_dir: Path) -> List[Path]:
+def extract_zip(archive: Union[Path, BinaryIO], extract_dir: Path,
+                name: Optional[str] = None) -> List[Path]:
     """
-    Extract ZIP file to directory.
+    Extract the CSV members of a ZIP file to directory.
+    
+    Other members (PDF data dictionaries, readmes) are never written.
+    CSVs are first extracted into a private staging directory and then
+    renamed into place, so concurrent years never write the same path and
+    readers never see a half-written file.
     
     Args:
-        zip_path: Path to ZIP file
+        archive: Path to ZIP file, or a binary file object holding one
         extract_dir: Directory to extract to
+        name: Archive name for logging (default: the path's name)
         
     Returns:
-        List of extracted file paths
+        List of extracted CSV paths
     """
+    name = name or Path(archive).name
     extracted_files = []
+    staging_dir = Path(tempfile.mkdtemp(prefix=f".{Path(name).stem}-", dir=extract_dir))
     
     try:
-        logger.info(f"Extracting {zip_path}")
+        logger.info(f"Extracting {name}")
         
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Get list of files
-            file_list = zip_ref.namelist()
-            logger.info(f"ZIP contains {len(file_list)} files")
+        with zipfile.ZipFile(archive, 'r') as zip_ref:
+            # Only the CSV members are needed downstream
+            members = zip_ref.infolist()
+            csv_members = [info for info in members if is_csv_member(info)]
+            logger.info(f"ZIP contains {len(members)} files ({len(csv_members)} CSV)")
             
-            # Extract all files
-            zip_ref.extractall(extract_dir)
+            # Inflate the members on worker threads. ZipFile serializes the
+            # raw reads on its shared handle, while zlib decompression runs
+            # without the GIL, so members inflate on separate cores even for
+            # an in-memory archive. Parent directories are created up front
+            # so workers never race to make the same one.
+            for info in csv_members:
+                (staging_dir / info.filename).parent.mkdir(parents=True, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+                staged_paths = list(executor.map(
+                    lambda info: Path(zip_ref.extract(info, staging_dir)), csv_members
+                ))
             
-            # Return paths of extracted files
-            for filename in file_list:
-                extracted_path = extract_dir / filename
-                if extracted_path.exists():
-                    extracted_files.append(extracted_path)
+            for info, staged_path in zip(csv_members, staged_paths):
+                # Move into place (same filesystem, so atomic)
+                extracted_path = extract_dir / info.filename
+                extracted_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staged_path, extracted_path)
+                extracted_files.append(extracted_path)
             
-        logger.info(f"Extracted {len(extracted_files)} files from {zip_path}")
+        logger.info(f"Extracted {len(extracted_files)} files from {name}")
         return extracted_files
         
     except zipfile.BadZipFile as e:
-        logger.error(f"Bad ZIP file {zip_path}: {e}")
+        logger.error(f"Bad ZIP file {name}: {e}")
         return []
     except Exception as e:
-        logger.error(f"Error extracting {zip_path}: {e}")
+        logger.error(f"Error extracting {name}: {e}")
+        return []
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def is_csv_member(info: zipfile.ZipInfo) -> bool:
+    """True for a ZIP entry that is a CSV file (not a directory or other document)."""
+    return not info.is_dir() and info.filename.lower().endswith('.csv')
+
+
+def extracted_members(zip_path: Path, extract_dir: Path) -> List[Path]:
+    """
+    List a ZIP's CSV members that are already extracted.
+    
+    Args:
+        zip_path: Path to ZIP file
+        extract_dir: Directory the ZIP was extracted to
+        
+    Returns:
+        Extracted CSV paths, or an empty list if any is missing
+    """
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            paths = [extract_dir / info.filename for info in zip_ref.infolist() if is_csv_member(info)]
+    except zipfile.BadZipFile:
         return []
+    return paths if all(path.exists() for path in paths) else []
 
 
-def download_year_data(year: int) -> Tuple[bool, List[Path]]:
+def download_year_data(year: int, skip_existing: bool = False) -> Tuple[bool, List[Path]]:
     """
     Download and extract data for a single year.
     
     Args:
         year: Year to download
+        skip_existing: If True, revalidate a previous download with a
+            conditional GET (or reuse a ZIP left on disk by an older run)
         
     Returns:
         Tuple of (success, list of extracted CSV paths)
     """
     logger.info(f"Processing year {year}")
     
-    # Create URL and paths
+    # Create URL and paths (the ZIP path only names the download's sidecar)
     url = PENNDOT_URL_TEMPLATE.format(year=year)
     zip_path = get_raw_data_path(year)
     
-    # Download ZIP file
-    if not download_file(url, zip_path):
-        return False, []
-    
-    # Extract ZIP
-    extracted_files = extract_zip(zip_path, RAW_DATA_DIR)
+    if skip_existing and zip_path.exists() and not recorded_members(zip_path, RAW_DATA_DIR):
+        # Archive kept on disk by an older run: extract it locally (an
+        # unchanged archive keeps its CSVs, and their mtimes, so downstream
+        # stage caches stay valid)
+        logger.info(f"Using existing {zip_path.name} (skip_existing)")
+        extracted_files = extracted_members(zip_path, RAW_DATA_DIR)
+        if extracted_files:
+            logger.info(f"{zip_path.name} unchanged, reusing {len(extracted_files)} extracted files")
+        else:
+            extracted_files = extract_zip(zip_path, RAW_DATA_DIR)
+        
+        # Record the CSVs (keeping any stored validators, and the archive
+        # size for the HEAD fallback), then drop the archive itself
+        if extracted_files:
+            meta_file = meta_path(zip_path)
+            previous = json.loads(meta_file.read_text()) if meta_file.exists() else {}
+            with open(zip_path, 'rb') as f:
+                digest = archive_digest(f)
+            record_download(
+                zip_path, RAW_DATA_DIR, extracted_files, url,
+                etag=previous.get('etag'),
+                last_modified=previous.get('last_modified'),
+                content_length=zip_path.stat().st_size,
+                sha256=digest
+            )
+            remove_archive(zip_path)
+    else:
+        extracted_files = download_and_extract(url, zip_path, RAW_DATA_DIR, conditional=skip_existing)
+        if extracted_files is None:
+            return False, []
+        remove_archive(zip_path)
     
-    # Filter for CSV files
-    csv_files = [f for f in extracted_files if f.suffix.lower() == '.csv']
-    logger.info(f"Extracted {len(csv_files)} CSV files for year {year}")
+    logger.info(f"Extracted {len(extracted_files)} CSV files for year {year}")
     
-    return True, csv_files
+    return True, extracted_files
 
 
 def validate_extracted_files(year: int, csv_files: List[Path]) -> bool:
@@ -175,16 +481,14 @@ def validate_extracted_files(year: int, csv_files: List[Path]) -> bool:
     Returns:
         bool: True if all categories present
     """
-    # Get category names from filenames
+    # Get category names from filenames (e.g., "CRASH_2020.csv" -> "CRASH")
     extracted_categories = set()
     for csv_file in csv_files:
-        # Extract category from filename (e.g., "CRASH_2020.csv" -> "CRASH")
-        for category in PENNDOT_CATEGORIES:
-            if category in csv_file.name.upper():
-                extracted_categories.add(category)
-                break
+        match = CATEGORY_PATTERN.search(csv_file.name.upper())
+        if match:
+            extracted_categories.add(match.lastgroup)
     
-    missing_categories = set(PENNDOT_CATEGORIES) - extracted_categories
+    missing_categories = EXPECTED_CATEGORIES - extracted_categories
     
     if missing_categories:
         logger.warning(f"Year {year} missing categories: {missing_categories}")
@@ -194,12 +498,21 @@ def validate_extracted_files(year: int, csv_files: List[Path]) -> bool:
         return True
 
 
-def download_all_penndot_data(years: List[int] = None) -> dict:
+def download_all_penndot_data(
+    years: List[int] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    skip_existing: bool = False
+) -> dict:
     """
     Download PennDOT crash data for all specified years.
     
+    Yearly archives are fetched concurrently; each year writes to its own
+    ZIP and CSV filenames, so workers never touch the same file.
+    
     Args:
         years: List of years to download (default: all years from config)
+        max_workers: Number of years to download at once (1 = sequential)
+        skip_existing: If True, reuse ZIPs already present in RAW_DATA_DIR
         
     Returns:
         Dictionary with download statistics
@@ -209,6 +522,7 @@ def download_all_penndot_data(years: List[int] = None) -> dict:
     
     logger.info(f"Starting PennDOT data download for {len(years)} years: {years[0]}-{years[-1]}")
     logger.info(f"Data will be saved to: {RAW_DATA_DIR}")
+    logger.info(f"Concurrent downloads: {max_workers}")
     
     stats = {
         'total_years': len(years),
@@ -218,26 +532,34 @@ def download_all_penndot_data(years: List[int] = None) -> dict:
         'failed_years': []
     }
     
-    for year in years:
-        success, csv_files = download_year_data(year)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(download_year_data, year, skip_existing): year
+            for year in years
+        }
         
-        if success:
-            stats['successful_downloads'] += 1
-            stats['total_csv_files'] += len(csv_files)
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                success, csv_files = future.result()
+            except Exception as e:
+                logger.error(f"Unexpected error downloading year {year}: {e}")
+                success, csv_files = False, []
             
-            # Validate
-            validate_extracted_files(year, csv_files)
-        else:
-            stats['failed_downloads'] += 1
-            stats['failed_years'].append(year)
-        
-        # Be nice to the server
-        time.sleep(2)
+            if success:
+                stats['successful_downloads'] += 1
+                stats['total_csv_files'] += len(csv_files)
+                
+                # Validate
+                validate_extracted_files(year, csv_files)
+            else:
+                stats['failed_downloads'] += 1
+                stats['failed_years'].append(year)
+    
+    stats['failed_years'].sort()
     
     # Log summary
-    logger.info("=" * 60)
-    logger.info("DOWNLOAD SUMMARY")
-    logger.info("=" * 60)
+    log_banner("DOWNLOAD SUMMARY", width=60)
     logger.info(f"Total years processed: {stats['total_years']}")
     logger.info(f"Successful downloads: {stats['successful_downloads']}")
     logger.info(f"Failed downloads: {stats['failed_downloads']}")
@@ -15,13 +15,19 @@ Author: FDC Project
 Date: 2025-10-26
 """
 
+import os
 import sys
+import tempfile
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
-import json
+from functools import lru_cache
+import orjson
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
@@ -31,13 +37,121 @@ from config import (
     PROCESSED_DATA_DIR,
     METADATA_DIR,
     PENNDOT_CATEGORIES,
-    YEARS
+    YEARS,
+    HARMONIZE_WORKERS,
+    HARMONIZE_YEAR_WORKERS
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
+from utils.io_utils import write_parquet, open_parquet_writer, PARQUET_ROW_GROUP_SIZE
+from utils.cache import cached_stage
 
 # Initialize logger
 logger = setup_logger(__name__)
 
+# Known column renamings per category (old -> new), added as discovered
+# during profiling. Example: 'CRASH': {'OLD_NAME': 'NEW_NAME'}
+COLUMN_RENAMES: Dict[str, Dict[str, str]] = {}
+
+# Bytes of CSV handed to each Arrow parser thread; larger blocks mean fewer,
+# bigger batches for the wide PennDOT files
+CSV_BLOCK_SIZE = 64 << 20
+
+# Arrow types for the numeric dtypes the master schema pins. Reading with
+# explicit types skips Arrow's inference for those columns, and every year
+# comes back with the same type instead of one reconcile_dtypes must cast.
+ARROW_COLUMN_TYPES = {
+    'int64': pa.int64(),
+    'float64': pa.float64(),
+}
+
+# Allowed values per coded column and the value that blanks and invalid codes
+# are mapped to. Cleaned per category (not per row) by recode_to_domain.
+CODE_DOMAINS: Dict[str, Tuple[List[str], str]] = {
+    'HELMET_IND': (['Y', 'N', 'U'], 'U'),
+}
+
+# Join keys between categories; left at full width so every category's
+# harmonized file stores them with the same dtype
+KEY_COLUMNS = frozenset({'CRN'})
+
+# Low-cardinality code columns stored as pandas 'category' per category.
+# Only columns read as strings are converted; numeric codes are left as is.
+CATEGORICAL_COLS: Dict[str, List[str]] = {
+    'CRASH': ['COLLISION_TYPE', 'ILLUMINATION', 'WEATHER', 'ROAD_CONDITION',
+              'INTERSECT_TYPE', 'URBAN_RURAL', 'MUNICIPALITY', 'POLICE_AGCY'],
+    'PERSON': ['HELMET_IND', 'PERSON_TYPE', 'SEX', 'INJ_SEVERITY',
+               'RESTRAINT_HELMET', 'SEAT_POSITION', 'TRANSPORTED'],
+    'CYCLE': ['PC_HLMT_IND', 'PC_HDLGHT_IND', 'PC_REAR_RFLTR_IND'],
+    'VEHICLE': ['VEH_TYPE', 'VEH_ROLE_CD', 'VEH_MOVEMENT', 'IMPACT_POINT'],
+}
+
+
+@lru_cache(maxsize=None)
+def column_plan(category: str, source_columns: Tuple[str, ...]) -> Dict[str, str]:
+    """
+    Build the rename map for one CSV header layout.
+    
+    Computed once per distinct (category, header) pair, so years that share a
+    layout reuse the same plan instead of re-deriving it.
+    
+    Args:
+        category: PennDOT category name
+        source_columns: Column names as read from the CSV
+        
+    Returns:
+        Dict of renames that apply to these columns
+    """
+    renames = COLUMN_RENAMES.get(category, {})
+    return {old: new for old, new in renames.items() if old in source_columns}
+
+
+def promote_dtypes(dtypes: List) -> Optional[object]:
+    """
+    Find a dtype that can hold every one of the given column dtypes losslessly.
+    
+    Numeric dtypes are promoted with NumPy's rules (e.g. int8 + int64 ->
+    int64, int64 + float64 -> float64), staying nullable if any input was a
+    nullable extension type. Datetimes promote to the finer unit.
+    
+    Args:
+        dtypes: Dtypes the same column has in different years
+        
+    Returns:
+        Common dtype, or None when the dtypes are truly heterogeneous
+        (e.g. numbers in one year, free text in another)
+    """
+    is_number = lambda d: pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d)
+    
+    if all(is_number(d) for d in dtypes):
+        target = np.result_type(*(getattr(d, 'numpy_dtype', d) for d in dtypes))
+        if any(isinstance(d, pd.api.extensions.ExtensionDtype) for d in dtypes):
+            prefix = {'i': 'Int', 'u': 'UInt', 'f': 'Float'}.get(target.kind)
+            return pd.api.types.pandas_dtype(f"{prefix}{target.itemsize * 8}") if prefix else None
+        return target
+    
+    if all(isinstance(d, np.dtype) and d.kind == 'M' for d in dtypes):
+        return np.result_type(*dtypes)
+    
+    return None
+
+
+@lru_cache(maxsize=1)
+def _load_schema_report(schema_file: Path, mtime_ns: int) -> Dict:
+    """
+    Parse the profiling schema report once per process.
+    
+    Keyed on the file's mtime as well as its path, so a report rewritten by
+    a profiling run in the same process is picked up.
+    
+    Args:
+        schema_file: Path to schema_analysis_report.json
+        mtime_ns: Modification time of the file (cache key only)
+        
+    Returns:
+        Parsed report
+    """
+    return orjson.loads(schema_file.read_bytes())
+
 
 class SchemaHarmonizer:
     """
@@ -63,14 +177,28 @@ class SchemaHarmonizer:
         self.type_mappings = {}
         self.categorical_mappings = {}
         
+        # Arrow CSV column types derived from the master schema
+        self.column_types: Dict[str, pa.DataType] = {}
+        
+        # Names of the files in RAW_DATA_DIR, scanned once per run
+        self.raw_files: Optional[frozenset] = None
+        
         self.logger.info(f"SchemaHarmonizer initialized for category: {category}")
     
     def load_master_schema(self) -> Dict:
         """
         Load master schema from profiling results.
         
+        The profiling report records per-year dtypes only for the columns
+        whose dtype changes between years (dtype_changes); every other column
+        is already inferred the same way each year. Each changing column that
+        stays numeric is pinned to the dtype that holds all its years (e.g.
+        int64 in one year and float64 in the rest -> float64), and those
+        types are handed to the CSV reader. Columns that mix numbers and text
+        are left to reconcile_dtypes.
+        
         Returns:
-            Dict with master schema definition
+            Dict with master schema definition (column -> dtype name)
         """
         schema_file = METADATA_DIR / "schema_analysis_report.json"
         
@@ -79,20 +207,22 @@ class SchemaHarmonizer:
             self.logger.error("Run profiling (stage 2) first!")
             raise FileNotFoundError(f"Schema report required: {schema_file}")
         
-        with open(schema_file, 'r') as f:
-            analysis = json.load(f)
+        analysis = _load_schema_report(schema_file, schema_file.stat().st_mtime_ns)
         
-        # Get most recent year's schema as master
         if self.category in analysis['categories']:
             cat_data = analysis['categories'][self.category]
-            # Use the latest year as master schema
-            years = sorted(cat_data['years_available'], reverse=True)
-            if years:
-                latest_year = years[0]
-                self.master_schema = cat_data['schema_by_year'].get(str(latest_year), {})
-                self.logger.info(f"Loaded master schema from year {latest_year}")
-                self.logger.info(f"Master schema has {len(self.master_schema)} columns")
-                return self.master_schema
+            
+            self.master_schema = {}
+            for col, dtype_by_year in cat_data.get('dtype_changes', {}).items():
+                target = promote_dtypes([np.dtype(d) for d in set(dtype_by_year.values())])
+                if target is not None and str(target) in ARROW_COLUMN_TYPES:
+                    self.master_schema[col] = str(target)
+            
+            self.column_types = {col: ARROW_COLUMN_TYPES[dtype] for col, dtype in self.master_schema.items()}
+            self.logger.info(f"Loaded master schema for {cat_data.get('year_range', 'all years')}")
+            self.logger.info(f"Master schema pins {len(self.master_schema)} of "
+                             f"{len(cat_data.get('dtype_changes', {}))} columns whose dtype changes across years")
+            return self.master_schema
         
         self.logger.warning(f"No master schema found for {self.category}")
         return {}
@@ -102,9 +232,12 @@ class SchemaHarmonizer:
         Python implementation of R's handle_mismatch() function.
         
         Reconciles schema differences between two dataframes by:
-        1. Converting mismatched column types to compatible format (usually string)
+        1. Converting mismatched column types to a common dtype
         2. Adding missing columns with NaN
-        3. Ensuring column order consistency
+        
+        Column order is not normalized; concat aligns by name. The inputs are
+        not modified, and a frame that already has every column is returned
+        without a copy.
         
         Args:
             df1: First dataframe (usually accumulated data)
@@ -117,44 +250,117 @@ class SchemaHarmonizer:
         self.logger.info(f"DF1: {df1.shape[0]} rows, {df1.shape[1]} columns")
         self.logger.info(f"DF2: {df2.shape[0]} rows, {df2.shape[1]} columns")
         
-        # Get all unique columns
-        all_columns = set(df1.columns) | set(df2.columns)
-        
-        # Add missing columns to each dataframe
-        for col in all_columns:
-            if col not in df1.columns:
-                df1[col] = np.nan
-                self.logger.debug(f"Added missing column to DF1: {col}")
-            if col not in df2.columns:
-                df2[col] = np.nan
-                self.logger.debug(f"Added missing column to DF2: {col}")
-        
-        # Harmonize data types for common columns
-        common_columns = set(df1.columns) & set(df2.columns)
-        type_conversions = 0
-        
-        for col in common_columns:
-            dtype1 = df1[col].dtype
-            dtype2 = df2[col].dtype
-            
-            if dtype1 != dtype2:
-                # Convert both to string (safest common type)
-                df1[col] = df1[col].astype(str)
-                df2[col] = df2[col].astype(str)
-                type_conversions += 1
-                self.logger.debug(f"Converted {col}: {dtype1} + {dtype2} -> object")
-        
-        if type_conversions > 0:
-            self.logger.info(f"Converted {type_conversions} columns to compatible types")
-        
-        # Ensure consistent column order
-        column_order = sorted(all_columns)
-        df1 = df1[column_order]
-        df2 = df2[column_order]
+        # Kept for callers of the pairwise API; harmonize_all_years reconciles
+        # all years at once via reconcile_dtypes
+        df1, df2 = self.reconcile_dtypes(self.unify_categories([df1, df2]))
+        
+        # Add missing columns (as NaN), appended after each frame's own columns
+        all_columns = df1.columns.union(df2.columns, sort=False)
+        if len(df1.columns) != len(all_columns):
+            df1 = df1.reindex(columns=all_columns)
+        if len(df2.columns) != len(all_columns):
+            df2 = df2.reindex(columns=df2.columns.union(df1.columns, sort=False))
         
         self.logger.info("Schema harmonization complete")
         return df1, df2
     
+    def convert_categoricals(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Store this category's low-cardinality string columns as 'category'.
+        
+        Args:
+            df: Single-year dataframe
+            
+        Returns:
+            DataFrame with CATEGORICAL_COLS converted
+        """
+        conversions = {
+            col: 'category'
+            for col in CATEGORICAL_COLS.get(self.category, [])
+            if col in df.columns and df[col].dtype == object
+        }
+        
+        if conversions:
+            df = df.astype(conversions)
+            self.logger.debug(f"Converted {len(conversions)} columns to category")
+        
+        return df
+    
+    def unify_categories(self, frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+        """
+        Give each categorical column the union of its categories across frames.
+        
+        pd.concat only keeps the 'category' dtype when every piece has the same
+        categories; otherwise the column falls back to object.
+        
+        Args:
+            frames: Per-year dataframes
+            
+        Returns:
+            Frames whose categorical columns share one CategoricalDtype
+        """
+        categories: Dict[str, pd.Index] = {}
+        for df in frames:
+            for col in df.select_dtypes(include='category').columns:
+                cats = df[col].cat.categories
+                categories[col] = categories[col].union(cats) if col in categories else cats
+        
+        if not categories:
+            return frames
+        
+        unified = {col: pd.CategoricalDtype(cats) for col, cats in categories.items()}
+        return [
+            df.astype({
+                col: dtype for col, dtype in unified.items()
+                if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)
+            })
+            for df in frames
+        ]
+    
+    def reconcile_dtypes(self, frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+        """
+        Give each shared column a single dtype across all frames.
+        
+        Columns whose dtype differs between frames are cast to the common
+        dtype from promote_dtypes (e.g. int64 in one year and float64 in
+        another become float64). Only truly heterogeneous columns fall back
+        to string. Categoricals are expected to be unified already (see
+        unify_categories). Runs once over all years, so no frame is
+        converted more than once.
+        
+        Args:
+            frames: Per-year dataframes
+            
+        Returns:
+            Frames with matching dtypes for shared columns
+        """
+        seen_dtypes: Dict[str, set] = {}
+        for df in frames:
+            for col, dtype in df.dtypes.items():
+                seen_dtypes.setdefault(col, set()).add(dtype)
+        
+        mismatched = [col for col, dtypes in seen_dtypes.items() if len(dtypes) > 1]
+        
+        if mismatched:
+            targets = {}
+            for col in mismatched:
+                target = promote_dtypes(list(seen_dtypes[col]))
+                targets[col] = str if target is None else target
+                self.logger.debug(f"Converted {col}: {' + '.join(map(str, seen_dtypes[col]))} -> "
+                                  f"{'object' if target is None else target}")
+            
+            frames = [
+                df.astype({col: target for col, target in targets.items()
+                           if col in df.columns and df[col].dtype != target})
+                for df in frames
+            ]
+            
+            to_string = sum(target is str for target in targets.values())
+            self.logger.info(f"Converted {len(mismatched)} columns to compatible types "
+                             f"({to_string} fell back to string)")
+        
+        return frames
+    
     def standardize_column_names(self, df: pd.DataFrame, year: int) -> pd.DataFrame:
         """
         Standardize column names across years.
@@ -168,11 +374,7 @@ class SchemaHarmonizer:
         Returns:
             DataFrame with standardized column names
         """
-        # Define known column name mappings (old -> new)
-        name_mappings = {
-            # Add mappings as discovered during profiling
-            # Example: 'OLD_NAME': 'NEW_NAME'
-        }
+        name_mappings = column_plan(self.category, tuple(df.columns))
         
         if name_mappings:
             df = df.rename(columns=name_mappings)
@@ -224,28 +426,135 @@ class SchemaHarmonizer:
         - Helmet indicator: Y, N, U, blank
         - Injury severity: various codes
         
+        Columns listed in CODE_DOMAINS are cleaned by recode_to_domain.
+        
         Args:
             df: Input dataframe
             
         Returns:
             DataFrame with standardized categorical values
         """
-        # Helmet usage standardization
-        if 'HELMET_IND' in df.columns:
-            df['HELMET_IND'] = df['HELMET_IND'].str.upper().str.strip()
-            # Map blanks to U (Unknown)
-            df.loc[df['HELMET_IND'].isna(), 'HELMET_IND'] = 'U'
-            df.loc[df['HELMET_IND'] == '', 'HELMET_IND'] = 'U'
+        for col, (valid_values, fallback) in CODE_DOMAINS.items():
+            if col in df.columns:
+                df[col] = self.recode_to_domain(df[col], valid_values, fallback)
+        
+        return df
+    
+    def recode_to_domain(self, values: pd.Series, valid_values: List[str], fallback: str) -> pd.Categorical:
+        """
+        Map a coded column onto a fixed set of values.
+        
+        Values are upper-cased and stripped; blanks and missing values become
+        the fallback silently, anything else outside the domain becomes the
+        fallback with a warning. The cleaning runs on the column's categories
+        (a handful of distinct codes); rows are then remapped with one integer
+        gather over the category codes, and invalid rows are counted with one
+        bincount, so no per-row string work is done.
+        
+        Args:
+            values: Column to clean (converted to category if it isn't one)
+            valid_values: Allowed values, in category order
+            fallback: Value for blank, missing and invalid entries
             
-            # Validate values
-            valid_values = {'Y', 'N', 'U'}
-            invalid = ~df['HELMET_IND'].isin(valid_values)
-            if invalid.any():
-                self.logger.warning(f"Found {invalid.sum()} invalid HELMET_IND values, setting to U")
-                df.loc[invalid, 'HELMET_IND'] = 'U'
+        Returns:
+            Categorical with exactly valid_values as categories
+        """
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        
+        cleaned = values.cat.categories.astype(str).str.upper().str.strip()
+        codes = values.cat.codes.to_numpy()
+        
+        # Blanks are expected (-> fallback); anything else outside the domain is invalid
+        invalid = ~cleaned.isin(valid_values + [''])
+        counts = np.bincount(codes.astype(np.intp) + 1, minlength=len(cleaned) + 1)[1:]
+        num_invalid = int(counts[invalid].sum())
+        if num_invalid:
+            self.logger.warning(f"Found {num_invalid} invalid {values.name} values, setting to {fallback}")
+        
+        # Old code -> new code; the trailing entry catches code -1 (missing)
+        fallback_code = valid_values.index(fallback)
+        lookup = pd.Index(valid_values).get_indexer(cleaned)
+        lookup = np.append(np.where(lookup == -1, fallback_code, lookup), fallback_code)
+        return pd.Categorical.from_codes(lookup[codes], categories=valid_values)
+    
+    def read_year_csv(self, file_path: Path) -> pd.DataFrame:
+        """
+        Read a yearly CSV with the multi-threaded Arrow parser.
+        
+        Columns are parsed with the master schema's types when one is loaded;
+        a year whose values don't fit them (schema drift) is re-read with
+        inferred types. The Arrow table is converted column by column and
+        released as it goes, so the file is not held twice in memory. Falls
+        back to the pandas C parser for files the stricter Arrow reader
+        rejects (e.g. ragged rows in older extracts).
+        
+        Args:
+            file_path: CSV file to read
+            
+        Returns:
+            Loaded dataframe
+        """
+        attempts = [self.column_types, {}] if self.column_types else [{}]
+        
+        for column_types in attempts:
+            try:
+                table = pacsv.read_csv(
+                    file_path,
+                    read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE),
+                    convert_options=pacsv.ConvertOptions(strings_can_be_null=True,
+                                                         column_types=column_types)
+                )
+                return table.to_pandas(split_blocks=True, self_destruct=True)
+            except Exception as e:
+                if column_types:
+                    self.logger.debug(f"Master schema types don't fit {file_path.name} ({e}), inferring types")
+                else:
+                    self.logger.warning(f"Arrow CSV parser failed on {file_path.name} ({e}), using pandas parser")
+        
+        return pd.read_csv(file_path, low_memory=False)
+    
+    def downcast_numeric_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Shrink integer columns to the smallest type that holds their values.
+        
+        Year, month, county and code columns fit in 1-2 bytes instead of 8.
+        KEY_COLUMNS are skipped so every category stores the join keys with
+        the same dtype. Runs on the combined frame, after all years are
+        concatenated, so each column gets one width instead of one that
+        varies by year.
+        
+        Args:
+            df: Combined dataframe
+            
+        Returns:
+            DataFrame with downcast integer columns
+        """
+        before = df.memory_usage(deep=False).sum()
+        
+        int_columns = df.select_dtypes(include=['integer']).columns.difference(KEY_COLUMNS)
+        for col in int_columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        
+        after = df.memory_usage(deep=False).sum()
+        self.logger.info(f"Downcast integer columns: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
         
         return df
     
+    def scan_raw_files(self) -> frozenset:
+        """
+        List RAW_DATA_DIR once so per-year lookups are set membership tests.
+        
+        Returns:
+            Names of the files in the raw data directory
+        """
+        if RAW_DATA_DIR.is_dir():
+            with os.scandir(RAW_DATA_DIR) as entries:
+                self.raw_files = frozenset(entry.name for entry in entries if entry.is_file())
+        else:
+            self.raw_files = frozenset()
+        return self.raw_files
+    
     def harmonize_year_data(self, year: int) -> Optional[pd.DataFrame]:
         """
         Load and harmonize data for a single year.
@@ -264,23 +573,20 @@ class SchemaHarmonizer:
             f"{self.category}S_PHILADELPHIA_{year}.csv",  # FLAGS has an S
         ]
         
-        file_path = None
-        for pattern in pattern_options:
-            files = list(RAW_DATA_DIR.glob(pattern))
-            if files:
-                file_path = files[0]
-                break
+        raw_files = self.raw_files if self.raw_files is not None else self.scan_raw_files()
+        file_name = next((name for name in pattern_options if name in raw_files), None)
         
-        if not file_path:
+        if not file_name:
             self.logger.warning(f"No file found for {self.category} {year}")
             self.logger.warning(f"Tried patterns: {pattern_options}")
             return None
         
+        file_path = RAW_DATA_DIR / file_name
         self.logger.info(f"Processing {file_path.name}")
         
         # Load data
         try:
-            df = pd.read_csv(file_path, low_memory=False)
+            df = self.read_year_csv(file_path)
             self.logger.info(f"Loaded {len(df)} rows, {len(df.columns)} columns")
         except Exception as e:
             self.logger.error(f"Failed to load {file_path}: {e}")
@@ -290,19 +596,25 @@ class SchemaHarmonizer:
         df = self.standardize_column_names(df, year)
         # Skip type harmonization if no master schema
         # df = self.harmonize_data_types(df)
+        df = self.convert_categoricals(df)
         df = self.standardize_categorical_values(df)
         
-        # Add metadata columns
-        df['DATA_YEAR'] = year
-        df['PROCESSING_DATE'] = datetime.now().isoformat()
+        # Add metadata columns. The timestamp is a single-category column:
+        # one string plus a 1-byte code per row, not a string per row
+        df['DATA_YEAR'] = np.full(len(df), year, dtype=np.int16)
+        df['PROCESSING_DATE'] = pd.Categorical.from_codes(
+            np.zeros(len(df), dtype=np.int8),
+            categories=[datetime.now().isoformat()]
+        )
         
         return df
     
-    def harmonize_all_years(self, years: Optional[List[int]] = None) -> pd.DataFrame:
+    def harmonize_all_years(self, years: Optional[List[int]] = None,
+                            max_workers: int = HARMONIZE_YEAR_WORKERS) -> pd.DataFrame:
         """
         Harmonize data across all years using handle_mismatch() approach.
         
-        Mimics the R code's loop that combines data across years:
+        Replaces the R code's loop that combines data across years:
         for (i in seq_along(file_path)) {
             if (i == 1) {
                 data[[tolower(data_set)]] <- new_data
@@ -312,8 +624,14 @@ class SchemaHarmonizer:
             }
         }
         
+        Rather than reconciling each new year against the growing result (which
+        re-copies it every iteration), all years are loaded first, their dtypes
+        reconciled once, and combined with a single concat. Years are
+        independent until then, so they are loaded on a thread pool.
+        
         Args:
             years: List of years to process (default: all years from config)
+            max_workers: Years loaded in parallel (1 = sequential)
             
         Returns:
             Combined harmonized dataframe
@@ -330,36 +648,45 @@ class SchemaHarmonizer:
             self.logger.warning(f"Could not load master schema: {e}")
             self.logger.info("Continuing without master schema")
         
-        combined_df = None
+        frames = []
         successful_years = []
         failed_years = []
         
-        for i, year in enumerate(sorted(years)):
-            self.logger.info(f"Processing year {year} ({i+1}/{len(years)})")
-            
-            df_year = self.harmonize_year_data(year)
-            
+        # Fresh listing for this run, shared by the year workers
+        self.scan_raw_files()
+        
+        years = sorted(years)
+        workers = max(1, min(max_workers, len(years)))
+        self.logger.info(f"Loading {len(years)} years with {workers} workers")
+        
+        # map() yields in year order, so frames stay chronological
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            year_frames = list(executor.map(self.harmonize_year_data, years))
+        
+        for year, df_year in zip(years, year_frames):
             if df_year is None:
                 failed_years.append(year)
                 continue
             
-            if i == 0 or combined_df is None:
-                # First year - initialize combined dataframe
-                combined_df = df_year
-                self.logger.info(f"Initialized with {len(combined_df)} rows")
-            else:
-                # Subsequent years - use handle_mismatch
-                combined_df, df_year = self.handle_mismatch(combined_df, df_year)
-                
-                # Concatenate
-                combined_df = pd.concat([combined_df, df_year], ignore_index=True)
-                self.logger.info(f"Combined total: {len(combined_df)} rows")
-            
+            frames.append(df_year)
             successful_years.append(year)
         
-        self.logger.info("=" * 80)
-        self.logger.info("HARMONIZATION SUMMARY")
-        self.logger.info("=" * 80)
+        del year_frames
+        
+        combined_df = None
+        if frames:
+            frames = self.reconcile_dtypes(self.unify_categories(frames))
+            
+            # One concat aligns columns by name and fills missing ones with NaN.
+            # Columns keep their first-seen order (earliest year first); nothing
+            # downstream selects by position, so no reorder copy is made.
+            combined_df = pd.concat(frames, ignore_index=True, sort=False, copy=False)
+            del frames
+            self.logger.info(f"Combined total: {len(combined_df)} rows")
+            
+            combined_df = self.downcast_numeric_types(combined_df)
+        
+        log_banner("HARMONIZATION SUMMARY")
         self.logger.info(f"Successful years: {len(successful_years)}")
         self.logger.info(f"Failed years: {len(failed_years)}")
         if combined_df is not None:
@@ -369,6 +696,212 @@ class SchemaHarmonizer:
         
         return combined_df
     
+    def stage_year(self, year: int, staging_dir: Path) -> Optional[Dict]:
+        """
+        Harmonize one year and park it in a temporary Parquet file.
+        
+        Only a small profile of the year (dtypes, categories, integer ranges)
+        stays in memory, so the combined output can be planned without
+        holding every year at once.
+        
+        Args:
+            year: Year to process
+            staging_dir: Directory for the temporary file
+            
+        Returns:
+            Year profile, or None if the year could not be loaded
+        """
+        df = self.harmonize_year_data(year)
+        if df is None:
+            return None
+        
+        path = staging_dir / f"{year}.parquet"
+        df.to_parquet(path, index=False, engine='pyarrow')
+        
+        return {
+            'year': year,
+            'path': path,
+            'rows': len(df),
+            'dtypes': df.dtypes.to_dict(),
+            'categories': {
+                col: df[col].cat.categories
+                for col in df.select_dtypes(include='category').columns
+            },
+            'int_ranges': {
+                col: (df[col].min(), df[col].max())
+                for col in df.select_dtypes(include=['integer', 'Int64']).columns
+            }
+        }
+    
+    def plan_column_dtypes(self, profiles: List[Dict]) -> Dict[str, object]:
+        """
+        Decide each output column's dtype from the per-year profiles.
+        
+        Gives the result harmonize_all_years gets from unify_categories,
+        reconcile_dtypes, pd.concat and downcast_numeric_types: categorical
+        columns get the union of their categories, mismatched dtypes are
+        promoted (string as a last resort), integer columns missing from some
+        years become float64 as concat would make them, and the remaining
+        integer columns are narrowed to the smallest width holding every
+        year's range.
+        
+        Args:
+            profiles: Year profiles from stage_year
+            
+        Returns:
+            Column -> dtype in first-seen column order (str means string fallback)
+        """
+        columns = list(dict.fromkeys(col for profile in profiles for col in profile['dtypes']))
+        plan = {}
+        
+        for col in columns:
+            present = [profile for profile in profiles if col in profile['dtypes']]
+            
+            if all(col in profile['categories'] for profile in present):
+                categories = present[0]['categories'][col]
+                for profile in present[1:]:
+                    categories = categories.union(profile['categories'][col])
+                plan[col] = pd.CategoricalDtype(categories)
+                continue
+            
+            dtypes = list(dict.fromkeys(profile['dtypes'][col] for profile in present))
+            target = dtypes[0] if len(dtypes) == 1 else promote_dtypes(dtypes)
+            if target is None:
+                plan[col] = str
+                continue
+            
+            # Years without the column contribute NaN, as in pd.concat
+            if len(present) < len(profiles) and isinstance(target, np.dtype) and target.kind in 'iub':
+                target = np.dtype(object) if target.kind == 'b' else np.dtype('float64')
+            
+            if pd.api.types.is_integer_dtype(target) and col not in KEY_COLUMNS:
+                ranges = [profile['int_ranges'][col] for profile in present
+                          if pd.notna(profile['int_ranges'][col][0])]
+                if ranges:
+                    bounds = pd.Series([min(lo for lo, _ in ranges), max(hi for _, hi in ranges)], dtype=target)
+                    target = pd.to_numeric(bounds, downcast='integer').dtype
+            
+            plan[col] = target
+        
+        return plan
+    
+    def align_year(self, df: pd.DataFrame, plan: Dict[str, object]) -> pd.DataFrame:
+        """
+        Bring one year to the planned columns, order and dtypes.
+        
+        Args:
+            df: Staged single-year dataframe
+            plan: Output dtypes from plan_column_dtypes
+            
+        Returns:
+            DataFrame with exactly the planned columns
+        """
+        columns = {}
+        for col, dtype in plan.items():
+            if col in df.columns:
+                values = df[col]
+                if dtype is str:
+                    values = values.astype(str)
+                elif values.dtype != dtype:
+                    values = values.astype(dtype)
+            else:
+                values = pd.Series(np.nan, index=df.index, dtype=object)
+                if dtype is not str:
+                    values = values.astype(dtype)
+            columns[col] = values
+        
+        return pd.DataFrame(columns, index=df.index)
+    
+    def write_all_years(self, years: Optional[List[int]] = None,
+                        max_workers: int = HARMONIZE_YEAR_WORKERS) -> Optional[Dict]:
+        """
+        Harmonize all years straight into the category's Parquet file.
+        
+        Writes the same file as harmonize_all_years followed by
+        save_harmonized_data, but never holds more than one year per worker
+        in memory. Each year is harmonized into a temporary Parquet file, the
+        output dtypes are planned from the small per-year profiles, and the
+        years are read back one at a time, aligned to the plan and appended
+        to a single ParquetWriter.
+        
+        Args:
+            years: List of years to process (default: all years from config)
+            max_workers: Years harmonized in parallel (1 = sequential)
+            
+        Returns:
+            Summary dict with rows, columns and output_file, or None if no
+            year could be loaded
+        """
+        if years is None:
+            years = YEARS
+        
+        self.logger.info(f"Harmonizing {self.category} data for years: {min(years)}-{max(years)}")
+        
+        try:
+            self.load_master_schema()
+        except Exception as e:
+            self.logger.warning(f"Could not load master schema: {e}")
+            self.logger.info("Continuing without master schema")
+        
+        self.scan_raw_files()
+        
+        years = sorted(years)
+        workers = max(1, min(max_workers, len(years)))
+        self.logger.info(f"Loading {len(years)} years with {workers} workers")
+        
+        output_file = PROCESSED_DATA_DIR / f"{self.category.lower()}_harmonized.parquet"
+        total_rows = 0
+        
+        with tempfile.TemporaryDirectory(dir=PROCESSED_DATA_DIR,
+                                         prefix=f".{self.category.lower()}_years_") as staging:
+            staging_dir = Path(staging)
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                profiles = list(executor.map(self.stage_year, years, [staging_dir] * len(years)))
+            
+            failed_years = [year for year, profile in zip(years, profiles) if profile is None]
+            profiles = [profile for profile in profiles if profile is not None]
+            
+            plan = self.plan_column_dtypes(profiles) if profiles else {}
+            
+            writer = None
+            try:
+                for profile in profiles:
+                    df_year = self.align_year(pd.read_parquet(profile['path']), plan)
+                    
+                    if writer is None:
+                        schema = pa.Schema.from_pandas(df_year, preserve_index=False)
+                        # Text columns empty in the first year would be typed null
+                        for i, field in enumerate(schema):
+                            if pa.types.is_null(field.type):
+                                schema = schema.set(i, field.with_type(pa.string()))
+                        self.logger.info(f"Writing harmonized data to {output_file}")
+                        writer = open_parquet_writer(output_file, schema)
+                    
+                    table = pa.Table.from_pandas(df_year, schema=schema, preserve_index=False)
+                    writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+                    total_rows += table.num_rows
+                    
+                    del df_year, table
+                    profile['path'].unlink()
+            finally:
+                if writer is not None:
+                    writer.close()
+        
+        log_banner("HARMONIZATION SUMMARY")
+        self.logger.info(f"Successful years: {len(profiles)}")
+        self.logger.info(f"Failed years: {len(failed_years)}")
+        
+        if not profiles:
+            return None
+        
+        file_size = output_file.stat().st_size / (1024 * 1024)  # MB
+        self.logger.info(f"Total rows: {total_rows:,}")
+        self.logger.info(f"Total columns: {len(plan)}")
+        self.logger.info(f"Saved {total_rows:,} rows to {output_file.name} ({file_size:.2f} MB)")
+        
+        return {'rows': total_rows, 'columns': len(plan), 'output_file': output_file}
+    
     def save_harmonized_data(self, df: pd.DataFrame) -> Path:
         """
         Save harmonized data to processed directory.
@@ -382,7 +915,9 @@ class SchemaHarmonizer:
         output_file = PROCESSED_DATA_DIR / f"{self.category.lower()}_harmonized.parquet"
         
         self.logger.info(f"Saving harmonized data to {output_file}")
-        df.to_parquet(output_file, index=False, engine='pyarrow')
+        # Years are concatenated in order, so row groups cover contiguous
+        # DATA_YEAR ranges and year filters prune them via statistics
+        write_parquet(df, output_file)
         
         file_size = output_file.stat().st_size / (1024 * 1024)  # MB
         self.logger.info(f"Saved {len(df):,} rows to {output_file.name} ({file_size:.2f} MB)")
@@ -410,17 +945,67 @@ def harmonize_category(category: str, years: Optional[List[int]] = None) -> pd.D
     return df
 
 
-def main(categories: Optional[List[str]] = None, years: Optional[List[int]] = None):
+def _harmonize_one(category: str, years: Optional[List[int]] = None) -> dict:
+    """
+    Harmonize one category and return its summary (runs in a worker process).
+    
+    Only the summary crosses the process boundary. The category is streamed
+    to parquet year by year (SchemaHarmonizer.write_all_years), so the worker
+    never holds the whole category in memory.
+    
+    Args:
+        category: PennDOT category name
+        years: Optional list of years (default: all)
+        
+    Returns:
+        Result dict with status, rows and columns
+    """
+    summary = SchemaHarmonizer(category).write_all_years(years)
+    return {
+        'status': 'success',
+        'rows': summary['rows'] if summary else 0,
+        'columns': summary['columns'] if summary else 0
+    }
+
+
+def _init_worker(workers: int):
+    """Split Arrow's CSV/parquet thread pool between worker processes."""
+    pa.set_cpu_count(max(1, (os.cpu_count() or 1) // workers))
+
+
+def _stage_inputs(categories: Optional[List[str]] = None, years: Optional[List[int]] = None,
+                  max_workers: Optional[int] = None) -> List[Path]:
+    """Raw CSVs and schema report read by harmonization (cache key inputs)."""
+    paths = [METADATA_DIR / "schema_analysis_report.json"]
+    for category in categories or PENNDOT_CATEGORIES:
+        paths.extend(RAW_DATA_DIR.glob(f"{category}*.csv"))
+    return paths
+
+
+def _stage_outputs(categories: Optional[List[str]] = None, years: Optional[List[int]] = None,
+                   max_workers: Optional[int] = None) -> List[Path]:
+    """Harmonized parquet files written by harmonization."""
+    return [
+        PROCESSED_DATA_DIR / f"{category.lower()}_harmonized.parquet"
+        for category in categories or PENNDOT_CATEGORIES
+    ]
+
+
+@cached_stage("harmonize", _stage_inputs, _stage_outputs,
+              sources=[write_parquet], config_keys=['PENNDOT_CATEGORIES', 'YEARS'])
+def main(categories: Optional[List[str]] = None, years: Optional[List[int]] = None,
+         max_workers: int = HARMONIZE_WORKERS):
     """
     Main execution function.
     
+    Categories are independent, so each one is harmonized in its own process.
+    
     Args:
         categories: List of categories to process (default: all)
         years: List of years to process (default: all)
+        max_workers: Categories processed in parallel (1 = sequential, in-process)
     """
-    logger.info("=" * 80)
-    logger.info("SCHEMA HARMONIZATION SCRIPT")
-    logger.info("=" * 80)
+    log_banner("SCHEMA HARMONIZATION SCRIPT")
     
     if categories is None:
         categories = PENNDOT_CATEGORIES
@@ -431,33 +1016,49 @@ def main(categories: Optional[List[str]] = None, years: Optional[List[int]] = No
     logger.info(f"Categories to process: {', '.join(categories)}")
     logger.info(f"Years to process: {min(years)}-{max(years)}")
     
+    workers = max(1, min(max_workers, len(categories)))
+    logger.info(f"Parallel workers: {workers}")
+    
     results = {}
     
-    for category in categories:
-        logger.info("")
-        logger.info("=" * 80)
-        logger.info(f"PROCESSING CATEGORY: {category}")
-        logger.info("=" * 80)
-        
-        try:
-            df = harmonize_category(category, years)
-            results[category] = {
-                'status': 'success',
-                'rows': len(df) if df is not None else 0,
-                'columns': len(df.columns) if df is not None else 0
-            }
-        except Exception as e:
-            logger.error(f"Failed to process {category}: {e}", exc_info=True)
-            results[category] = {
-                'status': 'failed',
-                'error': str(e)
+    if workers == 1:
+        for category in categories:
+            logger.info("")
+            log_banner(f"PROCESSING CATEGORY: {category}")
+            
+            try:
+                results[category] = _harmonize_one(category, years)
+            except Exception as e:
+                logger.error(f"Failed to process {category}: {e}", exc_info=True)
+                results[category] = {
+                    'status': 'failed',
+                    'error': str(e)
+                }
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(workers,)) as executor:
+            futures = {
+                executor.submit(_harmonize_one, category, years): category
+                for category in categories
             }
+            
+            for future in as_completed(futures):
+                category = futures[future]
+                try:
+                    results[category] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process {category}: {e}", exc_info=True)
+                    results[category] = {
+                        'status': 'failed',
+                        'error': str(e)
+                    }
+        
+        # Report in the configured category order
+        results = {category: results[category] for category in categories}
     
     # Print summary
     logger.info("")
-    logger.info("=" * 80)
-    logger.info("HARMONIZATION COMPLETE")
-    logger.info("=" * 80)
+    log_banner("HARMONIZATION COMPLETE")
     
     for category, result in results.items():
         if result['status'] == 'success':
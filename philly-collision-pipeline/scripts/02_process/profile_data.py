@@ -16,12 +16,18 @@ Author: Arta Seyedian
 Date: October 2025
 """
 
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 from pathlib import Path
 from typing import Dict, List, Tuple
-import json
-from collections import defaultdict
+import orjson
+from collections import Counter, defaultdict
 import glob
 
 import sys
@@ -31,14 +37,163 @@ from config import (
     RAW_DATA_DIR,
     PROCESSED_DATA_DIR,
     METADATA_DIR,
+    CACHE_DIR,
     PENNDOT_CATEGORIES,
     YEARS
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
+from utils.cache import cached_stage
+from utils.io_utils import write_parquet
 
 
 logger = setup_logger("profile_data")
 
+# Bytes read from the start of each CSV for the sample profile (one Arrow block)
+SAMPLE_BLOCK_SIZE = 1 << 20
+
+# Files larger than this are profiled over every block rather than just the
+# first, so their statistics aren't biased towards the head of the file
+FULL_PROFILE_MIN_BYTES = 50 * 1024 * 1024
+
+# Distinct values tracked per column; beyond this the unique count is
+# reported as a lower bound
+DISTINCT_VALUE_CAP = 100_000
+
+# Columns with fewer distinct values than this get sample value counts
+SAMPLE_VALUES_MAX_UNIQUE = 20
+
+# Files profiled concurrently per category (threads; Arrow parses off the GIL)
+PROFILE_WORKERS = min(8, os.cpu_count() or 1)
+
+# Per-file profiles, keyed by file name, size and mtime. Bump the version when
+# the profile contents change so older entries are ignored.
+PROFILE_CACHE_DIR = CACHE_DIR / "profile_files"
+PROFILE_CACHE_VERSION = 2
+
+# Four-digit years in raw filenames (e.g. CRASH_2020.csv)
+_YEAR_RE = re.compile(r'(?:19|20)\d{2}')
+
+# Per-category profile tables (one row per column per year)
+PROFILE_TABLE_DIR = METADATA_DIR / "profiles"
+
+# Column statistics carried into the profile tables
+PROFILE_TABLE_STATS = ['null_count', 'unique_count', 'min', 'max']
+
+# JSON serialization for the report and profile cache: 2-space indent, numpy
+# scalars handled natively, non-string keys (years, sample values) stringified
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def pandas_dtypes(schema: pa.Schema) -> Dict[str, str]:
+    """Pandas dtype names for an Arrow schema (what harmonization compares against)."""
+    return {col: str(dtype) for col, dtype in schema.empty_table().to_pandas().dtypes.items()}
+
+
+def profile_table(profiles: List[dict]) -> pd.DataFrame:
+    """
+    Flatten file profiles into one row per column per year.
+    
+    Args:
+        profiles: Profile dicts from profile_file or profile_schema_only
+        
+    Returns:
+        DataFrame with category, year, column, dtype and PROFILE_TABLE_STATS
+        (stats are missing for schema-only profiles)
+    """
+    rows = [
+        (profile['category'], profile['year'], col, profile['dtypes'][col],
+         *(profile.get('column_stats', {}).get(col, {}).get(stat) for stat in PROFILE_TABLE_STATS))
+        for profile in profiles
+        for col in profile['columns']
+    ]
+    return pd.DataFrame(rows, columns=['category', 'year', 'column', 'dtype'] + PROFILE_TABLE_STATS)
+
+
+class ColumnAccumulator:
+    """Running statistics for one column over a stream of Arrow batches."""
+    
+    def __init__(self, dtype: str, numeric: bool):
+        """
+        Initialize empty statistics.
+        
+        Args:
+            dtype: pandas dtype name reported for the column
+            numeric: Whether to track min/max
+        """
+        self.dtype = dtype
+        self.numeric = numeric
+        self.null_count = 0
+        self.distinct = set()       # None once DISTINCT_VALUE_CAP is exceeded
+        self.counts = Counter()     # None once the column has too many values
+        self.min = None
+        self.max = None
+    
+    def update(self, values: pa.Array):
+        """Fold one batch of the column into the statistics."""
+        self.null_count += values.null_count
+        
+        # Columns with no values in the sample are typed null; nothing to count
+        if pa.types.is_null(values.type):
+            return
+        
+        # Every statistic below is taken from the batch's distinct values, so
+        # the column itself is scanned once (by value_counts) per batch
+        uniques = values
+        if self.distinct is not None or self.counts is not None:
+            value_counts = pc.value_counts(values)
+            uniques = value_counts.field('values')
+            batch_values = uniques.to_pylist()
+            
+            if self.distinct is not None:
+                self.distinct.update(value for value in batch_values if value is not None)
+                if len(self.distinct) > DISTINCT_VALUE_CAP:
+                    self.distinct = None
+            
+            if self.counts is not None:
+                for value, count in zip(batch_values, value_counts.field('counts').to_pylist()):
+                    if value is not None:
+                        self.counts[value] += count
+                if len(self.counts) >= SAMPLE_VALUES_MAX_UNIQUE:
+                    self.counts = None
+        
+        if self.numeric:
+            min_max = pc.min_max(uniques)
+            batch_min, batch_max = min_max['min'].as_py(), min_max['max'].as_py()
+            if batch_min is not None:
+                self.min = batch_min if self.min is None else min(self.min, batch_min)
+                self.max = batch_max if self.max is None else max(self.max, batch_max)
+    
+    def stats(self, num_rows: int) -> dict:
+        """
+        Final column statistics.
+        
+        Args:
+            num_rows: Rows profiled
+            
+        Returns:
+            Stats dict in the report's column_stats format
+        """
+        stats = {
+            'dtype': self.dtype,
+            'null_count': self.null_count,
+            'null_pct': self.null_count / max(num_rows, 1) * 100,
+            'unique_count': len(self.distinct) if self.distinct is not None else DISTINCT_VALUE_CAP,
+        }
+        
+        if self.distinct is None:
+            stats['unique_count_is_lower_bound'] = True
+        
+        # Add sample values for categorical-looking columns
+        if self.counts is not None:
+            stats['sample_values'] = dict(self.counts.most_common(10))
+        
+        # Add range for numeric columns
+        if self.numeric:
+            stats['min'] = None if self.min is None else float(self.min)
+            stats['max'] = None if self.max is None else float(self.max)
+        
+        return stats
+
 
 class DataProfiler:
     """Profiles crash data to understand schema evolution and quality issues."""
@@ -75,12 +230,10 @@ class DataProfiler:
             Year as integer
         """
         # Filenames typically like: CRASH_2020.csv
-        try:
-            for year in YEARS:
-                if str(year) in filepath.name:
-                    return year
-        except:
-            pass
+        for match in _YEAR_RE.finditer(filepath.name):
+            year = int(match.group())
+            if year in YEARS:
+                return year
         
         logger.warning(f"Could not extract year from {filepath.name}")
         return None
@@ -100,43 +253,65 @@ class DataProfiler:
         
         logger.info(f"Profiling {category} for year {year}: {filepath.name}")
         
+        stat = filepath.stat()
+        cache_path = PROFILE_CACHE_DIR / (
+            f"{filepath.name}-{stat.st_size}-{stat.st_mtime_ns}-v{PROFILE_CACHE_VERSION}.json"
+        )
+        if cache_path.exists():
+            logger.info(f"{filepath.name} unchanged, using cached profile")
+            return orjson.loads(cache_path.read_bytes())
+        
         try:
-            # Read first few rows to get schema
-            df = pd.read_csv(filepath, nrows=1000)
+            # Small files: profile the first block only. Large files: stream
+            # every block through running statistics at one block of memory.
+            full_scan = stat.st_size > FULL_PROFILE_MIN_BYTES
+            reader = pacsv.open_csv(filepath, read_options=pacsv.ReadOptions(block_size=SAMPLE_BLOCK_SIZE))
+            schema = reader.schema
+            dtypes = pandas_dtypes(schema)
+            accumulators = {
+                field.name: ColumnAccumulator(
+                    dtypes[field.name],
+                    pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+                )
+                for field in schema
+            }
+            
+            num_rows = 0
+            try:
+                for batch in reader:
+                    for col, values in zip(schema.names, batch.columns):
+                        accumulators[col].update(values)
+                    num_rows += batch.num_rows
+                    if not full_scan:
+                        break
+            except pa.ArrowInvalid as e:
+                # A later block doesn't fit the types inferred from the first
+                logger.warning(f"Stopped profiling {filepath.name} after {num_rows:,} rows: {e}")
+            finally:
+                reader.close()
             
             profile = {
                 'year': year,
                 'category': category,
                 'filename': filepath.name,
-                'file_size_mb': filepath.stat().st_size / (1024 * 1024),
-                'columns': list(df.columns),
-                'num_columns': len(df.columns),
-                'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
-                'sample_rows': len(df)
+                'file_size_mb': stat.st_size / (1024 * 1024),
+                'columns': schema.names,
+                'num_columns': len(schema),
+                'dtypes': dtypes,
+                'sample_rows': num_rows,
+                'full_scan': full_scan
             }
             
-            # Add column-level statistics (from sample)
-            column_stats = {}
-            for col in df.columns:
-                stats = {
-                    'dtype': str(df[col].dtype),
-                    'null_count': int(df[col].isnull().sum()),
-                    'null_pct': float(df[col].isnull().sum() / len(df) * 100),
-                    'unique_count': int(df[col].nunique()),
-                }
-                
-                # Add sample values for categorical-looking columns
-                if df[col].nunique() < 20:
-                    stats['sample_values'] = df[col].value_counts().head(10).to_dict()
-                
-                # Add range for numeric columns
-                if pd.api.types.is_numeric_dtype(df[col]):
-                    stats['min'] = float(df[col].min()) if not df[col].isnull().all() else None
-                    stats['max'] = float(df[col].max()) if not df[col].isnull().all() else None
-                
-                column_stats[col] = stats
+            # Add column-level statistics, computed on the Arrow arrays
+            profile['column_stats'] = {
+                col: accumulator.stats(num_rows) for col, accumulator in accumulators.items()
+            }
             
-            profile['column_stats'] = column_stats
+            # Replace any entry from an older version of this file
+            PROFILE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            for stale in PROFILE_CACHE_DIR.glob(f"{filepath.name}-*.json"):
+                stale.unlink()
+            cache_path.write_bytes(orjson.dumps(profile, default=str, option=JSON_OPTIONS))
             
             logger.info(f"Profiled {filepath.name}: {profile['num_columns']} columns, {profile['sample_rows']} sample rows")
             
@@ -146,19 +321,53 @@ class DataProfiler:
             logger.error(f"Error profiling {filepath}: {e}")
             return None
     
-    def profile_category(self, category: str) -> List[dict]:
+    def profile_schema_only(self, filepath: Path, category: str) -> dict:
+        """
+        Profile just the header and inferred column types of a CSV file.
+        
+        Opening the reader infers the schema from the first block without
+        converting any rows, which is all compare_schemas needs.
+        
+        Args:
+            filepath: Path to CSV file
+            category: Data category
+            
+        Returns:
+            Dictionary with the file's columns and dtypes
+        """
+        year = self.extract_year_from_filename(filepath)
+        
+        try:
+            reader = pacsv.open_csv(filepath, read_options=pacsv.ReadOptions(block_size=SAMPLE_BLOCK_SIZE))
+            schema = reader.schema
+            reader.close()
+        except Exception as e:
+            logger.error(f"Error reading schema of {filepath}: {e}")
+            return None
+        
+        return {
+            'year': year,
+            'category': category,
+            'filename': filepath.name,
+            'file_size_mb': filepath.stat().st_size / (1024 * 1024),
+            'columns': schema.names,
+            'num_columns': len(schema),
+            'dtypes': pandas_dtypes(schema)
+        }
+    
+    def profile_category(self, category: str, schema_only: bool = False) -> List[dict]:
         """
         Profile all years for a data category.
         
         Args:
             category: Data category to profile
+            schema_only: Only read column names and types (enough for
+                compare_schemas), skipping the per-column statistics
             
         Returns:
             List of profile dictionaries
         """
-        logger.info(f"=" * 60)
-        logger.info(f"Profiling category: {category}")
-        logger.info(f"=" * 60)
+        log_banner(f"Profiling category: {category}", width=60)
         
         csv_files = self.find_csv_files(category)
         
@@ -166,13 +375,19 @@ class DataProfiler:
             logger.warning(f"No CSV files found for category {category}")
             return []
         
-        profiles = []
-        for filepath in csv_files:
-            profile = self.profile_file(filepath, category)
-            if profile:
-                profiles.append(profile)
+        # Files are independent; map() keeps the results in file order
+        workers = max(1, min(PROFILE_WORKERS, len(csv_files)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            profile_fn = self.profile_schema_only if schema_only else self.profile_file
+            results = executor.map(profile_fn, csv_files, [category] * len(csv_files))
+            profiles = [profile for profile in results if profile]
         
         self.profiles[category] = profiles
+        
+        if profiles:
+            PROFILE_TABLE_DIR.mkdir(parents=True, exist_ok=True)
+            write_parquet(profile_table(profiles), PROFILE_TABLE_DIR / f"{category}.parquet")
+        
         return profiles
     
     def compare_schemas(self, category: str) -> dict:
@@ -189,68 +404,43 @@ class DataProfiler:
             logger.warning(f"No profiles found for {category}")
             return {}
         
-        profiles = self.profiles[category]
+        # Column x year dtype matrix (missing where the column is absent).
+        # pivot sorts both axes; if a year has two files the later dtype wins
+        table = profile_table(self.profiles[category])
+        dtype_matrix = (
+            table.drop_duplicates(['column', 'year'], keep='last')
+            .pivot(index='column', columns='year', values='dtype')
+        )
+        presence = dtype_matrix.notna()
         
-        # Track all columns seen
-        all_columns = set()
-        year_columns = {}
-        year_dtypes = {}
-        
-        for profile in profiles:
-            year = profile['year']
-            cols = set(profile['columns'])
-            all_columns.update(cols)
-            year_columns[year] = cols
-            year_dtypes[year] = profile['dtypes']
+        years_sorted = list(dtype_matrix.columns)
+        all_columns_sorted = list(dtype_matrix.index)
         
         # Build comparison matrix
         comparison = {
             'category': category,
-            'all_columns': sorted(all_columns),
-            'num_unique_columns': len(all_columns),
-            'year_range': f"{min(year_columns.keys())}-{max(year_columns.keys())}",
+            'all_columns': all_columns_sorted,
+            'num_unique_columns': len(all_columns_sorted),
+            'year_range': f"{years_sorted[0]}-{years_sorted[-1]}",
             'columns_by_year': {},
             'dtype_changes': {},
             'added_columns': {},
             'removed_columns': {},
         }
         
-        # Track column presence by year
-        for col in sorted(all_columns):
-            comparison['columns_by_year'][col] = {
-                year: col in year_columns[year]
-                for year in sorted(year_columns.keys())
-            }
+        comparison['columns_by_year'] = presence.to_dict(orient='index')
         
-        # Track dtype changes
-        for col in sorted(all_columns):
-            dtypes_by_year = {}
-            for year in sorted(year_columns.keys()):
-                if col in year_dtypes[year]:
-                    dtypes_by_year[year] = year_dtypes[year][col]
-            
-            # Check if dtypes changed
-            unique_dtypes = set(dtypes_by_year.values())
-            if len(unique_dtypes) > 1:
-                comparison['dtype_changes'][col] = dtypes_by_year
-        
-        # Identify added/removed columns
-        years_sorted = sorted(year_columns.keys())
-        for col in sorted(all_columns):
-            first_year = None
-            last_year = None
-            
-            for year in years_sorted:
-                if col in year_columns[year]:
-                    if first_year is None:
-                        first_year = year
-                    last_year = year
-            
-            if first_year != years_sorted[0]:
-                comparison['added_columns'][col] = first_year
-            
-            if last_year != years_sorted[-1]:
-                comparison['removed_columns'][col] = last_year
+        # Only columns with more than one dtype are expanded into the report
+        changed = dtype_matrix.nunique(axis=1, dropna=True) > 1
+        for col, dtypes in dtype_matrix[changed].iterrows():
+            comparison['dtype_changes'][col] = dtypes.dropna().to_dict()
+        
+        # Identify added/removed columns: idxmax gives the first True per row,
+        # so the first and last year each column is present
+        first_seen = presence.idxmax(axis=1)
+        last_seen = presence.iloc[:, ::-1].idxmax(axis=1)
+        comparison['added_columns'] = first_seen[first_seen != years_sorted[0]].to_dict()
+        comparison['removed_columns'] = last_seen[last_seen != years_sorted[-1]].to_dict()
         
         return comparison
     
@@ -312,54 +502,67 @@ class DataProfiler:
         
         logger.info(f"Saving report to {output_path}")
         
-        with open(output_path, 'w') as f:
-            json.dump(report, f, indent=2)
+        output_path.write_bytes(orjson.dumps(report, default=str, option=JSON_OPTIONS))
         
         logger.info(f"Report saved successfully")
         
         # Also create a human-readable summary
         summary_path = METADATA_DIR / "schema_analysis_summary.txt"
-        with open(summary_path, 'w') as f:
-            f.write("=" * 80 + "\n")
-            f.write("PENNDOT CRASH DATA SCHEMA ANALYSIS SUMMARY\n")
-            f.write("=" * 80 + "\n\n")
+        lines = [
+            "=" * 80,
+            "PENNDOT CRASH DATA SCHEMA ANALYSIS SUMMARY",
+            "=" * 80,
+            "",
+            f"Total Categories Analyzed: {report['summary']['total_categories']}",
+            f"Total Files Profiled: {report['summary']['total_files']}",
+            "",
+            "SCHEMA ISSUES FOUND:",
+            "-" * 80,
+        ]
+        
+        for issue in report['summary']['schema_issues']:
+            lines += ["", f"Category: {issue['category']}", f"Issue Type: {issue['issue']}"]
             
-            f.write(f"Total Categories Analyzed: {report['summary']['total_categories']}\n")
-            f.write(f"Total Files Profiled: {report['summary']['total_files']}\n\n")
-            
-            f.write("SCHEMA ISSUES FOUND:\n")
-            f.write("-" * 80 + "\n")
-            
-            for issue in report['summary']['schema_issues']:
-                f.write(f"\nCategory: {issue['category']}\n")
-                f.write(f"Issue Type: {issue['issue']}\n")
-                
-                if 'affected_columns' in issue:
-                    f.write(f"Affected Columns: {', '.join(issue['affected_columns'])}\n")
-                elif 'columns' in issue:
-                    f.write(f"Columns: {', '.join(issue['columns'])}\n")
+            if 'affected_columns' in issue:
+                lines.append(f"Affected Columns: {', '.join(issue['affected_columns'])}")
+            elif 'columns' in issue:
+                lines.append(f"Columns: {', '.join(issue['columns'])}")
+        
+        summary_path.write_text("\n".join(lines) + "\n")
         
         logger.info(f"Summary saved to {summary_path}")
 
 
+@cached_stage(
+    "profile",
+    inputs_fn=lambda: [
+        path
+        for category in PENNDOT_CATEGORIES
+        for path in RAW_DATA_DIR.glob(f"{category}*.csv")
+    ],
+    outputs_fn=lambda: [
+        METADATA_DIR / "schema_analysis_report.json",
+        METADATA_DIR / "schema_analysis_summary.txt"
+    ],
+    sources=[write_parquet],
+    config_keys=['PENNDOT_CATEGORIES', 'YEARS']
+)
 def main():
     """Main execution function."""
     logger.info("Data Profiling Script Started")
     
     profiler = DataProfiler()
     
-    # Profile each category
+    # Profile each category (the report only compares schemas)
     for category in PENNDOT_CATEGORIES:
-        profiler.profile_category(category)
+        profiler.profile_category(category, schema_only=True)
     
     # Generate and save report
     report = profiler.generate_report()
     profiler.save_report(report)
     
     # Log summary
-    logger.info("=" * 60)
-    logger.info("PROFILING SUMMARY")
-    logger.info("=" * 60)
+    log_banner("PROFILING SUMMARY", width=60)
     logger.info(f"Categories profiled: {report['summary']['total_categories']}")
     logger.info(f"Total files: {report['summary']['total_files']}")
     logger.info(f"Schema issues found: {len(report['summary']['schema_issues'])}")
@@ -15,10 +15,9 @@ Date: October 2025
 
 import pandas as pd
 import numpy as np
+import pyarrow.csv as pacsv
 from pathlib import Path
-from typing import Dict, List, Tuple
-import pandera as pa
-from pandera import Column, Check, DataFrameSchema
+from typing import Dict, List, Tuple, Union
 
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
@@ -29,6 +28,73 @@ from utils.logging_utils import setup_logger, log_dataframe_info
 
 logger = setup_logger("quality_checks")
 
+# Philadelphia bounding box, unpacked once for the bounds checks
+LAT_MIN, LAT_MAX = PHILLY_BOUNDS['lat_min'], PHILLY_BOUNDS['lat_max']
+LON_MIN, LON_MAX = PHILLY_BOUNDS['lon_min'], PHILLY_BOUNDS['lon_max']
+
+# Most decimal places checked for when measuring coordinate precision
+MAX_DECIMAL_PLACES = 15
+
+# Columns read by the checks in run_all_checks (plus HELMET_COLUMNS for CYCLE)
+CHECK_COLUMNS = ['DEC_LAT', 'DEC_LONG', 'COUNTY', 'CRASH_DATE', 'CRASH_YEAR']
+HELMET_COLUMNS = ['PC_HLMT_IND']
+
+
+def decimal_places(values: pd.Series) -> pd.Series:
+    """
+    Count the decimal places of each value without formatting it as a string.
+    
+    A value has k places when rounding it to k places leaves it unchanged, so
+    the count comes from a few vectorized rounding passes over the float array
+    (one per digit, stopping once every value is resolved).
+    
+    Args:
+        values: Numeric series
+        
+    Returns:
+        Series of decimal place counts (NaN for missing values)
+    """
+    x = values.to_numpy(dtype='float64', na_value=np.nan)
+    places = np.full(x.shape, np.nan)
+    pending = np.isfinite(x)
+    
+    for k in range(MAX_DECIMAL_PLACES + 1):
+        if not pending.any():
+            break
+        exact = pending & (np.round(x, k) == x)
+        places[exact] = k
+        pending &= ~exact
+    
+    places[pending] = MAX_DECIMAL_PLACES
+    return pd.Series(places, index=values.index)
+
+
+def in_philly_bounds(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Whether each coordinate pair falls within Philadelphia's bounding box.
+    
+    The four comparisons are written into one reused scratch buffer and
+    folded into the result in place, so only two boolean arrays are ever
+    allocated. NaN fails every comparison, so missing coordinates are False.
+    
+    Args:
+        lat: Latitudes as float64
+        lon: Longitudes as float64
+        
+    Returns:
+        Boolean array
+    """
+    valid = np.greater_equal(lat, LAT_MIN)
+    scratch = np.empty_like(valid)
+    for compare, values, bound in (
+        (np.less_equal, lat, LAT_MAX),
+        (np.greater_equal, lon, LON_MIN),
+        (np.less_equal, lon, LON_MAX),
+    ):
+        compare(values, bound, out=scratch)
+        valid &= scratch
+    return valid
+
 
 class QualityChecker:
     """Performs data quality checks on crash data."""
@@ -40,6 +106,72 @@ class QualityChecker:
             'issues_found': [],
             'summary': {}
         }
+        
+        # Parsed timestamp for each raw date value seen so far; crash dates
+        # repeat heavily within and across categories
+        self._parsed_dates: Dict[object, np.datetime64] = {}
+    
+    def parse_dates(self, values: pd.Series) -> pd.Series:
+        """
+        Parse a date column, converting each distinct value only once.
+        
+        Args:
+            values: Raw date values (already-typed datetimes are returned as is)
+            
+        Returns:
+            datetime64 Series aligned with values (NaT where parsing failed)
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        
+        codes, uniques = pd.factorize(values)
+        new = [value for value in uniques if value not in self._parsed_dates]
+        if new:
+            parsed = pd.to_datetime(pd.Series(new, dtype=object), errors='coerce')
+            self._parsed_dates.update(zip(new, parsed.to_numpy(dtype='datetime64[ns]')))
+        
+        # Trailing NaT so missing values (code -1) gather it directly
+        lookup = np.array(
+            [self._parsed_dates[value] for value in uniques] + [np.datetime64('NaT')],
+            dtype='datetime64[ns]'
+        )
+        return pd.Series(lookup[codes], index=values.index)
+    
+    @classmethod
+    def required_columns(cls, category: str) -> List[str]:
+        """
+        Columns run_all_checks reads for a category.
+        
+        Pass this to the reader (usecols= / include_columns=) so the other
+        columns are never parsed.
+        
+        Args:
+            category: Data category
+            
+        Returns:
+            List of column names
+        """
+        return CHECK_COLUMNS + (HELMET_COLUMNS if category == 'CYCLE' else [])
+    
+    @classmethod
+    def read_check_columns(cls, path: Path, category: str) -> pd.DataFrame:
+        """
+        Read only the columns the checks need from a CSV file.
+        
+        Args:
+            path: CSV file
+            category: Data category
+            
+        Returns:
+            DataFrame with whichever required columns the file has
+        """
+        reader = pacsv.open_csv(path)
+        available = set(reader.schema.names)
+        reader.close()
+        
+        columns = [col for col in cls.required_columns(category) if col in available]
+        table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(include_columns=columns))
+        return table.to_pandas()
     
     def check_geographic_bounds(self, df: pd.DataFrame, lat_col: str = 'DEC_LAT', lon_col: str = 'DEC_LONG') -> Tuple[pd.DataFrame, dict]:
         """
@@ -66,47 +198,36 @@ class QualityChecker:
             report['issues'].append({'type': 'missing_columns', 'columns': [lat_col, lon_col]})
             return df, report
         
-        # Check for missing coordinates
-        missing_coords = df[[lat_col, lon_col]].isnull().any(axis=1)
-        num_missing = missing_coords.sum()
+        lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
+        
+        # Every row is exactly one of: missing, in bounds, out of bounds
+        in_bounds = in_philly_bounds(lat, lon)
+        num_missing = int(np.count_nonzero(np.isnan(lat) | np.isnan(lon)))
+        num_valid = int(np.count_nonzero(in_bounds))
+        num_out_of_bounds = len(df) - num_missing - num_valid
         
         if num_missing > 0:
             logger.warning(f"Found {num_missing} records with missing coordinates ({num_missing/len(df)*100:.2f}%)")
             report['issues'].append({
                 'type': 'missing_coordinates',
-                'count': int(num_missing),
+                'count': num_missing,
                 'percentage': float(num_missing/len(df)*100)
             })
         
-        # Check bounds (only for non-missing coordinates)
-        valid_coords = ~missing_coords
-        
-        out_of_bounds_lat = (
-            (df.loc[valid_coords, lat_col] < PHILLY_BOUNDS['lat_min']) |
-            (df.loc[valid_coords, lat_col] > PHILLY_BOUNDS['lat_max'])
-        )
-        
-        out_of_bounds_lon = (
-            (df.loc[valid_coords, lon_col] < PHILLY_BOUNDS['lon_min']) |
-            (df.loc[valid_coords, lon_col] > PHILLY_BOUNDS['lon_max'])
-        )
-        
-        out_of_bounds = out_of_bounds_lat | out_of_bounds_lon
-        num_out_of_bounds = out_of_bounds.sum()
-        
         if num_out_of_bounds > 0:
             logger.warning(f"Found {num_out_of_bounds} records with out-of-bounds coordinates ({num_out_of_bounds/len(df)*100:.2f}%)")
             report['issues'].append({
                 'type': 'out_of_bounds',
-                'count': int(num_out_of_bounds),
+                'count': num_out_of_bounds,
                 'percentage': float(num_out_of_bounds/len(df)*100)
             })
         
         # Add validity flag
-        df['geo_valid'] = valid_coords & ~out_of_bounds
+        df['geo_valid'] = in_bounds
         
-        report['valid_records'] = int(df['geo_valid'].sum())
-        report['invalid_records'] = int((~df['geo_valid']).sum())
+        report['valid_records'] = num_valid
+        report['invalid_records'] = len(df) - num_valid
         
         self.quality_report['checks_performed'].append(report)
         
@@ -184,16 +305,8 @@ class QualityChecker:
             return df, report
         
         # Analyze precision (count decimal places)
-        def count_decimals(value):
-            if pd.isnull(value):
-                return None
-            s = str(value)
-            if '.' in s:
-                return len(s.split('.')[1])
-            return 0
-        
-        lat_precision = df[lat_col].apply(count_decimals)
-        lon_precision = df[lon_col].apply(count_decimals)
+        lat_precision = decimal_places(df[lat_col])
+        lon_precision = decimal_places(df[lon_col])
         
         logger.info(f"Latitude precision range: {lat_precision.min()}-{lat_precision.max()} decimal places")
         logger.info(f"Longitude precision range: {lon_precision.min()}-{lon_precision.max()} decimal places")
@@ -234,7 +347,7 @@ class QualityChecker:
         
         # Parse dates
         try:
-            df[f'{date_col}_parsed'] = pd.to_datetime(df[date_col], errors='coerce')
+            df[f'{date_col}_parsed'] = self.parse_dates(df[date_col])
             
             # Check for parsing failures
             parse_failures = df[f'{date_col}_parsed'].isnull().sum()
@@ -288,34 +401,125 @@ class QualityChecker:
         
         # Check helmet indicator for CYCLE data
         if category_name == 'CYCLE' and 'PC_HLMT_IND' in df.columns:
-            helmet_values = df['PC_HLMT_IND'].value_counts(dropna=False)
+            # Work on the handful of categories rather than every row's string
+            # (harmonized data is already categorical, making this a no-op)
+            helmet = df['PC_HLMT_IND'].astype('category')
+            helmet_values = helmet.value_counts(dropna=False)
             logger.info(f"Helmet indicator values: {helmet_values.to_dict()}")
             
-            # Expected values: Y, N, U (or blank for unknown)
-            valid_values = {'Y', 'N', 'U', '', np.nan}
-            invalid = ~df['PC_HLMT_IND'].isin(valid_values)
+            # Expected values: Y, N, U (or blank/missing for unknown)
+            categories = helmet.cat.categories
+            invalid = helmet.isin(categories[~categories.isin(['Y', 'N', 'U', ''])])
             
             if invalid.any():
                 logger.warning(f"Found {invalid.sum()} invalid helmet indicator values")
                 report['issues'].append({
                     'type': 'invalid_helmet_values',
                     'count': int(invalid.sum()),
-                    'unexpected_values': df.loc[invalid, 'PC_HLMT_IND'].unique().tolist()
+                    'unexpected_values': helmet[invalid].unique().tolist()
                 })
             
-            # Standardize: blank to 'U'
-            df['PC_HLMT_IND'] = df['PC_HLMT_IND'].replace('', 'U').fillna('U')
+            # Standardize blank and missing to 'U': drop the blank category
+            # (its rows become missing), then fill missing codes
+            if '' in categories:
+                helmet = helmet.cat.remove_categories('')
+            if 'U' not in helmet.cat.categories:
+                helmet = helmet.cat.add_categories('U')
+            df['PC_HLMT_IND'] = helmet.fillna('U')
         
         self.quality_report['checks_performed'].append(report)
         
         return df, report
     
-    def run_all_checks(self, df: pd.DataFrame, category: str) -> pd.DataFrame:
+    def check_coordinates(self, df: pd.DataFrame, lat_col: str = 'DEC_LAT',
+                          lon_col: str = 'DEC_LONG') -> Tuple[pd.DataFrame, dict, dict]:
+        """
+        Geographic bounds and coordinate precision checks in one pass.
+        
+        Produces the same flags and reports as check_geographic_bounds
+        followed by check_coordinate_precision, but reads each coordinate
+        column into a float array once and adds all derived columns with a
+        single assign.
+        
+        Args:
+            df: DataFrame with coordinates
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            
+        Returns:
+            Tuple of (DataFrame with flags, bounds report, precision report)
+        """
+        logger.info("Checking geographic bounds and coordinate precision")
+        
+        geo_report = {
+            'check': 'geographic_bounds',
+            'total_records': len(df),
+            'issues': []
+        }
+        precision_report = {
+            'check': 'coordinate_precision',
+            'total_records': len(df),
+            'issues': []
+        }
+        
+        if lat_col not in df.columns or lon_col not in df.columns:
+            logger.warning(f"Coordinate columns not found: {lat_col}, {lon_col}")
+            geo_report['issues'].append({'type': 'missing_columns', 'columns': [lat_col, lon_col]})
+            return df, geo_report, precision_report
+        
+        lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
+        
+        # Every row is exactly one of: missing, in bounds, out of bounds
+        in_bounds = in_philly_bounds(lat, lon)
+        num_missing = int(np.count_nonzero(np.isnan(lat) | np.isnan(lon)))
+        num_out_of_bounds = len(df) - num_missing - int(np.count_nonzero(in_bounds))
+        
+        if num_missing > 0:
+            logger.warning(f"Found {num_missing} records with missing coordinates ({num_missing/len(df)*100:.2f}%)")
+            geo_report['issues'].append({
+                'type': 'missing_coordinates',
+                'count': num_missing,
+                'percentage': float(num_missing/len(df)*100)
+            })
+        
+        if num_out_of_bounds > 0:
+            logger.warning(f"Found {num_out_of_bounds} records with out-of-bounds coordinates ({num_out_of_bounds/len(df)*100:.2f}%)")
+            geo_report['issues'].append({
+                'type': 'out_of_bounds',
+                'count': num_out_of_bounds,
+                'percentage': float(num_out_of_bounds/len(df)*100)
+            })
+        
+        lat_precision = decimal_places(df[lat_col])
+        lon_precision = decimal_places(df[lon_col])
+        logger.info(f"Latitude precision range: {lat_precision.min()}-{lat_precision.max()} decimal places")
+        logger.info(f"Longitude precision range: {lon_precision.min()}-{lon_precision.max()} decimal places")
+        
+        # Standardize to 6 decimal places (~0.11 meters precision)
+        df = df.assign(**{
+            'geo_valid': in_bounds,
+            f'{lat_col}_standardized': np.round(lat, 6),
+            f'{lon_col}_standardized': np.round(lon, 6)
+        })
+        
+        geo_report['valid_records'] = int(in_bounds.sum())
+        geo_report['invalid_records'] = len(df) - geo_report['valid_records']
+        precision_report['precision_standardized'] = 6
+        
+        self.quality_report['checks_performed'].extend([geo_report, precision_report])
+        
+        logger.info(f"Geographic check: {geo_report['valid_records']} valid, {geo_report['invalid_records']} invalid")
+        
+        return df, geo_report, precision_report
+    
+    def run_all_checks(self, df: Union[pd.DataFrame, Path, str], category: str) -> pd.DataFrame:
         """
         Run all quality checks on a DataFrame.
         
         Args:
-            df: DataFrame to check
+            df: DataFrame to check, or a CSV path to read just the
+                required_columns() from
             category: Data category
             
         Returns:
@@ -323,10 +527,12 @@ class QualityChecker:
         """
         logger.info(f"Running all quality checks for {category}")
         
-        # Run each check
-        df, _ = self.check_geographic_bounds(df)
+        if not isinstance(df, pd.DataFrame):
+            df = self.read_check_columns(Path(df), category)
+        
+        # Run each check (bounds and precision share one coordinate pass)
+        df, _, _ = self.check_coordinates(df)
         df, _ = self.check_county_coding(df)
-        df, _ = self.check_coordinate_precision(df)
         df, _ = self.check_date_consistency(df)
         df, _ = self.check_categorical_consistency(df, category)
         
@@ -8,7 +8,9 @@ Addresses known issues from R analysis:
 - Invalid lat/lon values
 - CRS standardization
 
-Uses geopandas for spatial operations and boundary filtering.
+Uses geopandas for spatial operations and boundary filtering. geopandas and
+shapely are only imported when an official boundary file is configured or a
+GeoDataFrame is requested; the default bounding-box filter is pure numpy.
 
 Author: FDC Project
 Date: 2025-10-26
@@ -17,24 +19,40 @@ Date: 2025-10-26
 import sys
 from pathlib import Path
 import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point, Polygon
-from typing import Optional, Tuple
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from typing import TYPE_CHECKING, List, Optional, Tuple
 import numpy as np
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+    import shapely
+
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import (
     PROCESSED_DATA_DIR,
     PHILLY_BOUNDS,
-    METADATA_DIR
+    PHILLY_BOUNDARY_FILE,
+    METADATA_DIR,
+    CRS_WGS84
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
+from utils.io_utils import write_parquet, open_parquet_writer, PARQUET_ROW_GROUP_SIZE
+from utils.cache import cached_stage
 
 # Initialize logger
 logger = setup_logger(__name__)
 
+# Rows per record batch when streaming a category through the filter
+STREAM_BATCH_SIZE = 500_000
+
+# Values of the quality flag columns (missing means no issue)
+COORD_FLAGS = ['INVALID', 'OUTSIDE_PHILLY']
+COUNTY_FLAGS = ['NON_PHILLY_COUNTY']
+
 # Philadelphia boundary coordinates (approximate)
 # For production, load official city boundary shapefile
 PHILLY_BOUNDARY_COORDS = [
@@ -46,6 +64,57 @@ PHILLY_BOUNDARY_COORDS = [
 ]
 
 
+def quality_flag(mask: np.ndarray, label: str, categories: List[str]) -> pd.Categorical:
+    """
+    Categorical flag column: `label` where mask is set, missing elsewhere.
+    
+    Built straight from int8 codes, so flagging costs one byte per row
+    rather than an object array of repeated strings.
+    
+    Args:
+        mask: Boolean array of rows to flag
+        label: Flag value for those rows
+        categories: Every value the flag column can take
+        
+    Returns:
+        Categorical with the same length as mask
+    """
+    codes = np.full(len(mask), -1, dtype=np.int8)
+    codes[mask] = categories.index(label)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def invalid_coordinate_mask(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Missing and invalid coordinate masks, each condition folded in place.
+    
+    Every comparison is written into one reused scratch buffer, so only
+    three boolean arrays are allocated (no float temporaries for abs()).
+    
+    Args:
+        lat: Latitudes as float64 (NaN for missing)
+        lon: Longitudes as float64 (NaN for missing)
+        
+    Returns:
+        Tuple of (missing mask, invalid mask); invalid includes missing
+    """
+    missing = np.isnan(lat)
+    scratch = np.isnan(lon)
+    missing |= scratch
+    
+    invalid = np.equal(lat, 0)          # Zero coordinates
+    invalid &= np.equal(lon, 0, out=scratch)
+    invalid |= missing
+    for compare, values, bound in (
+        (np.less, lat, -90),            # Out of range latitude
+        (np.greater, lat, 90),
+        (np.less, lon, -180),           # Out of range longitude
+        (np.greater, lon, 180),
+    ):
+        invalid |= compare(values, bound, out=scratch)
+    return missing, invalid
+
+
 class GeographicFilter:
     """
     Filters and validates geographic data for Philadelphia collisions.
@@ -56,6 +125,7 @@ class GeographicFilter:
         self.logger = logger
         self.philly_bounds = PHILLY_BOUNDS
         self.philly_boundary = None
+        self.boundary_tree = None
         
         # Statistics
         self.stats = {
@@ -63,23 +133,42 @@ class GeographicFilter:
             'records_with_coords': 0,
             'invalid_coords': 0,
             'outside_bounds': 0,
+            'pruned_at_read': 0,
             'county_mismatches': 0,
             'final_records': 0
         }
         
         self.logger.info("GeographicFilter initialized")
     
-    def create_philly_boundary(self) -> Polygon:
+    def create_philly_boundary(self) -> 'shapely.Geometry':
         """
         Create Philadelphia boundary polygon.
         
-        For production, this should load official city boundary shapefile.
-        For now, uses bounding box.
+        Loads the official boundary from PHILLY_BOUNDARY_FILE when set,
+        indexing its parts in an STR-packed R-tree so each point is only
+        tested against the few parts whose extents contain it. Otherwise
+        uses the bounding box.
         
         Returns:
-            Shapely Polygon of Philadelphia boundary
+            Shapely geometry of Philadelphia boundary
         """
+        import shapely
+        from shapely.geometry import Polygon
+        
+        if PHILLY_BOUNDARY_FILE:
+            import geopandas as gpd
+            
+            boundary = gpd.read_file(PHILLY_BOUNDARY_FILE).to_crs(CRS_WGS84)
+            parts = boundary.geometry.explode(index_parts=False).to_numpy()
+            self.boundary_tree = shapely.STRtree(parts)
+            self.philly_boundary = shapely.union_all(parts)
+            
+            self.logger.info(f"Loaded Philadelphia boundary from {PHILLY_BOUNDARY_FILE} ({len(parts)} parts)")
+            return self.philly_boundary
+        
         polygon = Polygon(PHILLY_BOUNDARY_COORDS)
+        # Prepared geometries cache the GEOS spatial index used by predicates
+        shapely.prepare(polygon)
         self.philly_boundary = polygon
         
         self.logger.info("Created Philadelphia boundary polygon")
@@ -87,6 +176,45 @@ class GeographicFilter:
         
         return polygon
     
+    def philly_mask(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """
+        Whether each point lies within the Philadelphia boundary.
+        
+        Args:
+            lat: Latitudes as float64
+            lon: Longitudes as float64
+            
+        Returns:
+            Boolean array (False for missing coordinates)
+        """
+        # Load the official boundary if one is configured
+        if self.philly_boundary is None and PHILLY_BOUNDARY_FILE:
+            self.create_philly_boundary()
+        
+        # Bounding box (fast first pass), folding each comparison into one
+        # mask; NaN fails them all
+        in_bbox = lat >= self.philly_bounds['lat_min']
+        in_bbox &= lat <= self.philly_bounds['lat_max']
+        in_bbox &= lon >= self.philly_bounds['lon_min']
+        in_bbox &= lon <= self.philly_bounds['lon_max']
+        
+        # Without a boundary file the bbox is the boundary; no geometry needed
+        if self.boundary_tree is None:
+            return in_bbox
+        
+        import shapely
+        
+        # Exact boundary test, vectorized and only for points inside the bbox.
+        # R-tree query: (point, part) pairs that intersect
+        in_philly = np.zeros(len(lat), dtype=bool)
+        points = shapely.points(lon[in_bbox], lat[in_bbox])
+        point_idx, _ = self.boundary_tree.query(points, predicate='intersects')
+        hits = np.zeros(len(points), dtype=bool)
+        hits[point_idx] = True
+        in_philly[in_bbox] = hits
+        
+        return in_philly
+    
     def validate_coordinates(self, df: pd.DataFrame, 
                            lat_col: str = 'DEC_LATITUDE', 
                            lon_col: str = 'DEC_LONGITUDE') -> pd.DataFrame:
@@ -122,28 +250,23 @@ class GeographicFilter:
         df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
         df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
         
-        # Count records with coordinates
-        has_coords = df[lat_col].notna() & df[lon_col].notna()
-        self.stats['records_with_coords'] = has_coords.sum()
+        lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
         
-        # Flag invalid coordinates
-        invalid_coords = (
-            (df[lat_col] == 0) & (df[lon_col] == 0) |  # Zero coordinates
-            (df[lat_col].isna()) | (df[lon_col].isna()) |  # Missing
-            (df[lat_col] < -90) | (df[lat_col] > 90) |  # Out of range latitude
-            (df[lon_col] < -180) | (df[lon_col] > 180)  # Out of range longitude
-        )
-        
-        self.stats['invalid_coords'] = invalid_coords.sum()
+        # Count records with coordinates, flag invalid ones
+        missing, invalid_coords = invalid_coordinate_mask(lat, lon)
+        self.stats['records_with_coords'] = len(df) - int(np.count_nonzero(missing))
+        self.stats['invalid_coords'] = int(np.count_nonzero(invalid_coords))
         
-        if invalid_coords.any():
-            self.logger.warning(f"Found {invalid_coords.sum()} records with invalid coordinates")
-            df.loc[invalid_coords, 'COORD_QUALITY_FLAG'] = 'INVALID'
+        if self.stats['invalid_coords']:
+            self.logger.warning(f"Found {self.stats['invalid_coords']} records with invalid coordinates")
+            df['COORD_QUALITY_FLAG'] = quality_flag(invalid_coords, 'INVALID', COORD_FLAGS)
         
         # Standardize coordinate precision to 6 decimal places (~0.1m precision)
-        # Addresses coordinate precision inconsistencies from R analysis
-        df.loc[has_coords, lat_col] = df.loc[has_coords, lat_col].round(6)
-        df.loc[has_coords, lon_col] = df.loc[has_coords, lon_col].round(6)
+        # Addresses coordinate precision inconsistencies from R analysis.
+        # Rounding leaves NaN as NaN, so no mask is needed
+        df[lat_col] = np.round(lat, 6)
+        df[lon_col] = np.round(lon, 6)
         
         self.logger.info(f"Coordinate validation complete:")
         self.logger.info(f"  Total records: {initial_count:,}")
@@ -170,28 +293,26 @@ class GeographicFilter:
         
         initial_count = len(df)
         
-        # Create boundary if not exists
-        if self.philly_boundary is None:
-            self.create_philly_boundary()
-        
-        # Filter using bounding box (fast first pass)
-        in_bbox = (
-            (df[lat_col] >= self.philly_bounds['lat_min']) &
-            (df[lat_col] <= self.philly_bounds['lat_max']) &
-            (df[lon_col] >= self.philly_bounds['lon_min']) &
-            (df[lon_col] <= self.philly_bounds['lon_max'])
-        )
+        lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
         
-        # Count records outside bounding box
-        outside_bbox = ~in_bbox & df[lat_col].notna()
-        self.stats['outside_bounds'] = outside_bbox.sum()
+        # Count records outside Philadelphia (missing latitude is kept)
+        outside_philly = ~(self.philly_mask(lat, lon) | np.isnan(lat))
+        self.stats['outside_bounds'] = int(np.count_nonzero(outside_philly))
         
-        if outside_bbox.any():
-            self.logger.info(f"Found {outside_bbox.sum()} records outside Philadelphia bounding box")
-            df.loc[outside_bbox, 'COORD_QUALITY_FLAG'] = 'OUTSIDE_PHILLY'
+        if self.stats['outside_bounds']:
+            self.logger.info(f"Found {self.stats['outside_bounds']} records outside Philadelphia boundary")
         
-        # Keep only records inside Philadelphia
-        df_filtered = df[in_bbox | df[lat_col].isna()].copy()
+        # Keep only records inside Philadelphia. Boolean indexing already
+        # returns a new frame, so there's nothing to copy. The rows
+        # OUTSIDE_PHILLY would flag are exactly the ones dropped, so only the
+        # column is added
+        df_filtered = df[~outside_philly]
+        if self.stats['outside_bounds'] and 'COORD_QUALITY_FLAG' not in df_filtered.columns:
+            no_flags = np.zeros(len(df_filtered), dtype=bool)
+            df_filtered = df_filtered.assign(
+                COORD_QUALITY_FLAG=quality_flag(no_flags, 'OUTSIDE_PHILLY', COORD_FLAGS)
+            )
         
         self.stats['final_records'] = len(df_filtered)
         
@@ -202,6 +323,34 @@ class GeographicFilter:
         
         return df_filtered
     
+    def count_county_mismatches(self, df: pd.DataFrame, county_col: str = 'COUNTY') -> int:
+        """
+        Narrow the county column, log its distribution, count non-Philadelphia codes.
+        
+        Args:
+            df: Input dataframe (county column is replaced in place)
+            county_col: County code column name
+            
+        Returns:
+            Number of records not coded as Philadelphia (missing codes included)
+        """
+        # County codes fit in a byte: downcast numeric codes (harmonized data
+        # is usually narrow already), and store anything else as category
+        if pd.api.types.is_numeric_dtype(df[county_col]):
+            df[county_col] = pd.to_numeric(df[county_col], downcast='integer')
+        else:
+            df[county_col] = df[county_col].astype('category')
+        
+        # Philadelphia county code is 51
+        # York county code is 67
+        county_counts = df[county_col].value_counts()
+        
+        self.logger.info("County distribution:")
+        for county, count in county_counts.head(5).items():
+            self.logger.info(f"  County {county}: {count:,} records")
+        
+        return len(df) - int(county_counts.get(51, 0))
+    
     def check_county_coding(self, df: pd.DataFrame, 
                           county_col: str = 'COUNTY') -> pd.DataFrame:
         """
@@ -223,27 +372,94 @@ class GeographicFilter:
             self.logger.warning(f"County column not found: {county_col}")
             return df
         
-        # Philadelphia county code is 51
-        # York county code is 67
-        county_counts = df[county_col].value_counts()
+        # Flag non-Philadelphia counties. The counts already say how many
+        # there are, so the row mask is only built when something needs flagging
+        mismatches = self.count_county_mismatches(df, county_col)
+        if mismatches:
+            self.stats['county_mismatches'] = mismatches
+            self.logger.warning(f"Found {mismatches} records with non-Philadelphia county codes")
+            non_philly = (df[county_col] != 51).to_numpy()
+            df['COUNTY_QUALITY_FLAG'] = quality_flag(non_philly, 'NON_PHILLY_COUNTY', COUNTY_FLAGS)
         
-        self.logger.info("County distribution:")
-        for county, count in county_counts.head(5).items():
-            self.logger.info(f"  County {county}: {count:,} records")
+        return df
+    
+    def apply_geographic_checks(self, df: pd.DataFrame,
+                                lat_col: str = 'DEC_LATITUDE',
+                                lon_col: str = 'DEC_LONGITUDE',
+                                county_col: str = 'COUNTY') -> pd.DataFrame:
+        """
+        validate_coordinates, check_county_coding and filter_to_philadelphia in one pass.
+        
+        Reads the coordinates into float arrays once and derives every mask
+        and statistic from them, then drops the rows outside Philadelphia
+        before adding the rounded coordinates and flag columns, so nothing is
+        written for rows that are about to be discarded. Statistics and
+        output match running the three steps in sequence on the same frame.
+        
+        Args:
+            df: Input dataframe
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            county_col: County code column name
+            
+        Returns:
+            DataFrame filtered to Philadelphia, with quality flags
+        """
+        self.logger.info("Validating, county-checking and filtering coordinates")
+        
+        self.stats['total_records'] = len(df)
+        
+        if lat_col not in df.columns or lon_col not in df.columns:
+            self.logger.warning(f"Coordinate columns not found: {lat_col}, {lon_col}")
+            return df
+        
+        lat = pd.to_numeric(df[lat_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        lon = pd.to_numeric(df[lon_col], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        
+        missing, invalid = invalid_coordinate_mask(lat, lon)
+        outside = ~(self.philly_mask(lat, lon) | np.isnan(lat))
+        
+        self.stats['records_with_coords'] = len(df) - int(np.count_nonzero(missing))
+        self.stats['invalid_coords'] = int(np.count_nonzero(invalid))
+        self.stats['outside_bounds'] = int(np.count_nonzero(outside))
         
-        # Flag non-Philadelphia counties
-        non_philly = df[county_col] != 51
-        if non_philly.any():
-            self.stats['county_mismatches'] = non_philly.sum()
-            self.logger.warning(f"Found {non_philly.sum()} records with non-Philadelphia county codes")
-            df.loc[non_philly, 'COUNTY_QUALITY_FLAG'] = 'NON_PHILLY_COUNTY'
+        # County counts cover every record passed in, not just the kept ones,
+        # as when checked before filtering (rows pruned at read time are
+        # added by the caller from pruned_row_stats)
+        has_county = county_col in df.columns
+        if has_county:
+            self.stats['county_mismatches'] = self.count_county_mismatches(df, county_col)
+        
+        self.logger.info(f"  Invalid: {self.stats['invalid_coords']:,}")
+        self.logger.info(f"  Outside Philadelphia: {self.stats['outside_bounds']:,}")
+        self.logger.info(f"  Non-Philadelphia county: {self.stats['county_mismatches']:,}")
+        
+        keep = ~outside
+        df = df[keep]
+        
+        # Rounded coordinates and flags, for the kept rows only (flag
+        # columns exist whenever the sequential steps would have added them)
+        derived = {
+            lat_col: np.round(lat[keep], 6),
+            lon_col: np.round(lon[keep], 6)
+        }
+        if self.stats['invalid_coords'] or self.stats['outside_bounds']:
+            derived['COORD_QUALITY_FLAG'] = quality_flag(invalid[keep], 'INVALID', COORD_FLAGS)
+        if has_county and self.stats['county_mismatches']:
+            derived['COUNTY_QUALITY_FLAG'] = quality_flag(
+                (df[county_col] != 51).to_numpy(), 'NON_PHILLY_COUNTY', COUNTY_FLAGS
+            )
+        df = df.assign(**derived)
+        
+        self.stats['final_records'] = len(df)
+        self.logger.info(f"  Retained: {self.stats['final_records']:,}")
         
         return df
     
     def create_geodataframe(self, df: pd.DataFrame,
                            lat_col: str = 'DEC_LATITUDE',
                            lon_col: str = 'DEC_LONGITUDE',
-                           crs: str = 'EPSG:4326') -> gpd.GeoDataFrame:
+                           crs: str = 'EPSG:4326') -> 'gpd.GeoDataFrame':
         """
         Convert DataFrame to GeoDataFrame with Point geometries.
         
@@ -256,15 +472,20 @@ class GeographicFilter:
         Returns:
             GeoDataFrame
         """
+        import geopandas as gpd
+        
         self.logger.info(f"Creating GeoDataFrame with CRS: {crs}")
         
-        # Create geometry column
-        has_coords = df[lat_col].notna() & df[lon_col].notna()
+        # Build the GeometryArray straight from the coordinate arrays (no
+        # object array for GeoDataFrame to re-validate), then null the rows
+        # without coordinates, found from the same arrays
+        lat = df[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = df[lon_col].to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(lat)
+        missing |= np.isnan(lon)
         
-        geometry = [
-            Point(lon, lat) if has_coord else None
-            for lon, lat, has_coord in zip(df[lon_col], df[lat_col], has_coords)
-        ]
+        geometry = gpd.points_from_xy(lon, lat, crs=crs)
+        geometry[missing] = None
         
         gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=crs)
         
@@ -273,9 +494,140 @@ class GeographicFilter:
         
         return gdf
     
+    def bbox_filter(self, schema: pa.Schema,
+                    lat_col: str = 'DEC_LATITUDE',
+                    lon_col: str = 'DEC_LONGITUDE') -> Optional[ds.Expression]:
+        """
+        Dataset filter keeping rows inside the bounding box or missing a coordinate.
+        
+        Args:
+            schema: Schema of the file being read
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            
+        Returns:
+            Filter expression, or None when the coordinates aren't stored as
+            numbers (and so can't be compared at read time)
+        """
+        numeric_coords = all(
+            col in schema.names and (pa.types.is_floating(schema.field(col).type) or
+                                     pa.types.is_integer(schema.field(col).type))
+            for col in (lat_col, lon_col)
+        )
+        if not numeric_coords:
+            return None
+        
+        lat, lon = ds.field(lat_col), ds.field(lon_col)
+        in_bbox = (
+            (lat >= self.philly_bounds['lat_min']) & (lat <= self.philly_bounds['lat_max']) &
+            (lon >= self.philly_bounds['lon_min']) & (lon <= self.philly_bounds['lon_max'])
+        )
+        return in_bbox | lat.is_null() | lon.is_null()
+    
+    def read_within_bounds(self, input_file: Path,
+                           lat_col: str = 'DEC_LATITUDE',
+                           lon_col: str = 'DEC_LONGITUDE',
+                           columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, dict]:
+        """
+        Read a parquet file, skipping rows outside the Philadelphia bounding box.
+        
+        The bbox is pushed down to the Parquet reader, so row groups whose
+        min/max statistics lie entirely outside it are never decoded. Rows with
+        missing coordinates are kept, since they are flagged rather than dropped.
+        Falls back to a full read when the coordinates aren't stored as numbers.
+        
+        The pruned rows still count towards the statistics: their coordinate
+        and county columns are read separately by pruned_row_stats.
+        
+        Args:
+            input_file: Parquet file to read
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            columns: Columns to read (None: all). The coordinate and county
+                columns the geographic checks use are always included.
+            
+        Returns:
+            Tuple of (dataframe, pruned_row_stats of the rows skipped)
+        """
+        schema = pq.read_schema(input_file)
+        
+        # Project in file order; unselected column chunks are never decoded
+        if columns is not None:
+            wanted = set(columns) | {lat_col, lon_col, 'COUNTY'}
+            columns = [col for col in schema.names if col in wanted]
+        
+        row_filter = self.bbox_filter(schema, lat_col, lon_col)
+        if row_filter is None:
+            self.logger.info("Coordinates not numeric in parquet, reading all rows")
+            return pd.read_parquet(input_file, columns=columns), self.pruned_row_stats(input_file, None)
+        
+        df = pd.read_parquet(input_file, columns=columns, filters=row_filter)
+        
+        return df, self.pruned_row_stats(input_file, row_filter, lat_col, lon_col)
+    
+    def pruned_row_stats(self, input_file: Path, row_filter: Optional[ds.Expression],
+                         lat_col: str = 'DEC_LATITUDE',
+                         lon_col: str = 'DEC_LONGITUDE',
+                         county_col: str = 'COUNTY') -> dict:
+        """
+        Statistics for the rows a bbox filter skips at read time.
+        
+        Only the coordinate and county columns of the rows outside the filter
+        are read, so invalid coordinate and county counts still cover the
+        whole file, as when every row went through apply_geographic_checks.
+        
+        Args:
+            input_file: Parquet file being read
+            row_filter: Filter from bbox_filter (None: nothing was pruned)
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            county_col: County code column name
+            
+        Returns:
+            Dict with the number of pruned 'records' and, among them,
+            'invalid_coords' and 'county_mismatches'
+        """
+        stats = {'records': 0, 'invalid_coords': 0, 'county_mismatches': 0}
+        if row_filter is None:
+            return stats
+        
+        dataset = ds.dataset(input_file)
+        columns = [col for col in (lat_col, lon_col, county_col) if col in dataset.schema.names]
+        pruned = dataset.to_table(columns=columns, filter=~row_filter).to_pandas()
+        if pruned.empty:
+            return stats
+        
+        lat = pruned[lat_col].to_numpy(dtype='float64', na_value=np.nan)
+        lon = pruned[lon_col].to_numpy(dtype='float64', na_value=np.nan)
+        _, invalid = invalid_coordinate_mask(lat, lon)
+        
+        stats['records'] = len(pruned)
+        stats['invalid_coords'] = int(np.count_nonzero(invalid))
+        if county_col in pruned.columns:
+            # Same count as count_county_mismatches: missing codes included
+            stats['county_mismatches'] = len(pruned) - int((pruned[county_col] == 51).sum())
+        
+        self.logger.info(f"Skipped {stats['records']:,} records outside the bounding box at read time "
+                         f"({stats['invalid_coords']:,} invalid, "
+                         f"{stats['county_mismatches']:,} non-Philadelphia county)")
+        
+        return stats
+    
+    def add_pruned_stats(self, pruned: dict):
+        """Fold pruned_row_stats into the statistics of the rows that were read."""
+        # Rows pruned at read time all had coordinates outside the bbox
+        self.stats['pruned_at_read'] = pruned['records']
+        self.stats['total_records'] += pruned['records']
+        self.stats['records_with_coords'] += pruned['records']
+        self.stats['outside_bounds'] += pruned['records']
+        self.stats['invalid_coords'] += pruned['invalid_coords']
+        self.stats['county_mismatches'] += pruned['county_mismatches']
+    
     def process_category(self, category: str,
                         lat_col: str = 'DEC_LATITUDE',
-                        lon_col: str = 'DEC_LONGITUDE') -> Optional[pd.DataFrame]:
+                        lon_col: str = 'DEC_LONGITUDE',
+                        save_output: bool = True,
+                        columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
         """
         Process a single category through complete geographic workflow.
         
@@ -283,13 +635,16 @@ class GeographicFilter:
             category: PennDOT category name
             lat_col: Latitude column name
             lon_col: Longitude column name
+            save_output: If False, skip writing the intermediate
+                `<category>_geographic.parquet` (used when the result is
+                handed straight to weather integration)
+            columns: Only read these columns (plus coordinates and county)
+                from the harmonized file; None reads every column
             
         Returns:
             Processed dataframe or None
         """
-        self.logger.info("=" * 80)
-        self.logger.info(f"Processing category: {category}")
-        self.logger.info("=" * 80)
+        log_banner(f"Processing category: {category}")
         
         # Load harmonized data
         input_file = PROCESSED_DATA_DIR / f"{category.lower()}_harmonized.parquet"
@@ -300,7 +655,7 @@ class GeographicFilter:
             return None
         
         self.logger.info(f"Loading {input_file.name}")
-        df = pd.read_parquet(input_file)
+        df, pruned = self.read_within_bounds(input_file, lat_col, lon_col, columns)
         
         self.logger.info(f"Loaded {len(df):,} records")
         log_dataframe_info(df, f"Input {category}")
@@ -308,49 +663,128 @@ class GeographicFilter:
         # Reset stats
         self.stats = {k: 0 for k in self.stats}
         
-        # Apply geographic processing
-        df = self.validate_coordinates(df, lat_col, lon_col)
-        df = self.check_county_coding(df)
-        df = self.filter_to_philadelphia(df, lat_col, lon_col)
+        # Apply geographic processing (validation, county check and filter
+        # in one pass over the coordinates)
+        df = self.apply_geographic_checks(df, lat_col, lon_col)
+        self.add_pruned_stats(pruned)
         
         # Save processed data
+        if save_output:
+            output_file = PROCESSED_DATA_DIR / f"{category.lower()}_geographic.parquet"
+            
+            self.logger.info(f"Saving to {output_file.name}")
+            write_parquet(df, output_file)
+            
+            file_size = output_file.stat().st_size / (1024 * 1024)
+            self.logger.info(f"Saved {len(df):,} records ({file_size:.2f} MB)")
+        
+        self.save_stats(category)
+        
+        return df
+    
+    def stream_category(self, category: str,
+                        lat_col: str = 'DEC_LATITUDE',
+                        lon_col: str = 'DEC_LONGITUDE',
+                        batch_size: int = STREAM_BATCH_SIZE) -> Optional[int]:
+        """
+        Process a category batch by batch straight into `<category>_geographic.parquet`.
+        
+        Same checks, statistics and output rows as process_category, but
+        only one record batch is in memory at a time. Both flag columns are
+        always written (all-null when nothing was flagged) so every batch
+        has the same schema.
+        
+        Args:
+            category: PennDOT category name
+            lat_col: Latitude column name
+            lon_col: Longitude column name
+            batch_size: Rows per record batch
+            
+        Returns:
+            Number of records written, or None
+        """
+        log_banner(f"Streaming category: {category}")
+        
+        input_file = PROCESSED_DATA_DIR / f"{category.lower()}_harmonized.parquet"
         output_file = PROCESSED_DATA_DIR / f"{category.lower()}_geographic.parquet"
         
-        self.logger.info(f"Saving to {output_file.name}")
-        df.to_parquet(output_file, index=False, engine='pyarrow')
+        if not input_file.exists():
+            self.logger.error(f"Harmonized data not found: {input_file}")
+            self.logger.error("Run harmonization (stage 2) first!")
+            return None
+        
+        dataset = ds.dataset(input_file)
+        row_filter = self.bbox_filter(dataset.schema, lat_col, lon_col)
+        scanner = dataset.scanner(filter=row_filter, batch_size=batch_size)
+        
+        # Output schema: the input's, with numeric coordinates and the flags
+        output_schema = dataset.schema
+        for col in (lat_col, lon_col):
+            if col in output_schema.names:
+                output_schema = output_schema.set(output_schema.get_field_index(col), pa.field(col, pa.float64()))
+        for col in ('COORD_QUALITY_FLAG', 'COUNTY_QUALITY_FLAG'):
+            output_schema = output_schema.append(pa.field(col, pa.string()))
+        
+        totals = {k: 0 for k in self.stats}
+        with open_parquet_writer(output_file, output_schema) as writer:
+            for batch in scanner.to_batches():
+                if batch.num_rows == 0:
+                    continue
+                
+                self.stats = {k: 0 for k in self.stats}
+                df = self.apply_geographic_checks(batch.to_pandas(), lat_col, lon_col)
+                totals = {k: totals[k] + self.stats[k] for k in totals}
+                
+                # Cast back to the file's types (county is downcast per batch,
+                # all-null flags come through untyped)
+                df = df.reindex(columns=output_schema.names)
+                table = pa.Table.from_pandas(df, preserve_index=False).cast(output_schema)
+                writer.write_table(table, row_group_size=PARQUET_ROW_GROUP_SIZE)
+        
+        self.stats = totals
+        self.add_pruned_stats(self.pruned_row_stats(input_file, row_filter, lat_col, lon_col))
         
         file_size = output_file.stat().st_size / (1024 * 1024)
-        self.logger.info(f"Saved {len(df):,} records ({file_size:.2f} MB)")
+        self.logger.info(f"Saved {self.stats['final_records']:,} records to {output_file.name} ({file_size:.2f} MB)")
         
-        # Save statistics
+        self.save_stats(category)
+        
+        return self.stats['final_records']
+    
+    def save_stats(self, category: str):
+        """Write the current statistics to `<category>_geographic_stats.json`."""
         stats_file = METADATA_DIR / f"{category.lower()}_geographic_stats.json"
         import json
         # Convert numpy types to Python types for JSON serialization
         stats_json = {k: int(v) if hasattr(v, 'item') else v for k, v in self.stats.items()}
         with open(stats_file, 'w') as f:
             json.dump(stats_json, f, indent=2)
-        
-        return df
 
 
+@cached_stage(
+    "geographic_filter",
+    inputs_fn=lambda: [PROCESSED_DATA_DIR / "crash_harmonized.parquet"] + (
+        [Path(PHILLY_BOUNDARY_FILE)] if PHILLY_BOUNDARY_FILE else []
+    ),
+    outputs_fn=lambda: [PROCESSED_DATA_DIR / "crash_geographic.parquet"],
+    sources=[write_parquet],
+    config_keys=['PHILLY_BOUNDS', 'PHILLY_BOUNDARY_FILE', 'CRS_WGS84']
+)
 def main():
     """Main execution function."""
-    logger.info("=" * 80)
-    logger.info("GEOGRAPHIC FILTERING SCRIPT")
-    logger.info("=" * 80)
+    log_banner("GEOGRAPHIC FILTERING SCRIPT")
     
     # Only process CRASH category (has geographic data)
     # Other categories (PERSON, VEHICLE, etc.) join to CRASH via CRN
     category = "CRASH"
     
+    # Nothing downstream needs the frame in memory here, so stream it
     geo_filter = GeographicFilter()
-    df = geo_filter.process_category(category)
+    records = geo_filter.stream_category(category)
     
-    if df is not None:
-        logger.info("=" * 80)
-        logger.info("GEOGRAPHIC FILTERING COMPLETE")
-        logger.info("=" * 80)
-        logger.info(f"Final dataset: {len(df):,} records")
+    if records is not None:
+        log_banner("GEOGRAPHIC FILTERING COMPLETE")
+        logger.info(f"Final dataset: {records:,} records")
     else:
         logger.error("Geographic filtering failed!")
         return 1
@@ -0,0 +1,106 @@
+"""
+Crash Integration Script
+
+Runs geographic filtering and weather integration as a single pass over the
+harmonized crash data. The geographic-filtered frame is handed straight to the
+weather merge in memory, so the intermediate `crash_geographic.parquet` is not
+written and read back.
+
+Author: FDC Project
+Date: 2025-10-26
+"""
+
+import sys
+from pathlib import Path
+import pandas as pd
+from typing import Optional, Tuple
+
+# Add parent directory (scripts) and this directory (sibling stages) to path
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).parent))
+
+from config import (
+    RAW_DATA_DIR,
+    PROCESSED_DATA_DIR,
+    PHILLY_BOUNDARY_FILE
+)
+from utils.logging_utils import setup_logger, log_banner
+from utils.cache import cached_stage
+from geographic_filter import GeographicFilter
+from merge_weather import WeatherCrashIntegrator
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+
+def run_integration(category: str = "CRASH",
+                    save_geographic: bool = False) -> Tuple[Optional[pd.DataFrame], dict]:
+    """
+    Geographic filtering followed by weather integration, without a disk round-trip.
+
+    Args:
+        category: Category to process (only CRASH has coordinates and dates)
+        save_geographic: Also write the intermediate `<category>_geographic.parquet`
+
+    Returns:
+        Tuple of (weather-integrated dataframe or None, stats dict with
+        'geographic' and 'weather' entries)
+    """
+    geo_filter = GeographicFilter()
+    geo_df = geo_filter.process_category(category, save_output=save_geographic)
+
+    # Convert numpy types to Python types so stats stay JSON/XCom serializable
+    to_python = lambda d: {k: int(v) if hasattr(v, 'item') else v for k, v in d.items()}
+    stats = {'geographic': to_python(geo_filter.stats), 'weather': {}}
+
+    if geo_df is None:
+        logger.error("Geographic filtering failed!")
+        return None, stats
+
+    integrator = WeatherCrashIntegrator()
+    df = integrator.process_crash_category(category, df=geo_df)
+    stats['weather'] = to_python(integrator.stats)
+
+    return df, stats
+
+
+@cached_stage(
+    "integrate",
+    inputs_fn=lambda: [
+        PROCESSED_DATA_DIR / "crash_harmonized.parquet",
+        RAW_DATA_DIR / "noaa_weather_philly.parquet"
+    ] + ([Path(PHILLY_BOUNDARY_FILE)] if PHILLY_BOUNDARY_FILE else []),
+    outputs_fn=lambda: [PROCESSED_DATA_DIR / "crash_weather_integrated.parquet"],
+    sources=[GeographicFilter, WeatherCrashIntegrator],
+    config_keys=['PHILLY_BOUNDS', 'PHILLY_BOUNDARY_FILE', 'CRS_WGS84', 'WEATHER_MATCH_TOLERANCE_DAYS']
+)
+def main() -> dict:
+    """
+    Main execution function.
+
+    The run's statistics are the return value, so the stage cache records
+    them and hands them back when the inputs are unchanged; callers that
+    report them (the pipeline runner, the DAG) go through here rather than
+    run_integration to get that skip.
+
+    Returns:
+        Dict with 'status' ('success' or 'failed'), the number of 'records'
+        written, and 'geographic' and 'weather' stats
+    """
+    log_banner("CRASH INTEGRATION (GEOGRAPHIC + WEATHER)")
+
+    df, stats = run_integration("CRASH")
+
+    if df is None:
+        logger.error("Crash integration failed!")
+        return {'status': 'failed', 'records': 0, **stats}
+
+    log_banner("CRASH INTEGRATION COMPLETE")
+    logger.info(f"Final dataset: {len(df):,} records")
+    logger.info(f"Weather-matched: {stats['weather']['crashes_matched']:,}")
+
+    return {'status': 'success', 'records': len(df), **stats}
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main()['status'] == 'success' else 1)
@@ -10,9 +10,9 @@ Date: 2025-10-26
 
 import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
-from typing import Optional
-from datetime import datetime, timedelta
+from typing import List, Optional
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
@@ -20,13 +20,135 @@ sys.path.append(str(Path(__file__).parent.parent))
 from config import (
     RAW_DATA_DIR,
     PROCESSED_DATA_DIR,
-    METADATA_DIR
+    METADATA_DIR,
+    WEATHER_MATCH_TOLERANCE_DAYS
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
+from utils.io_utils import write_parquet
+from utils.cache import cached_stage
 
 # Initialize logger
 logger = setup_logger(__name__)
 
+# Years representable as datetime64[ns]
+MIN_YEAR, MAX_YEAR = 1678, 2261
+
+
+def dates_from_parts(year: pd.Series, month: pd.Series, day) -> pd.Series:
+    """
+    Build dates from year/month/day columns with integer date arithmetic.
+    
+    Equivalent to pd.to_datetime on a year/month/day frame with
+    errors='coerce', without assembling and validating each row: the month
+    is counted from the epoch as datetime64[M], the day added as
+    datetime64[D], and rows whose day ran past the month end (Feb 30, ...)
+    or with missing/non-integer/out-of-range parts become NaT.
+    
+    Args:
+        year: Year values (numeric or numeric strings)
+        month: Month values
+        day: Day values, or a scalar day for every row
+        
+    Returns:
+        datetime64[ns] Series aligned with year
+    """
+    as_float = lambda s: pd.to_numeric(s, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    y, m = as_float(year), as_float(month)
+    d = as_float(day) if isinstance(day, pd.Series) else np.full(len(y), float(day))
+    
+    # NaN fails every comparison, so missing parts are invalid too
+    valid = np.ones(len(y), dtype=bool)
+    for part, low, high in ((y, MIN_YEAR, MAX_YEAR), (m, 1, 12), (d, 1, 31)):
+        valid &= (part >= low) & (part <= high) & (part == np.floor(part))
+    
+    # Placeholder parts for invalid rows keep the arithmetic in range
+    y, m, d = (np.where(valid, part, 1).astype('int64') for part in (y, m, d))
+    
+    month_start = ((y - 1970) * 12 + (m - 1)).astype('datetime64[M]')
+    dates = month_start.astype('datetime64[D]') + (d - 1)
+    valid &= dates.astype('datetime64[M]') == month_start
+    
+    dates = dates.astype('datetime64[ns]')
+    dates[~valid] = np.datetime64('NaT')
+    return pd.Series(dates, index=year.index)
+
+
+# Derived 0/1 weather flags (crashes without weather get 0)
+WEATHER_FLAGS = ['adverse_weather', 'extreme_temp']
+
+# Right-closed bin edges and labels for the derived weather categories
+PRECIP_EDGES, PRECIP_LABELS = [0.1, 2.5, 10], ['none', 'light', 'moderate', 'heavy']
+TEMP_EDGES, TEMP_LABELS = [0, 10, 20, 30], ['cold', 'cool', 'mild', 'warm', 'hot']
+
+
+def bin_values(values: pd.Series, edges: list, labels: list) -> pd.Categorical:
+    """
+    Bucket values into ordered categories, like pd.cut with open outer bins.
+    
+    Bins are right-closed, so searchsorted(side='left') on the inner edges
+    gives each value's bin code directly; missing values get code -1.
+    
+    Args:
+        values: Numeric values
+        edges: Sorted inner bin edges (len(labels) - 1 of them)
+        labels: Category labels, lowest bin first
+        
+    Returns:
+        Ordered Categorical aligned with values
+    """
+    x = values.to_numpy(dtype='float64', na_value=np.nan)
+    codes = np.searchsorted(np.asarray(edges, dtype='float64'), x, side='left').astype(np.int8)
+    codes[np.isnan(x)] = -1
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+def weather_rows_for_days(weather_days: np.ndarray, crash_days: np.ndarray,
+                          tolerance_days: int = 0) -> np.ndarray:
+    """
+    Position of each crash day's row in the weather table, by direct indexing.
+    
+    Weather covers a bounded run of days, so a dense day -> row slot array
+    over that span turns the join into two array gathers (no hashing).
+    With a tolerance, days without weather are filled from the nearest day
+    that has it (earlier day on ties), like merge_asof(direction='nearest'),
+    without sorting the crashes.
+    
+    Args:
+        weather_days: Unique weather dates (datetime64)
+        crash_days: Crash dates (datetime64, NaT allowed)
+        tolerance_days: How many days away a match may be
+        
+    Returns:
+        int64 array of weather row positions, -1 where there is no weather
+    """
+    rows = np.full(len(crash_days), -1, dtype=np.int64)
+    if len(weather_days) == 0:
+        return rows
+    
+    weather_num = weather_days.astype('datetime64[D]').astype(np.int64)
+    first = weather_num.min() - tolerance_days
+    slots = np.full(weather_num.max() + tolerance_days - first + 1, -1, dtype=np.int64)
+    slots[weather_num - first] = np.arange(len(weather_num))
+    
+    # Fill empty slots outward from the exact ones, nearest distance first
+    exact = slots.copy()
+    for distance in range(1, tolerance_days + 1):
+        for shift in (distance, -distance):
+            empty = np.flatnonzero(slots == -1)
+            source = empty - shift
+            in_range = (source >= 0) & (source < len(slots))
+            slots[empty[in_range]] = exact[source[in_range]]
+    
+    crash_num = crash_days.astype('datetime64[D]')
+    known = ~np.isnat(crash_num)
+    offset = crash_num[known].astype(np.int64) - first
+    in_span = (offset >= 0) & (offset < len(slots))
+    
+    found = np.full(len(offset), -1, dtype=np.int64)
+    found[in_span] = slots[offset[in_span]]
+    rows[known] = found
+    return rows
+
 
 class WeatherCrashIntegrator:
     """
@@ -47,12 +169,15 @@ class WeatherCrashIntegrator:
         
         self.logger.info("WeatherCrashIntegrator initialized")
     
-    def load_weather_data(self) -> pd.DataFrame:
+    def load_weather_data(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Load NOAA weather data.
         
+        Args:
+            columns: Weather columns to read besides 'date' (None: all)
+        
         Returns:
-            Weather dataframe
+            Weather dataframe, with derived weather features
         """
         weather_file = RAW_DATA_DIR / "noaa_weather_philly.parquet"
         
@@ -62,7 +187,7 @@ class WeatherCrashIntegrator:
             raise FileNotFoundError(f"Weather data required: {weather_file}")
         
         self.logger.info(f"Loading weather data from {weather_file.name}")
-        df = pd.read_parquet(weather_file)
+        df = pd.read_parquet(weather_file, columns=None if columns is None else ['date', *columns])
         
         # Ensure date column is datetime
         df['date'] = pd.to_datetime(df['date'])
@@ -70,6 +195,10 @@ class WeatherCrashIntegrator:
         # Sort by date
         df = df.sort_values('date').reset_index(drop=True)
         
+        # Derived features depend only on the day's weather, so compute them
+        # once per day here and let the merge carry them to each crash
+        df = self.add_weather_derived_features(df)
+        
         self.logger.info(f"Loaded weather data: {len(df)} days")
         self.logger.info(f"Date range: {df['date'].min()} to {df['date'].max()}")
         log_dataframe_info(df, "Weather data")
@@ -106,46 +235,25 @@ class WeatherCrashIntegrator:
         if 'CRASH_DAY' in df.columns and df['CRASH_DAY'].notna().any():
             # Best case: we have the actual day
             self.logger.info("Using CRASH_DAY for precise date matching")
-            df['crash_date'] = pd.to_datetime(
-                df[['CRASH_YEAR', 'CRASH_MONTH', 'CRASH_DAY']].rename(
-                    columns={'CRASH_YEAR': 'year', 'CRASH_MONTH': 'month', 'CRASH_DAY': 'day'}
-                ),
-                errors='coerce'
-            )
+            df['crash_date'] = dates_from_parts(df['CRASH_YEAR'], df['CRASH_MONTH'], df['CRASH_DAY'])
             df['date_approximation_method'] = 'exact_day'
             
         elif 'DAY_OF_WEEK' in df.columns:
             # Good case: use day of week to find representative day in month
             self.logger.info("Reconstructing dates using DAY_OF_WEEK (finding first occurrence in month)")
             
-            def find_weekday_in_month(row):
-                """Find first occurrence of given weekday in the crash month."""
-                try:
-                    year = int(row['CRASH_YEAR'])
-                    month = int(row['CRASH_MONTH'])
-                    dow = row['DAY_OF_WEEK']
-                    
-                    # Map PennDOT day codes to Python weekday (0=Monday, 6=Sunday)
-                    # PennDOT: 1=Sunday, 2=Monday, ..., 7=Saturday
-                    if pd.isna(dow):
-                        return None
-                    
-                    dow = int(dow)
-                    # Convert PennDOT (1=Sun) to Python (0=Mon, 6=Sun)
-                    python_weekday = (dow - 2) % 7  # 1->6, 2->0, 3->1, ..., 7->5
-                    
-                    # Start from first day of month
-                    first_day = datetime(year, month, 1)
-                    
-                    # Find first occurrence of this weekday
-                    days_ahead = (python_weekday - first_day.weekday()) % 7
-                    target_date = first_day + timedelta(days=days_ahead)
-                    
-                    return target_date
-                except (ValueError, TypeError):
-                    return None
+            # Vectorized: first day of the crash month, then step forward to
+            # the first occurrence of the crash weekday. Unparseable values
+            # become NaT and fall through to the mid-month fallback below.
+            dow = np.floor(pd.to_numeric(df['DAY_OF_WEEK'], errors='coerce'))
+            first_day = dates_from_parts(df['CRASH_YEAR'], df['CRASH_MONTH'], 1)
             
-            df['crash_date'] = df.apply(find_weekday_in_month, axis=1)
+            # Map PennDOT day codes (1=Sunday, ..., 7=Saturday) to Python
+            # weekday (0=Monday, 6=Sunday): 1->6, 2->0, 3->1, ..., 7->5
+            python_weekday = (dow - 2) % 7
+            days_ahead = (python_weekday - first_day.dt.weekday) % 7
+            
+            df['crash_date'] = first_day + pd.to_timedelta(days_ahead, unit='D')
             df['date_approximation_method'] = 'weekday_reconstructed'
             
             # For any that failed, fall back to mid-month
@@ -153,25 +261,27 @@ class WeatherCrashIntegrator:
             if failed_mask.any():
                 self.logger.warning(f"{failed_mask.sum()} crashes missing DAY_OF_WEEK, using mid-month (15th)")
                 df.loc[failed_mask, 'CRASH_DAY'] = 15
-                df.loc[failed_mask, 'crash_date'] = pd.to_datetime(
-                    df.loc[failed_mask, ['CRASH_YEAR', 'CRASH_MONTH', 'CRASH_DAY']].rename(
-                        columns={'CRASH_YEAR': 'year', 'CRASH_MONTH': 'month', 'CRASH_DAY': 'day'}
-                    ),
-                    errors='coerce'
+                df.loc[failed_mask, 'crash_date'] = dates_from_parts(
+                    df.loc[failed_mask, 'CRASH_YEAR'], df.loc[failed_mask, 'CRASH_MONTH'], 15
                 )
                 df.loc[failed_mask, 'date_approximation_method'] = 'mid_month_fallback'
         else:
             # Fallback: use mid-month as more representative than 1st
             self.logger.warning("No DAY_OF_WEEK or CRASH_DAY, using mid-month (15th)")
             df['CRASH_DAY'] = 15
-            df['crash_date'] = pd.to_datetime(
-                df[['CRASH_YEAR', 'CRASH_MONTH', 'CRASH_DAY']].rename(
-                    columns={'CRASH_YEAR': 'year', 'CRASH_MONTH': 'month', 'CRASH_DAY': 'day'}
-                ),
-                errors='coerce'
-            )
+            df['crash_date'] = dates_from_parts(df['CRASH_YEAR'], df['CRASH_MONTH'], 15)
             df['date_approximation_method'] = 'mid_month_only'
         
+        # Typed datetime64 so Parquet stores a timestamp and readers never
+        # have to parse strings
+        if not pd.api.types.is_datetime64_any_dtype(df['crash_date']):
+            df['crash_date'] = pd.to_datetime(df['crash_date'], errors='coerce')
+        
+        # Few distinct values: store as categorical so Parquet writes it
+        # dictionary-encoded and readers count it by integer code
+        if 'date_approximation_method' in df.columns:
+            df['date_approximation_method'] = df['date_approximation_method'].astype('category')
+        
         self.stats['total_crashes'] = len(df)
         self.stats['crashes_with_dates'] = df['crash_date'].notna().sum()
         
@@ -208,26 +318,34 @@ class WeatherCrashIntegrator:
         if 'crash_date' not in crash_df.columns:
             crash_df = self.prepare_crash_dates(crash_df)
         
-        # Extract just the date part (no time)
-        crash_df['crash_date_only'] = crash_df['crash_date'].dt.date
-        weather_date_only = self.weather_df['date'].dt.date
-        
-        # Create temporary column for merge
-        weather_merge = self.weather_df.copy()
-        weather_merge['crash_date_only'] = weather_date_only
-        
-        # Merge on date
+        # Day-resolution join keys. normalize() keeps them as datetime64
+        # (int64 under the hood) rather than Python date objects.
+        crash_days = pd.to_datetime(crash_df['crash_date']).dt.normalize()
+        
+        # Weather has one row per day, so the left join is a lookup: index
+        # weather by day and gather one row per crash (NaN for missing days)
+        weather_by_day = (
+            self.weather_df
+            .assign(date=self.weather_df['date'].dt.normalize())
+            .drop_duplicates('date')
+            .set_index('date')
+        )
         initial_count = len(crash_df)
         
-        merged = crash_df.merge(
-            weather_merge.drop('date', axis=1),
-            on='crash_date_only',
-            how='left',
-            suffixes=('', '_weather')
+        rows = weather_rows_for_days(
+            weather_by_day.index.to_numpy(), crash_days.to_numpy(), WEATHER_MATCH_TOLERANCE_DAYS
         )
+        matched = weather_by_day.reset_index(drop=True).reindex(rows)
+        matched.index = crash_df.index
+        matched = matched.rename(columns={
+            col: f"{col}_weather" for col in matched.columns.intersection(crash_df.columns)
+        })
         
-        # Clean up temporary column
-        merged = merged.drop('crash_date_only', axis=1)
+        merged = pd.concat([crash_df, matched], axis=1).reset_index(drop=True)
+        
+        # Flags were 0 (not NaN) for crashes without weather
+        for col in matched.columns.intersection(WEATHER_FLAGS):
+            merged[col] = merged[col].fillna(0).astype(int)
         
         # Count matches
         self.stats['crashes_matched'] = merged['temp_avg_c'].notna().sum()
@@ -258,80 +376,76 @@ class WeatherCrashIntegrator:
         """
         self.logger.info("Adding derived weather features")
         
+        as_float = lambda col: df[col].to_numpy(dtype='float64', na_value=np.nan)
+        
         if 'precipitation_mm' in df.columns:
             # Precipitation categories
-            df['precip_category'] = pd.cut(
-                df['precipitation_mm'],
-                bins=[-float('inf'), 0.1, 2.5, 10, float('inf')],
-                labels=['none', 'light', 'moderate', 'heavy']
-            )
+            df['precip_category'] = bin_values(df['precipitation_mm'], PRECIP_EDGES, PRECIP_LABELS)
             
-            # Binary adverse weather flag
-            df['adverse_weather'] = (
-                (df['precipitation_mm'] > 2.5) |  # Moderate+ precipitation
-                (df['wind_speed_max_ms'] > 15) |  # High winds (>30 mph)
-                (df['snowfall_mm'] > 0)            # Any snow
-            ).astype(int)
+            # Binary adverse weather flag (NaN compares False)
+            adverse = as_float('precipitation_mm') > 2.5   # Moderate+ precipitation
+            adverse |= as_float('wind_speed_max_ms') > 15  # High winds (>30 mph)
+            adverse |= as_float('snowfall_mm') > 0         # Any snow
+            df['adverse_weather'] = adverse.astype(int)
         
         if 'temp_avg_c' in df.columns:
             # Temperature categories (Celsius)
-            df['temp_category'] = pd.cut(
-                df['temp_avg_c'],
-                bins=[-float('inf'), 0, 10, 20, 30, float('inf')],
-                labels=['cold', 'cool', 'mild', 'warm', 'hot']
-            )
+            df['temp_category'] = bin_values(df['temp_avg_c'], TEMP_EDGES, TEMP_LABELS)
             
             # Extreme temperature flag
-            df['extreme_temp'] = (
-                (df['temp_avg_c'] < -5) |   # Very cold
-                (df['temp_avg_c'] > 35)      # Very hot
-            ).astype(int)
+            temp = as_float('temp_avg_c')
+            df['extreme_temp'] = ((temp < -5) | (temp > 35)).astype(int)  # Very cold / very hot
         
         self.logger.info("Derived features created")
         
         return df
     
-    def process_crash_category(self, category: str = "CRASH") -> Optional[pd.DataFrame]:
+    def process_crash_category(self, category: str = "CRASH",
+                               df: Optional[pd.DataFrame] = None,
+                               weather_columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
         """
         Process crash data with weather integration.
         
         Args:
             category: Category to process (typically CRASH)
+            df: Geographic-filtered crash data already in memory. If None,
+                it is loaded from `<category>_geographic.parquet`.
+            weather_columns: Weather columns to join (None: all)
             
         Returns:
             Merged dataframe or None
         """
-        self.logger.info("=" * 80)
-        self.logger.info(f"Processing {category} with weather integration")
-        self.logger.info("=" * 80)
-        
-        # Load geographic-filtered crash data
-        input_file = PROCESSED_DATA_DIR / f"{category.lower()}_geographic.parquet"
-        
-        if not input_file.exists():
-            self.logger.error(f"Geographic data not found: {input_file}")
-            self.logger.error("Run geographic filtering first!")
-            return None
-        
-        self.logger.info(f"Loading {input_file.name}")
-        df = pd.read_parquet(input_file)
+        log_banner(f"Processing {category} with weather integration")
         
-        self.logger.info(f"Loaded {len(df):,} records")
-        log_dataframe_info(df, f"Input {category}")
+        if df is None:
+            # Load geographic-filtered crash data
+            input_file = PROCESSED_DATA_DIR / f"{category.lower()}_geographic.parquet"
+            
+            if not input_file.exists():
+                self.logger.error(f"Geographic data not found: {input_file}")
+                self.logger.error("Run geographic filtering first!")
+                return None
+            
+            self.logger.info(f"Loading {input_file.name}")
+            df = pd.read_parquet(input_file)
+            
+            self.logger.info(f"Loaded {len(df):,} records")
+            log_dataframe_info(df, f"Input {category}")
+        else:
+            self.logger.info(f"Using {len(df):,} geographic-filtered records from memory")
         
         # Load weather data
-        self.load_weather_data()
+        self.load_weather_data(weather_columns)
         
         # Prepare dates and merge
         df = self.prepare_crash_dates(df)
         df = self.merge_weather(df)
-        df = self.add_weather_derived_features(df)
         
         # Save integrated data
         output_file = PROCESSED_DATA_DIR / f"{category.lower()}_weather_integrated.parquet"
         
         self.logger.info(f"Saving to {output_file.name}")
-        df.to_parquet(output_file, index=False, engine='pyarrow')
+        write_parquet(df, output_file)
         
         file_size = output_file.stat().st_size / (1024 * 1024)
         self.logger.info(f"Saved {len(df):,} records ({file_size:.2f} MB)")
@@ -347,19 +461,25 @@ class WeatherCrashIntegrator:
         return df
 
 
+@cached_stage(
+    "merge_weather",
+    inputs_fn=lambda: [
+        PROCESSED_DATA_DIR / "crash_geographic.parquet",
+        RAW_DATA_DIR / "noaa_weather_philly.parquet"
+    ],
+    outputs_fn=lambda: [PROCESSED_DATA_DIR / "crash_weather_integrated.parquet"],
+    sources=[write_parquet],
+    config_keys=['WEATHER_MATCH_TOLERANCE_DAYS']
+)
 def main():
     """Main execution function."""
-    logger.info("=" * 80)
-    logger.info("WEATHER-CRASH INTEGRATION SCRIPT")
-    logger.info("=" * 80)
+    log_banner("WEATHER-CRASH INTEGRATION SCRIPT")
     
     integrator = WeatherCrashIntegrator()
     df = integrator.process_crash_category("CRASH")
     
     if df is not None:
-        logger.info("=" * 80)
-        logger.info("WEATHER INTEGRATION COMPLETE")
-        logger.info("=" * 80)
+        log_banner("WEATHER INTEGRATION COMPLETE")
         logger.info(f"Final dataset: {len(df):,} records")
         logger.info(f"Weather-matched: {integrator.stats['crashes_matched']:,}")
     else:
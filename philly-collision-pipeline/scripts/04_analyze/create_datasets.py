@@ -20,9 +20,17 @@ Date: 2025-10-26
 
 import sys
 from pathlib import Path
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from typing import Optional, List, Dict
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
@@ -30,23 +38,130 @@ sys.path.append(str(Path(__file__).parent.parent))
 from config import (
     PROCESSED_DATA_DIR,
     FINAL_DATA_DIR,
-    PENNDOT_CATEGORIES
+    PENNDOT_CATEGORIES,
+    DATASET_WORKERS
 )
-from utils.logging_utils import setup_logger, log_dataframe_info
+from utils.logging_utils import setup_logger, log_dataframe_info, log_banner
+from utils.io_utils import write_parquet, read_parquet
+from utils.cache import cached_stage
 
 # Initialize logger
 logger = setup_logger(__name__)
 
+# VEHICLE columns the per-crash vehicle summaries are built from
+VEHICLE_SUMMARY_COLUMNS = ['CRN', 'VEH_TYPE', 'VEH_ROLE_CD']
+
+# CRASH columns counting pedestrians involved, in order of preference
+PEDESTRIAN_COUNT_COLS = ('PED_COUNT', 'PEDESTRIAN_COUNT', 'TOT_PED_COUNT')
+
+# Categories with multiple records per CRN: saved as their own tables
+SEPARATE_TABLES = ['PERSON', 'VEHICLE']
+
+# Categories with (typically) one record per CRN: joined to the full dataset
+JOINED_CATEGORIES = ['ROADWAY']
+
+# Rows per record batch when copying a saved dataset to CSV
+CSV_BATCH_SIZE = 100_000
+
+
+def semi_join(right: pd.DataFrame, keys, key: str = 'CRN') -> pd.DataFrame:
+    """
+    Rows of right whose key is one of keys.
+    
+    Given the left table's unique keys, exactly the rows a left join can
+    use, so filtering first shrinks the join (and anything computed on
+    right before it) without changing its result.
+    
+    Args:
+        right: Table about to be joined
+        keys: Unique key values of the table it is joined onto
+        key: Join key column
+        
+    Returns:
+        Filtered right
+    """
+    return right[right[key].isin(keys)]
+
+
+def map_join(left: pd.DataFrame, right: pd.DataFrame, suffix: str, key: str = 'CRN') -> pd.DataFrame:
+    """
+    Left join of a table with one row per key, as a Series.map per column.
+    
+    Same result as left.merge(right, on=key, how='left', suffixes=('', suffix)),
+    without building the merge's join indexers for every left row.
+    
+    Args:
+        left: Table to add columns to
+        right: Table with unique key values
+        suffix: Appended to right column names that already exist in left
+        key: Join key column
+        
+    Returns:
+        left with right's columns added
+    """
+    right = right.set_index(key)
+    return left.assign(**{
+        (f"{col}{suffix}" if col in left.columns else col): left[key].map(right[col])
+        for col in right.columns
+    })
+
+
+def summarize_by_crn(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    """
+    One row per CRN: the distinct values of each column, comma-joined.
+    
+    Values are de-duplicated for the whole frame at once, stably sorted so
+    each CRN's values are contiguous, and joined by Arrow's binary_join over
+    a list array built from the group offsets - no Python call per group.
+    Values keep their first-seen order; CRNs with no values in a column get
+    an empty string. The joined columns repeat a
+    few combinations many times, so they are returned as 'category', like
+    the code columns they are built from.
+    
+    Args:
+        df: Dataframe with a CRN column
+        columns: Columns to summarize
+        
+    Returns:
+        Dataframe with CRN and one joined column per input column
+    """
+    crns = pd.Index(df['CRN'].dropna().unique(), name='CRN')
+    
+    summary = {}
+    for col in columns:
+        values = df[['CRN', col]].dropna()
+        values = values.assign(**{col: values[col].astype(str)}).drop_duplicates()
+        values = values.sort_values('CRN', kind='stable')
+        
+        keys = values['CRN'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        offsets = pa.array(np.append(starts, len(keys)), type=pa.int32())
+        groups = pa.ListArray.from_arrays(offsets, pa.array(values[col].to_numpy(), type=pa.string()))
+        joined = pd.Series(pc.binary_join(groups, ', ').to_numpy(zero_copy_only=False), index=keys[starts])
+        
+        summary[col] = joined.reindex(crns, fill_value='').astype('category')
+    
+    return pd.DataFrame(summary, index=crns).reset_index()
+
 
 class DatasetCreator:
     """
     Creates analysis-ready datasets by joining PennDOT categories.
     """
     
-    def __init__(self):
-        """Initialize dataset creator."""
+    def __init__(self, save_csv: bool = False):
+        """
+        Initialize dataset creator.
+        
+        Args:
+            save_csv: Also write a CSV copy of every dataset (Parquet is
+                always written; use export_csv.py to convert later instead)
+        """
         self.logger = logger
-        self.data = {}  # Will hold loaded dataframes
+        self.save_csv = save_csv
+        self.data = {}  # Loaded dataframes, by name (or (name, columns) for projected reads)
+        self._ped_col = None  # Resolved pedestrian count column
+        self.crash_crns = None  # Unique CRNs of the loaded CRASH data
         
         self.stats = {
             'crash_records': 0,
@@ -58,13 +173,24 @@ class DatasetCreator:
         
         self.logger.info("DatasetCreator initialized")
     
-    def load_weather_integrated_crash(self) -> pd.DataFrame:
+    def load_weather_integrated_crash(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Load the weather-integrated CRASH data.
         
+        The file is read once; later calls return the loaded dataframe.
+        
+        Args:
+            columns: Columns to read (None: all)
+        
         Returns:
             Weather-integrated crash dataframe
         """
+        key = 'crash' if columns is None else ('crash', tuple(columns))
+        if key in self.data:
+            return self.data[key]
+        if columns is not None and 'crash' in self.data:
+            return self.data['crash'][columns]
+        
         crash_file = PROCESSED_DATA_DIR / "crash_weather_integrated.parquet"
         
         if not crash_file.exists():
@@ -73,25 +199,48 @@ class DatasetCreator:
             raise FileNotFoundError(f"Required file: {crash_file}")
         
         self.logger.info(f"Loading {crash_file.name}")
-        df = pd.read_parquet(crash_file)
+        df = read_parquet(crash_file, columns=columns)
         
         self.stats['crash_records'] = len(df)
         self.logger.info(f"Loaded {len(df):,} crash records")
         log_dataframe_info(df, "Weather-integrated CRASH")
         
-        self.data['crash'] = df
+        # Every dataset joins onto these crashes; computed once for filtering
+        if self.crash_crns is None and 'CRN' in df.columns:
+            self.crash_crns = pd.Index(df['CRN'].dropna().unique(), name='CRN')
+        
+        self.data[key] = df
         return df
     
-    def load_harmonized_category(self, category: str) -> Optional[pd.DataFrame]:
+    def load_harmonized_category(self, category: str,
+                                 columns: Optional[List[str]] = None,
+                                 crns: Optional[pd.Index] = None) -> Optional[pd.DataFrame]:
         """
         Load harmonized data for a category.
         
+        Each category (or column projection of it) is read once; later calls
+        return the loaded dataframe. A projection of a category that is
+        already fully loaded is served from memory.
+        
         Args:
             category: PennDOT category name
+            columns: Columns to read (None: all). Only the selected column
+                chunks are decoded.
+            crns: Only read records with these CRNs. The filter is applied
+                while reading, and such reads are not cached (the next
+                caller may need other CRNs).
             
         Returns:
             Dataframe or None if not found
         """
+        name = category.lower()
+        key = name if columns is None else (name, tuple(columns))
+        if key in self.data:
+            return self.data[key] if crns is None else semi_join(self.data[key], crns)
+        if name in self.data:
+            df = self.data[name] if columns is None else self.data[name][columns]
+            return df if crns is None else semi_join(df, crns)
+        
         file_path = PROCESSED_DATA_DIR / f"{category.lower()}_harmonized.parquet"
         
         if not file_path.exists():
@@ -99,12 +248,14 @@ class DatasetCreator:
             return None
         
         self.logger.info(f"Loading {file_path.name}")
-        df = pd.read_parquet(file_path)
+        row_filter = None if crns is None else ds.field('CRN').isin(pa.array(crns.to_numpy()))
+        df = read_parquet(file_path, columns=columns, filters=row_filter)
         
         self.logger.info(f"Loaded {len(df):,} records from {category}")
         log_dataframe_info(df, f"{category} data")
         
-        self.data[category.lower()] = df
+        if crns is None:
+            self.data[key] = df
         return df
     
     def create_cyclist_dataset(self) -> pd.DataFrame:
@@ -116,15 +267,13 @@ class DatasetCreator:
         Returns:
             Cyclist-focused dataframe
         """
-        self.logger.info("=" * 80)
-        self.logger.info("Creating Cyclist-Focused Dataset")
-        self.logger.info("=" * 80)
+        log_banner("Creating Cyclist-Focused Dataset")
         
         # Load base crash data with weather
         crash_df = self.load_weather_integrated_crash()
         
-        # Load CYCLE data
-        cycle_df = self.load_harmonized_category("CYCLE")
+        # Load CYCLE data (inner join: only records of known crashes)
+        cycle_df = self.load_harmonized_category("CYCLE", crns=self.crash_crns)
         
         if cycle_df is None:
             self.logger.error("CYCLE data required for cyclist dataset")
@@ -138,17 +287,24 @@ class DatasetCreator:
             self.logger.error("CRN column not found in data")
             return None
         
-        # Merge
+        # Merge. CRN is stored at the same width in every harmonized file, so
+        # these are same-dtype hash joins; sort=False keeps left order and
+        # skips sorting the result, copy=False avoids copying unchanged columns
         cyclist_df = crash_df.merge(
             cycle_df,
             on='CRN',
             how='inner',  # Only crashes with bicycle involvement
-            suffixes=('', '_cycle')
+            suffixes=('', '_cycle'),
+            sort=False,
+            copy=False
         )
         
         self.stats['cyclist_crashes'] = len(cyclist_df)
         self.logger.info(f"Cyclist crashes: {len(cyclist_df):,}")
         
+        # CRNs the person and vehicle joins below can match
+        cyclist_crns = cyclist_df['CRN'].unique()
+        
         # Optionally add PERSON data for cyclist details
         person_df = self.load_harmonized_category("PERSON")
         if person_df is not None:
@@ -157,29 +313,24 @@ class DatasetCreator:
                 cyclist_persons = person_df[person_df['PERSON_TYPE'].isin(['PEDALCYCLIST', 'BICYCLIST'])]
                 self.logger.info(f"Found {len(cyclist_persons):,} cyclist person records")
                 
-                # Join
+                # Join (only persons from cyclist crashes can match)
                 cyclist_df = cyclist_df.merge(
-                    cyclist_persons,
+                    semi_join(cyclist_persons, cyclist_crns),
                     on='CRN',
                     how='left',
-                    suffixes=('', '_person')
+                    suffixes=('', '_person'),
+                    sort=False,
+                    copy=False
                 )
         
-        # Add vehicle data
-        vehicle_df = self.load_harmonized_category("VEHICLE")
+        # Add vehicle data (only the summarized columns are read)
+        vehicle_df = self.load_harmonized_category("VEHICLE", columns=VEHICLE_SUMMARY_COLUMNS)
         if vehicle_df is not None:
-            # Aggregate vehicle info by CRN
-            vehicle_summary = vehicle_df.groupby('CRN').agg({
-                'VEH_TYPE': lambda x: ', '.join(x.dropna().astype(str).unique()),
-                'VEH_ROLE_CD': lambda x: ', '.join(x.dropna().astype(str).unique())
-            }).reset_index()
+            # Aggregate vehicle info by CRN, for the cyclist crashes only
+            vehicle_summary = summarize_by_crn(semi_join(vehicle_df, cyclist_crns), ['VEH_TYPE', 'VEH_ROLE_CD'])
             
-            cyclist_df = cyclist_df.merge(
-                vehicle_summary,
-                on='CRN',
-                how='left',
-                suffixes=('', '_veh')
-            )
+            # One row per CRN, so the join is a lookup
+            cyclist_df = map_join(cyclist_df, vehicle_summary, '_veh')
         
         self.logger.info(f"Final cyclist dataset: {len(cyclist_df):,} rows, {len(cyclist_df.columns)} columns")
         
@@ -194,19 +345,15 @@ class DatasetCreator:
         Returns:
             Pedestrian-focused dataframe
         """
-        self.logger.info("=" * 80)
-        self.logger.info("Creating Pedestrian-Focused Dataset")
-        self.logger.info("=" * 80)
+        log_banner("Creating Pedestrian-Focused Dataset")
         
         # Load base crash data
         crash_df = self.load_weather_integrated_crash()
         
         # Filter to crashes with pedestrian involvement
-        # Check for pedestrian count column
-        ped_cols = [col for col in crash_df.columns if 'PED' in col.upper() and 'COUNT' in col.upper()]
+        ped_col = self.pedestrian_count_column(crash_df)
         
-        if ped_cols:
-            ped_col = ped_cols[0]
+        if ped_col:
             self.logger.info(f"Using pedestrian indicator: {ped_col}")
             pedestrian_df = crash_df[crash_df[ped_col] > 0].copy()
         else:
@@ -216,6 +363,9 @@ class DatasetCreator:
         self.stats['pedestrian_crashes'] = len(pedestrian_df)
         self.logger.info(f"Pedestrian crashes: {len(pedestrian_df):,}")
         
+        # CRNs the person and vehicle joins below can match
+        pedestrian_crns = pedestrian_df['CRN'].unique()
+        
         # Add PERSON data filtered to pedestrians
         person_df = self.load_harmonized_category("PERSON")
         if person_df is not None:
@@ -225,30 +375,46 @@ class DatasetCreator:
                 self.logger.info(f"Found {len(pedestrians):,} pedestrian person records")
                 
                 pedestrian_df = pedestrian_df.merge(
-                    pedestrians,
+                    semi_join(pedestrians, pedestrian_crns),
                     on='CRN',
                     how='left',
-                    suffixes=('', '_person')
+                    suffixes=('', '_person'),
+                    sort=False,
+                    copy=False
                 )
         
-        # Add vehicle data
-        vehicle_df = self.load_harmonized_category("VEHICLE")
+        # Add vehicle data (only the summarized columns are read)
+        vehicle_df = self.load_harmonized_category("VEHICLE", columns=VEHICLE_SUMMARY_COLUMNS)
         if vehicle_df is not None:
-            vehicle_summary = vehicle_df.groupby('CRN').agg({
-                'VEH_TYPE': lambda x: ', '.join(x.dropna().astype(str).unique())
-            }).reset_index()
+            vehicle_summary = summarize_by_crn(semi_join(vehicle_df, pedestrian_crns), ['VEH_TYPE'])
             
-            pedestrian_df = pedestrian_df.merge(
-                vehicle_summary,
-                on='CRN',
-                how='left',
-                suffixes=('', '_veh')
-            )
+            pedestrian_df = map_join(pedestrian_df, vehicle_summary, '_veh')
         
         self.logger.info(f"Final pedestrian dataset: {len(pedestrian_df):,} rows, {len(pedestrian_df.columns)} columns")
         
         return pedestrian_df
     
+    def pedestrian_count_column(self, crash_df: pd.DataFrame) -> Optional[str]:
+        """
+        CRASH column counting pedestrians, resolved once per creator.
+        
+        Known names (PEDESTRIAN_COUNT_COLS) are checked first; otherwise the
+        first column whose name contains both PED and COUNT is used.
+        
+        Args:
+            crash_df: Crash dataframe
+            
+        Returns:
+            Column name, or None if there is no such column
+        """
+        if self._ped_col is None:
+            known = [col for col in PEDESTRIAN_COUNT_COLS if col in crash_df.columns]
+            if not known:
+                known = [col for col in crash_df.columns
+                         if 'PED' in col.upper() and 'COUNT' in col.upper()]
+            self._ped_col = known[0] if known else None
+        return self._ped_col
+    
     def create_full_integrated_dataset(self) -> pd.DataFrame:
         """
         Create full integrated dataset with all categories.
@@ -256,38 +422,34 @@ class DatasetCreator:
         Returns:
             Complete integrated dataframe
         """
-        self.logger.info("=" * 80)
-        self.logger.info("Creating Full Integrated Dataset")
-        self.logger.info("=" * 80)
+        log_banner("Creating Full Integrated Dataset")
         
         # Start with weather-integrated crash data
         full_df = self.load_weather_integrated_crash()
         
-        # Load and join all other categories
-        categories_to_join = ['PERSON', 'VEHICLE', 'ROADWAY']
+        # These have multiple records per crash - keep as separate tables
+        # (saved by main), so they aren't loaded here
+        for category in SEPARATE_TABLES:
+            self.logger.info(f"Keeping {category} as separate table (multiple records per CRN)")
         
-        for category in categories_to_join:
-            cat_df = self.load_harmonized_category(category)
+        # Join the categories with one record per CRN
+        for category in JOINED_CATEGORIES:
+            # Only records of known crashes can join (filtered while reading)
+            cat_df = self.load_harmonized_category(category, crns=self.crash_crns)
             
             if cat_df is None:
                 self.logger.warning(f"Skipping {category} - not available")
                 continue
             
-            # For categories with multiple records per CRN, aggregate or keep separate
-            if category in ['PERSON', 'VEHICLE']:
-                # These have multiple records per crash - keep as separate table
-                # For full dataset, we'll save them separately
-                self.logger.info(f"Keeping {category} as separate table (multiple records per CRN)")
-                continue
-            else:
-                # Categories like ROADWAY typically have 1 record per CRN
-                self.logger.info(f"Joining {category} to main dataset...")
-                full_df = full_df.merge(
-                    cat_df,
-                    on='CRN',
-                    how='left',
-                    suffixes=('', f'_{category.lower()}')
-                )
+            self.logger.info(f"Joining {category} to main dataset...")
+            full_df = full_df.merge(
+                cat_df,
+                on='CRN',
+                how='left',
+                suffixes=('', f'_{category.lower()}'),
+                sort=False,
+                copy=False
+            )
         
         self.logger.info(f"Full integrated dataset: {len(full_df):,} rows, {len(full_df.columns)} columns")
         
@@ -307,86 +469,151 @@ class DatasetCreator:
         """
         output_file = FINAL_DATA_DIR / f"{name}.parquet"
         
+        # Write crash dates as a Parquet timestamp (read back as datetime64)
+        if 'crash_date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['crash_date']):
+            df['crash_date'] = pd.to_datetime(df['crash_date'], errors='coerce')
+        
         self.logger.info(f"Saving {description} to {output_file.name}")
-        df.to_parquet(output_file, index=False, engine='pyarrow')
+        write_parquet(df, output_file)
         
         file_size = output_file.stat().st_size / (1024 * 1024)  # MB
         self.logger.info(f"Saved {len(df):,} rows ({file_size:.2f} MB)")
         
-        # Also save as CSV for wider compatibility
-        csv_file = FINAL_DATA_DIR / f"{name}.csv"
-        self.logger.info(f"Also saving as CSV: {csv_file.name}")
-        df.to_csv(csv_file, index=False)
-        
-        csv_size = csv_file.stat().st_size / (1024 * 1024)
-        self.logger.info(f"CSV: {csv_size:.2f} MB")
+        # Optional CSV copy for wider compatibility, streamed from the Parquet
+        # file just written by Arrow's CSV writer (no pandas string formatting)
+        if self.save_csv:
+            csv_file = FINAL_DATA_DIR / f"{name}.csv"
+            self.logger.info(f"Also saving as CSV: {csv_file.name}")
+            source = pq.ParquetFile(output_file)
+            with pv.CSVWriter(csv_file, source.schema_arrow) as writer:
+                for batch in source.iter_batches(batch_size=CSV_BATCH_SIZE):
+                    writer.write_batch(batch)
+            
+            csv_size = csv_file.stat().st_size / (1024 * 1024)
+            self.logger.info(f"CSV: {csv_size:.2f} MB")
         
         return output_file
 
 
-def main():
-    """Main execution function."""
-    logger.info("=" * 80)
-    logger.info("DATASET CREATION SCRIPT")
-    logger.info("=" * 80)
+FINAL_DATASETS = ['cyclist_focused', 'pedestrian_focused', 'full_integrated', 'person', 'vehicle']
+
+# Independent dataset builds: kind -> (DatasetCreator method, output name, description)
+DATASET_BUILDS = {
+    'cyclist': ('create_cyclist_dataset', 'cyclist_focused', 'Cyclist-focused dataset'),
+    'pedestrian': ('create_pedestrian_dataset', 'pedestrian_focused', 'Pedestrian-focused dataset'),
+    'full': ('create_full_integrated_dataset', 'full_integrated', 'Full integrated dataset'),
+}
+
+
+def build_and_save(creator: DatasetCreator, kind: str) -> dict:
+    """
+    Build one dataset and save it.
     
-    creator = DatasetCreator()
+    Args:
+        creator: DatasetCreator to build with
+        kind: Key of DATASET_BUILDS
+        
+    Returns:
+        Result dict with status and rows (or reason)
+    """
+    method, name, description = DATASET_BUILDS[kind]
+    df = getattr(creator, method)()
+    if df is None or df.empty:
+        return {'status': 'skipped', 'reason': 'No data'}
     
-    results = {}
+    creator.save_dataset(df, name, description)
+    return {'status': 'success', 'rows': len(df)}
+
+
+def _build_one(kind: str, save_csv: bool) -> dict:
+    """
+    Build and save one dataset in a worker process.
     
-    # Create cyclist dataset
-    try:
-        logger.info("\n" + "=" * 80)
-        cyclist_df = creator.create_cyclist_dataset()
-        if cyclist_df is not None and not cyclist_df.empty:
-            creator.save_dataset(cyclist_df, 'cyclist_focused', 'Cyclist-focused dataset')
-            results['cyclist'] = {'status': 'success', 'rows': len(cyclist_df)}
-        else:
-            results['cyclist'] = {'status': 'skipped', 'reason': 'No data'}
-    except Exception as e:
-        logger.error(f"Failed to create cyclist dataset: {e}", exc_info=True)
-        results['cyclist'] = {'status': 'failed', 'error': str(e)}
+    The worker has its own DatasetCreator, so only the result dict crosses
+    the process boundary.
+    """
+    return build_and_save(DatasetCreator(save_csv=save_csv), kind)
+
+
+def _init_worker(workers: int):
+    """Split Arrow's parquet thread pool between worker processes."""
+    pa.set_cpu_count(max(1, (os.cpu_count() or 1) // workers))
+
+
+@cached_stage(
+    "create_datasets",
+    inputs_fn=lambda save_csv=False, max_workers=None: [PROCESSED_DATA_DIR / "crash_weather_integrated.parquet"] + [
+        PROCESSED_DATA_DIR / f"{category}_harmonized.parquet"
+        for category in ['cycle', 'person', 'vehicle', 'roadway']
+    ],
+    outputs_fn=lambda save_csv=False, max_workers=None: [
+        FINAL_DATA_DIR / f"{name}.{ext}"
+        for name in FINAL_DATASETS
+        for ext in (['parquet', 'csv'] if save_csv else ['parquet'])
+    ],
+    sources=[write_parquet]
+)
+def main(save_csv: bool = False, max_workers: int = DATASET_WORKERS):
+    """
+    Main execution function.
     
-    # Create pedestrian dataset
-    try:
-        logger.info("\n" + "=" * 80)
-        pedestrian_df = creator.create_pedestrian_dataset()
-        if pedestrian_df is not None and not pedestrian_df.empty:
-            creator.save_dataset(pedestrian_df, 'pedestrian_focused', 'Pedestrian-focused dataset')
-            results['pedestrian'] = {'status': 'success', 'rows': len(pedestrian_df)}
-        else:
-            results['pedestrian'] = {'status': 'skipped', 'reason': 'No data'}
-    except Exception as e:
-        logger.error(f"Failed to create pedestrian dataset: {e}", exc_info=True)
-        results['pedestrian'] = {'status': 'failed', 'error': str(e)}
+    The cyclist, pedestrian and full datasets only share their (read-only)
+    inputs, so with more than one worker each is built in its own process.
     
-    # Create full integrated dataset
-    try:
-        logger.info("\n" + "=" * 80)
-        full_df = creator.create_full_integrated_dataset()
-        if full_df is not None and not full_df.empty:
-            creator.save_dataset(full_df, 'full_integrated', 'Full integrated dataset')
-            results['full'] = {'status': 'success', 'rows': len(full_df)}
-        else:
-            results['full'] = {'status': 'skipped', 'reason': 'No data'}
-    except Exception as e:
-        logger.error(f"Failed to create full dataset: {e}", exc_info=True)
-        results['full'] = {'status': 'failed', 'error': str(e)}
+    Args:
+        save_csv: Also write CSV copies of the datasets (default: Parquet only)
+        max_workers: Datasets built in parallel (1 = sequential, in-process,
+            sharing loaded inputs)
+    """
+    log_banner("DATASET CREATION SCRIPT")
+    
+    creator = DatasetCreator(save_csv=save_csv)
+    
+    workers = max(1, min(max_workers, len(DATASET_BUILDS)))
+    logger.info(f"Parallel workers: {workers}")
+    
+    results = {}
+    
+    if workers == 1:
+        # One creator for every build, so shared inputs are read once
+        for kind in DATASET_BUILDS:
+            try:
+                results[kind] = build_and_save(creator, kind)
+            except Exception as e:
+                logger.error(f"Failed to create {kind} dataset: {e}", exc_info=True)
+                results[kind] = {'status': 'failed', 'error': str(e)}
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(workers,)) as executor:
+            futures = {
+                executor.submit(_build_one, kind, save_csv): kind
+                for kind in DATASET_BUILDS
+            }
+            
+            for future in as_completed(futures):
+                kind = futures[future]
+                try:
+                    results[kind] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to create {kind} dataset: {e}", exc_info=True)
+                    results[kind] = {'status': 'failed', 'error': str(e)}
+        
+        # Report in build order
+        results = {kind: results[kind] for kind in DATASET_BUILDS}
     
     # Save individual category tables for reference
-    logger.info("\n" + "=" * 80)
-    logger.info("Saving individual category tables")
-    logger.info("=" * 80)
+    log_banner("Saving individual category tables")
     
-    for category in ['PERSON', 'VEHICLE']:
-        if category.lower() in creator.data:
-            df = creator.data[category.lower()]
+    for category in SEPARATE_TABLES:
+        df = creator.load_harmonized_category(category)
+        if df is not None:
             creator.save_dataset(df, category.lower(), f"{category} table")
+            # Last use of the loaded table; release it once saved
+            creator.data.pop(category.lower())
+            del df
     
     # Print summary
-    logger.info("\n" + "=" * 80)
-    logger.info("DATASET CREATION COMPLETE")
-    logger.info("=" * 80)
+    log_banner("DATASET CREATION COMPLETE")
     
     for dataset_name, result in results.items():
         if result['status'] == 'success':
@@ -397,6 +624,8 @@ def main():
             logger.error(f"✗ {dataset_name}: {result.get('error', 'Unknown error')}")
     
     logger.info(f"\nFinal datasets saved to: {FINAL_DATA_DIR}")
+    if not save_csv:
+        logger.info("CSV copies: python scripts/04_analyze/export_csv.py <dataset>")
     
     return results
 
@@ -0,0 +1,114 @@
+"""
+Export Final Datasets to CSV
+
+The pipeline writes analysis-ready datasets as Parquet only. This script
+converts them to CSV on demand, streaming one record batch at a time so
+even the full integrated dataset never has to fit in memory.
+
+Usage:
+    python scripts/04_analyze/export_csv.py cyclist_focused
+    python scripts/04_analyze/export_csv.py --all
+
+Author: FDC Project
+Date: 2025-10-26
+"""
+
+import sys
+from pathlib import Path
+from typing import List, Optional
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+# Add parent directory to path for imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import FINAL_DATA_DIR
+from utils.logging_utils import setup_logger
+
+# Initialize logger
+logger = setup_logger(__name__)
+
+# Rows per record batch read from Parquet and written to CSV
+BATCH_SIZE = 100_000
+
+
+def export_csv(name: str, output_file: Optional[Path] = None) -> Path:
+    """
+    Convert one final Parquet dataset to CSV.
+    
+    Args:
+        name: Dataset name (e.g., 'cyclist_focused')
+        output_file: Destination CSV (default: next to the Parquet file)
+    
+    Returns:
+        Path to the written CSV file
+    """
+    parquet_file = FINAL_DATA_DIR / f"{name}.parquet"
+    if not parquet_file.exists():
+        raise FileNotFoundError(f"Dataset not found: {parquet_file}")
+    
+    csv_file = output_file or FINAL_DATA_DIR / f"{name}.csv"
+    
+    logger.info(f"Exporting {parquet_file.name} to {csv_file.name}")
+    
+    source = pq.ParquetFile(parquet_file)
+    rows = 0
+    with pv.CSVWriter(csv_file, source.schema_arrow) as writer:
+        for batch in source.iter_batches(batch_size=BATCH_SIZE):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    
+    csv_size = csv_file.stat().st_size / (1024 * 1024)  # MB
+    logger.info(f"Wrote {rows:,} rows to {csv_file.name} ({csv_size:.2f} MB)")
+    
+    return csv_file
+
+
+def available_datasets() -> List[str]:
+    """Names of the Parquet datasets currently in the final directory."""
+    return sorted(path.stem for path in FINAL_DATA_DIR.glob("*.parquet"))
+
+
+def main(names: List[str]) -> int:
+    """
+    Main execution function.
+    
+    Args:
+        names: Dataset names to export
+    
+    Returns:
+        Exit code (0 on success)
+    """
+    failed = []
+    for name in names:
+        try:
+            export_csv(name)
+        except Exception as e:
+            logger.error(f"Failed to export {name}: {e}")
+            failed.append(name)
+    
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Export final Parquet datasets to CSV")
+    parser.add_argument(
+        'datasets',
+        nargs='*',
+        help='Dataset names to export (e.g., cyclist_focused)'
+    )
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='Export every dataset in data/final/'
+    )
+    
+    args = parser.parse_args()
+    
+    names = available_datasets() if args.all else args.datasets
+    if not names:
+        parser.error(f"No datasets given. Available: {', '.join(available_datasets()) or 'none'}")
+    
+    sys.exit(main(names))
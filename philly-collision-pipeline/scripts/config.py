@@ -17,11 +17,12 @@ DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 FINAL_DATA_DIR = DATA_DIR / "final"
+CACHE_DIR = DATA_DIR / "cache"
 METADATA_DIR = PROJECT_ROOT / "metadata"
 LOGS_DIR = PROJECT_ROOT / "logs"
 
 # Ensure directories exist
-for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, FINAL_DATA_DIR, METADATA_DIR, LOGS_DIR]:
+for dir_path in [RAW_DATA_DIR, PROCESSED_DATA_DIR, FINAL_DATA_DIR, CACHE_DIR, METADATA_DIR, LOGS_DIR]:
     dir_path.mkdir(parents=True, exist_ok=True)
 
 # Data collection configuration
@@ -52,16 +53,37 @@ PHILLY_BOUNDS = {
     "lon_max": float(os.getenv("PHILLY_LON_MAX", "-74.956"))
 }
 
+# Official Philadelphia boundary (any file geopandas can read, e.g. city
+# limits or census tracts). Empty: the bounds above are used as the boundary
+PHILLY_BOUNDARY_FILE = os.getenv("PHILLY_BOUNDARY_FILE", "")
+
 # NOAA configuration
 NOAA_API_TOKEN = os.getenv("NOAA_API_TOKEN", "")
 NOAA_STATION_ID = os.getenv("NOAA_STATION_ID", "GHCND:USW00013739")  # Philadelphia Int'l Airport
 
+# Weather join: crashes on a day without weather take the nearest day's
+# weather up to this many days away (0: exact day only)
+WEATHER_MATCH_TOLERANCE_DAYS = int(os.getenv("WEATHER_MATCH_TOLERANCE_DAYS", "0"))
+
 # Logging configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 # Output format
 OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "parquet")
 
+# Stage caching (skip stages whose inputs are unchanged since the last run)
+STAGE_CACHE_ENABLED = os.getenv("STAGE_CACHE", "true").lower() in ("1", "true", "yes")
+
+# Harmonization parallelism (one process per category)
+HARMONIZE_WORKERS = int(os.getenv("HARMONIZE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Years loaded concurrently within each category (threads; Arrow parses off the GIL)
+HARMONIZE_YEAR_WORKERS = int(os.getenv("HARMONIZE_YEAR_WORKERS", "4"))
+
+# Final datasets built in parallel processes. Each process reads its own
+# copy of the inputs, so peak memory grows with this (default: sequential)
+DATASET_WORKERS = int(os.getenv("DATASET_WORKERS", "1"))
+
 # Coordinate Reference System
 CRS_WGS84 = "EPSG:4326"  # Standard WGS84 lat/lon
 
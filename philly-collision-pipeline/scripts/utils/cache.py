@@ -0,0 +1,135 @@
+"""
+Stage caching utilities for the Philadelphia Collision Pipeline.
+Lets a stage skip its work when its inputs are unchanged since the last run.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+from loguru import logger
+from scripts import config
+from scripts.config import CACHE_DIR, STAGE_CACHE_ENABLED
+
+
+def fingerprint_files(paths: Iterable[Path]) -> str:
+    """
+    Build a cheap content fingerprint from file paths, mtimes and sizes.
+
+    Missing files are included as such, so creating or deleting an input
+    also changes the fingerprint.
+
+    Args:
+        paths: Files to fingerprint
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(Path(p) for p in paths):
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+        else:
+            digest.update(f"{path}:missing\n".encode())
+    return digest.hexdigest()
+
+
+def stage_failed(result) -> bool:
+    """
+    Whether a stage's return value reports a failure.
+
+    Stages report failure with a nonzero exit code, or with a 'failed'
+    status either for the whole stage or for any entry of a per-category
+    results dict.
+
+    Args:
+        result: Value returned by the stage
+
+    Returns:
+        True if the stage failed
+    """
+    if isinstance(result, int):
+        return result != 0
+    if isinstance(result, dict):
+        if result.get('status') == 'failed':
+            return True
+        return any(isinstance(v, dict) and v.get('status') == 'failed' for v in result.values())
+    return False
+
+
+def cached_stage(name: str,
+                 inputs_fn: Callable[..., Iterable[Path]],
+                 outputs_fn: Callable[..., Iterable[Path]],
+                 sources: Iterable[Any] = (),
+                 config_keys: Iterable[str] = (),
+                 cache_dir: Optional[Path] = None):
+    """
+    Decorator that skips a stage when its inputs, arguments, code and settings are unchanged.
+
+    The cache key hashes the input files, the call arguments, the stage's
+    own source file and those of the helpers it calls into, and the values
+    of the config settings that shape its output (which may come from the
+    environment, so config.py's source alone doesn't cover them).
+
+    A manifest holding the stage's return value and an output fingerprint is
+    written after every run that didn't report a failure (see stage_failed)
+    and whose outputs all exist; a later call with the same key returns the
+    recorded value without re-running, as long as the outputs are still the
+    files that run produced.
+
+    Args:
+        name: Stage name (used as the cache subdirectory)
+        inputs_fn: Called with the stage's arguments, returns input file paths
+        outputs_fn: Called with the stage's arguments, returns output file paths
+        sources: Functions, classes or modules from other files that the stage
+            runs; their source files are part of the key
+        config_keys: Names of config settings whose values are part of the key
+        cache_dir: Override for the cache root (default: CACHE_DIR)
+    """
+    def decorator(func):
+        source_files = [Path(inspect.getsourcefile(obj)) for obj in [func, *sources]]
+        # Settings are fixed once config is imported, so read them up front
+        # (a misspelled name fails at import rather than on the first run)
+        settings = repr([(key, getattr(config, key)) for key in sorted(config_keys)])
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not STAGE_CACHE_ENABLED:
+                return func(*args, **kwargs)
+
+            inputs = list(inputs_fn(*args, **kwargs)) + source_files
+            outputs = list(outputs_fn(*args, **kwargs))
+
+            key_source = f"{fingerprint_files(inputs)}|{args!r}|{sorted(kwargs.items())!r}|{settings}"
+            key = hashlib.blake2b(key_source.encode(), digest_size=8).hexdigest()
+            manifest_path = (cache_dir or CACHE_DIR) / name / f"{key}.json"
+
+            if manifest_path.exists() and all(Path(p).exists() for p in outputs):
+                manifest = json.loads(manifest_path.read_text())
+                if manifest.get('outputs_fingerprint') == fingerprint_files(outputs):
+                    logger.info(f"Stage '{name}' inputs unchanged (cache key {key}), skipping")
+                    return manifest['result']
+
+            result = func(*args, **kwargs)
+
+            if stage_failed(result):
+                logger.info(f"Stage '{name}' reported a failure, not caching")
+            elif all(Path(p).exists() for p in outputs):
+                manifest_path.parent.mkdir(parents=True, exist_ok=True)
+                manifest = {
+                    'stage': name,
+                    'key': key,
+                    'outputs_fingerprint': fingerprint_files(outputs),
+                    'result': result
+                }
+                manifest_path.write_text(json.dumps(manifest, indent=2, default=str))
+                logger.debug(f"Stage '{name}' cached under key {key}")
+
+            return result
+
+        return wrapper
+
+    return decorator
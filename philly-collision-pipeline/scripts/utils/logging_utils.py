@@ -5,31 +5,51 @@ Provides consistent logging across all pipeline stages.
 
 import sys
 from pathlib import Path
+from typing import Optional, Tuple
 from loguru import logger
 from scripts.config import LOGS_DIR, LOG_LEVEL
 
+# Handler ids of the sinks added by setup_logger (loguru's logger is global)
+_console_sink: Optional[int] = None
+_file_sink: Optional[Tuple[str, int]] = None  # (script_name, handler id)
+
 
 def setup_logger(script_name: str):
     """
     Set up logger with both file and console output.
     
+    Every module calls this at import, so the console sink is added once per
+    process and the file sink is only replaced when the script name changes:
+    the last name set up owns the log file. A stage script run directly sets
+    up after its imports, so its file wins; run_pipeline calls this after
+    importing the stage modules for the same reason. Repeated calls for the
+    same script do nothing.
+    
     Args:
         script_name: Name of the script (used for log filename)
     """
-    # Remove default logger
-    logger.remove()
+    global _console_sink, _file_sink
     
-    # Add console handler
-    logger.add(
-        sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>",
-        level=LOG_LEVEL,
-        colorize=True
-    )
+    if _console_sink is None:
+        # Remove default logger
+        logger.remove()
+        
+        # Add console handler
+        _console_sink = logger.add(
+            sys.stderr,
+            format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>",
+            level=LOG_LEVEL,
+            colorize=True
+        )
+    
+    if _file_sink is not None:
+        if _file_sink[0] == script_name:
+            return logger
+        logger.remove(_file_sink[1])
     
     # Add file handler
     log_file = LOGS_DIR / f"{script_name}.log"
-    logger.add(
+    handler_id = logger.add(
         log_file,
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function} - {message}",
         level=LOG_LEVEL,
@@ -37,6 +57,7 @@ def setup_logger(script_name: str):
         retention="30 days",
         compression="zip"
     )
+    _file_sink = (script_name, handler_id)
     
     logger.info(f"Logger initialized for {script_name}")
     logger.info(f"Log file: {log_file}")
@@ -44,11 +65,28 @@ def setup_logger(script_name: str):
     return logger
 
 
+def log_banner(title: str, width: int = 80):
+    """Log a section banner as one record instead of one call per line."""
+    rule = "=" * width
+    logger.info(f"\n{rule}\n{title}\n{rule}")
+
+
 def log_dataframe_info(df, name: str):
-    """Log basic information about a DataFrame."""
+    """
+    Log basic information about a DataFrame.
+    
+    Measuring string memory (deep=True) visits every Python object and the
+    missing-value count scans every column, so both only run at DEBUG; at
+    other levels the shallow (buffer) memory size is logged instead.
+    """
     logger.info(f"{name} - Shape: {df.shape}")
-    logger.info(f"{name} - Columns: {list(df.columns)}")
-    logger.info(f"{name} - Memory usage: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
+    
+    if LOG_LEVEL != "DEBUG":
+        logger.info(f"{name} - Memory usage (shallow): {df.memory_usage(deep=False).sum() / 1024**2:.2f} MB")
+        return
+    
+    logger.debug(f"{name} - Columns: {list(df.columns)}")
+    logger.debug(f"{name} - Memory usage: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
     
     # Log missing data
     missing = df.isnull().sum()